@@ -0,0 +1,291 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import threading
+import time
+from app import metrics
+from app.auth import check_authorization
+from app.log import log_sampled
+from app.profiler import PROFILE_HEADER, SamplingProfiler, wants_profile
+from app.render import dumps, render_multi_response_v28
+from app.response_cache import CachedResponse, etag_matches, make_etag, request_key, response_cache
+from app.utils import get_single_response_v28
+
+# ASGI deployment of the /multi and /single routes, e.g. `uvicorn app.asgi:app --port 5000`.
+#
+# Under gunicorn's sync workers a request holds its worker from the first byte of the body to the last
+# byte of the response, so a slow client or a large upload takes a worker out of service. Here the
+# event loop reads bodies and writes responses, and only the scoring itself (CPU-bound calculate_raf)
+# runs on a bounded executor: a thread pool by default, or a process pool (RAF_EXECUTOR=process) to
+# score on more than one core from one server process.
+#
+# Backpressure: at most RAF_MAX_PENDING requests may be running or queued on the executor. Past that,
+# requests are answered 503 with Retry-After right away instead of queueing without bound. Each
+# request gets RAF_REQUEST_TIMEOUT seconds end to end (body, queue and scoring), then a 504. The
+# executor counters, including the queue depth, are served on GET /v1/executor-stats.
+#
+# With RAF_METRICS=true, GET /metrics serves the same metrics as the Flask app (see app/metrics.py)
+# plus the executor counters, and requests with the X-RAF-Profile header are profiled on the executor
+# when RAF_PROFILING=true (see app/profiler.py).
+#
+# Responses go through the response cache (see app/response_cache.py) on the event loop: a hit is
+# answered without a trip to the executor. Responses carry an ETag, and If-None-Match gets a 304.
+#
+# Request and response bodies are the same as the Flask routes in main.py.
+
+EXECUTOR_KIND = os.getenv("RAF_EXECUTOR", "thread")  # "thread" or "process"
+EXECUTOR_WORKERS = int(os.getenv("RAF_EXECUTOR_WORKERS", "2"))
+MAX_PENDING = int(os.getenv("RAF_MAX_PENDING", "64"))
+REQUEST_TIMEOUT = float(os.getenv("RAF_REQUEST_TIMEOUT", "10"))
+MAX_BODY_BYTES = int(os.getenv("RAF_MAX_BODY_BYTES", str(1024 * 1024)))
+
+# A representative request, scored once before the process pool forks so workers inherit loaded tables
+WARM_UP_REQUEST = {"diagnosis_codes": ["E1122", "I5021"], "age": 70, "sex": "F"}
+
+
+class ExecutorBusy(Exception):
+    """The executor already has max_pending requests running or queued"""
+
+
+class BoundedExecutor:
+    """
+    A thread or process pool that accepts at most max_pending tasks (running or queued) at a time.
+
+    A task counts against the bound until it has actually finished: a request that timed out while
+    its task was running still holds the slot, so the bound reflects the work the pool really has.
+    """
+
+    def __init__(self, kind: str = EXECUTOR_KIND, workers: int = EXECUTOR_WORKERS, max_pending: int = MAX_PENDING):
+        if kind not in ("thread", "process"):
+            raise ValueError(f'Executor kind must be "thread" or "process", got {kind}')
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max(max_pending, workers)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._abandoned = 0
+
+    def start(self) -> None:
+        if self._pool is not None:
+            return
+        if self.kind == "thread":
+            self._pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="raf")
+            return
+        render_multi_response_v28(**WARM_UP_REQUEST)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self._pool = concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=context)
+        # Fork the workers now, at startup: forked on a request, they would inherit its connection
+        # and hold it open after the response
+        self._pool.submit(int).result()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _release(self, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._completed += not future.cancelled()
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool, raising ExecutorBusy when max_pending tasks are already in"""
+        self.start()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise ExecutorBusy()
+            self._pending += 1
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._release)
+        try:
+            # Cancelling the wrapper (on timeout) cancels the task if it has not started yet; a running
+            # task is abandoned, it finishes on the pool and its result is dropped
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            with self._lock:
+                self._abandoned += 1
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "queue_depth": max(0, self._pending - self.workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "abandoned": self._abandoned,
+            }
+
+
+executor = BoundedExecutor()
+
+
+def call_route(fn, data: dict, profile_route: str|None = None, payload_bytes: int|None = None):
+    """
+    Run a route's response function on the executor; errors are returned, not raised, like the Flask
+    routes do. With profile_route, the call is profiled and the profile logged under that route.
+    """
+    profiler = SamplingProfiler().start() if profile_route is not None else None
+    try:
+        return fn(**data), 200
+    except Exception as e:
+        return {"error": str(e)}, 400
+    finally:
+        if profiler is not None:
+            profiler.stop().log(profile_route, payload_bytes)
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def read_body(receive) -> bytes:
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ClientDisconnected()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def send_json(send, body: dict|bytes, status: int, headers: list|None = None, content_type: bytes = b"application/json") -> None:
+    payload = body if isinstance(body, bytes) else dumps(body)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(payload)).encode())] + (headers or []),
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def score(fn, scope, receive) -> tuple:
+    """Read the JSON body of a POST route and score it on the executor, returning (body, status, headers)"""
+    headers = dict(scope["headers"])
+    content_length = headers.get(b"content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > MAX_BODY_BYTES:
+        return {"error": f"Request body too large, maximum is {MAX_BODY_BYTES} bytes"}, 413, []
+    try:
+        body = await read_body(receive)
+    except BodyTooLarge:
+        return {"error": f"Request body too large, maximum is {MAX_BODY_BYTES} bytes"}, 413, []
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return {"error": "Request body must be JSON"}, 400, []
+    if not isinstance(data, dict):
+        return {"error": "Request body must be a JSON object"}, 400, []
+    log_sampled("request", route=scope["path"], payload=data)
+    key = request_key(scope["path"].rstrip("/"), data) if response_cache is not None else None
+    cached = response_cache.get(key) if key is not None else None
+    if cached is None:
+        profile_header = headers.get(PROFILE_HEADER.lower().encode())
+        profile_route = scope["path"] if wants_profile(profile_header and profile_header.decode("latin-1")) else None
+        try:
+            response, status = await executor.run(call_route, fn, data, profile_route, len(body))
+        except ExecutorBusy:
+            return {"error": "Server busy, retry later"}, 503, [(b"retry-after", b"1")]
+        if status != 200:
+            return response, status, []
+        response = response if isinstance(response, bytes) else dumps(response)
+        cached = response_cache.put(key, response) if key is not None else CachedResponse(response, make_etag(response))
+    etag_header = [(b"etag", cached.etag.encode())]
+    if_none_match = headers.get(b"if-none-match")
+    if etag_matches(if_none_match and if_none_match.decode("latin-1"), cached.etag):
+        return b"", 304, etag_header
+    return cached.body, 200, etag_header
+
+
+ROUTES = {
+    "/v1/raf-v28/multi": ("POST", render_multi_response_v28),
+    "/v1/raf-v28/single": ("POST", get_single_response_v28),
+    "/v1/executor-stats": ("GET", lambda: (executor.stats(), b"application/json")),
+}
+
+if metrics.METRICS_ENABLED:
+    metrics.instrument()
+
+    def executor_metrics(*keys):
+        return lambda: {(key,): value for key, value in executor.stats().items() if key in keys}
+
+    metrics.registry.register(metrics.Collected(
+        "raf_executor_tasks", "Requests running or queued on the executor", "gauge", executor_metrics("pending", "queue_depth"), ("state",)))
+    metrics.registry.register(metrics.Collected(
+        "raf_executor_tasks_total", "Executor tasks completed, rejected (503) and abandoned (timed out while running)", "counter",
+        executor_metrics("completed", "rejected", "abandoned"), ("result",)))
+    ROUTES["/metrics"] = ("GET", lambda: (metrics.registry.render(), metrics.CONTENT_TYPE.encode()))
+
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            executor.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            executor.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"].rstrip("/")
+    route = ROUTES.get(path)
+    if route is None:
+        await send_json(send, {"error": "Not found"}, 404)
+        return
+    method, fn = route
+    if scope["method"] != method:
+        await send_json(send, {"error": "Method not allowed"}, 405, [(b"allow", method.encode())])
+        return
+    auth_error = check_authorization(next((v.decode("latin-1") for k, v in scope["headers"] if k == b"authorization"), None))
+    if auth_error is not None:
+        await send_json(send, *auth_error)
+        return
+    if method == "GET":
+        body, content_type = fn()
+        await send_json(send, body, 200, content_type=content_type)
+        return
+
+    start = time.perf_counter()
+    try:
+        async with asyncio.timeout(REQUEST_TIMEOUT):
+            body, status, headers = await score(fn, scope, receive)
+    except TimeoutError:
+        body, status, headers = {"error": f"Request timed out after {REQUEST_TIMEOUT:g} s"}, 504, []
+    except ClientDisconnected:
+        return
+    await send_json(send, body, status, headers)
+    if metrics.METRICS_ENABLED:
+        metrics.observe_request(path, status, time.perf_counter() - start)
@@ -9,32 +9,40 @@ import os
 ENFORCE_AUTH = os.getenv("ENFORCE_AUTH", "false").lower() == "true"
 
 
-def require_auth(f):
-    """Decorator to require authentication for a Flask route."""
+def check_authorization(authorization: str|None) -> tuple|None:
+    """Check an Authorization header value. Returns the (error body, status) to respond with, or None if authorized."""
 
-    # TODO: Implement the actual authentication logic here
-    def decorated(*args, **kwargs):
+    # Check if authentication is enforced, otherwise skip the check
+    if not ENFORCE_AUTH:
+        return None
+
+    # Check if the request has the required header
+    if authorization is None:
+        return {"error": "Authorization header is missing"}, 401
 
-        # Check if authentication is enforced, otherwise skip the check
-        if not ENFORCE_AUTH:
-            return f(*args, **kwargs)
+    # Extract the token from the Authorization header (I'm pretending there's a Bearer token, I don't now if we will have AWS signature or something else)
+    try:
+        token = authorization.split(" ")[1]
+    except IndexError:
+        return {
+            "error": "Invalid Authorization header"
+        }, 401  # We expect "Bearer <token>" format
 
-        # Check if the request has the required header
-        if "Authorization" not in request.headers:
-            return {"error": "Authorization header is missing"}, 401
+    # Placeholder validation logic
+    if token != "your_secret_token":
+        return {"error": "Invalid token"}, 403
 
-        # Extract the token from the Authorization header (I'm pretending there's a Bearer token, I don't now if we will have AWS signature or something else)
-        try:
-            token = request.headers["Authorization"].split(" ")[1]
-        except IndexError:
-            return {
-                "error": "Invalid Authorization header"
-            }, 401  # We expect "Bearer <token>" format
+    return None
 
-        # Placeholder validation logic
-        if token != "your_secret_token":
-            return {"error": "Invalid token"}, 403
 
+def require_auth(f):
+    """Decorator to require authentication for a Flask route."""
+
+    # TODO: Implement the actual authentication logic here
+    def decorated(*args, **kwargs):
+        error = check_authorization(request.headers.get("Authorization"))
+        if error is not None:
+            return error
         return f(*args, **kwargs)
 
     decorated.__name__ = f.__name__  # Preserve the original function name
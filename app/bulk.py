@@ -0,0 +1,144 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import contextlib
+import csv
+import gzip
+import json
+import sys
+import time
+from hccinfhir.hccinfhir import HCCInFHIR
+from hccinfhir.stream import score_ndjson, PatientResult
+from app.columnar import FORMATS, open_writer
+from app.utils import NORM_FACTOR, resolve_dual_elgbl_cd
+
+# Bulk scoring of FHIR EOB NDJSON exports from the command line, one output line per patient:
+#
+#   python -m app.bulk eobs.ndjson --demographics members.csv -o scores.ndjson
+#
+# The input is streamed (see hccinfhir.stream), so files far larger than memory can be scored as long
+# as each patient's EOBs are contiguous. Results are written as soon as each patient is scored.
+# --format csv, parquet or arrow writes columnar tables to the -o directory instead (see app/columnar.py).
+
+BOOLEAN_COLUMNS = ("new_enrollee", "snp", "low_income")
+
+
+def parse_bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "t", "yes", "y")
+
+
+def load_demographics(path: str) -> dict:
+    """
+    Read per-patient demographics from a CSV with a patient_id column and the /multi request fields
+    (age, sex, dual_elgbl_cd, orec, crec, new_enrollee, snp, low_income). Empty cells are omitted.
+    """
+    demographics = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            patient_id = row.pop("patient_id")
+            fields = {key: value for key, value in row.items() if value not in (None, "")}
+            if "age" in fields:
+                fields["age"] = int(float(fields["age"]))
+            if "dual_elgbl_cd" in fields:
+                fields["dual_elgbl_cd"] = resolve_dual_elgbl_cd(fields["dual_elgbl_cd"])
+            for key in BOOLEAN_COLUMNS:
+                if key in fields:
+                    fields[key] = parse_bool(fields[key])
+            demographics[patient_id] = fields
+    return demographics
+
+
+def make_demographics_lookup(demographics: dict, default: dict | None):
+    """Look patients up by full reference ('Patient/123') or bare id ('123'), falling back to default."""
+    def demographics_for(patient_reference: str) -> dict | None:
+        found = demographics.get(patient_reference)
+        if found is None:
+            found = demographics.get(patient_reference.rsplit("/", 1)[-1], default)
+        return found
+    return demographics_for
+
+
+def format_patient_result(patient: PatientResult, model_name: str) -> dict:
+    """Utility function: One output line for a scored patient, or its error."""
+    if patient.error is not None:
+        return {"patient_id": patient.patient_id, "eob_count": patient.eob_count, "error": patient.error}
+    result = patient.result
+    line = {
+        "patient_id": patient.patient_id,
+        "eob_count": patient.eob_count,
+        "service_level_count": len(result["service_level_data"]),
+        "risk_score": round(result["risk_score"], 3),
+    }
+    if model_name == "CMS-HCC Model V28":
+        line["risk_score_normalized"] = round(result["risk_score"] / NORM_FACTOR, 3)
+    line.update({
+        "risk_score_demographics": round(result["risk_score_demographics"], 3),
+        "risk_score_hcc": round(result["risk_score_hcc"], 3),
+        "hcc_list": sorted(result["hcc_list"]),
+    })
+    return line
+
+
+def open_input(path: str):
+    if path == "-":
+        return sys.stdin.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score FHIR EOB NDJSON exports, one output line per patient.")
+    parser.add_argument("input", help="EOB NDJSON file, gzipped if it ends in .gz, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Output NDJSON file, - for stdout (default), or directory of the columnar tables")
+    parser.add_argument("--format", choices=("ndjson",) + FORMATS, default="ndjson",
+                        help="One NDJSON line per patient (default), or columnar tables, parquet and arrow needing pyarrow")
+    parser.add_argument("--demographics", help="CSV of per-patient demographics, keyed by patient_id")
+    parser.add_argument("--default-age", type=int, help="Age for patients missing from --demographics")
+    parser.add_argument("--default-sex", choices=["M", "F"], help="Sex for patients missing from --demographics")
+    parser.add_argument("--model", default="CMS-HCC Model V28")
+    parser.add_argument("--no-filter", action="store_true", help="Score every claim, skip the CMS eligibility filter")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes scoring patients (default 1, in process)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Patients sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    if (args.default_age is None) != (args.default_sex is None):
+        parser.error("--default-age and --default-sex go together")
+    if args.demographics is None and args.default_age is None:
+        parser.error("give --demographics, or --default-age and --default-sex")
+    if args.format != "ndjson" and args.output == "-":
+        parser.error(f"--format {args.format} writes a directory of tables, give it with -o")
+    default = {"age": args.default_age, "sex": args.default_sex} if args.default_age is not None else None
+    demographics_for = make_demographics_lookup(load_demographics(args.demographics) if args.demographics else {}, default)
+
+    processor = HCCInFHIR(filter_claims=not args.no_filter, model_name=args.model)
+    patients = errors = eobs = 0
+    start = time.perf_counter()
+    if args.format != "ndjson":
+        try:
+            output = open_writer(args.format, args.output)
+        except RuntimeError as e:
+            parser.error(str(e))
+    else:
+        output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        with open_input(args.input) as lines, contextlib.redirect_stdout(sys.stderr):  # extractor warnings
+            for patient in score_ndjson(lines, demographics_for, processor,
+                                        args.workers, args.chunk_size):
+                if args.format != "ndjson":
+                    output.write(patient.patient_id, patient.result, patient.error, patient.eob_count,
+                                 len(patient.result["service_level_data"]) if patient.result is not None else None)
+                else:
+                    output.write(json.dumps(format_patient_result(patient, args.model)) + "\n")
+                patients += 1
+                eobs += patient.eob_count
+                errors += patient.error is not None
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(f"{patients} patients ({errors} errors), {eobs} EOBs in {elapsed:.1f} s "
+          f"({eobs / elapsed if elapsed else 0:.0f} EOBs/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
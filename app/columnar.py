@@ -0,0 +1,263 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import abc
+import argparse
+import contextlib
+import csv
+import os
+import sys
+import time
+from functools import lru_cache
+from hccinfhir.datamodels import DemographicsRecord
+from hccinfhir.stream import loads
+from app.utils import NORM_FACTOR, calculate_batch_v28, coefficient_labels, is_model_code, make_community_label, make_demographics_breakdown, sanitize_for_JSON
+
+try:
+    import pyarrow  # optional, for the parquet and arrow formats
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Columnar output of bulk scoring, for loading into a warehouse instead of parsing per-member JSON:
+#
+#   python -m app.columnar members.ndjson --format parquet -o scores/
+#   python -m app.bulk eobs.ndjson --demographics members.csv --format parquet -o scores/
+#
+# One file per table in the output directory:
+#
+#   members        member_id, eob_count, service_level_count, risk_score, risk_score_normalized,
+#                  risk_score_demographics, risk_score_hcc, community, error
+#   hccs           member_id, code, coefficient              the "hcc" entries of /multi
+#   hcc_dx         member_id, code, dx                       their diagnosis codes
+#   interactions   member_id, code, coefficient              the "interactions" entries of /multi
+#   demographics   member_id, code, label, coefficient       the "demographics" entry of /multi
+#   labels         kind, code, label                         the HCC and interaction labels
+#
+# The HCC and interaction labels are in the labels table once instead of on every row (codes missing
+# from it are labelled "Unidentified" in the responses). Scores are rounded as in the responses.
+#
+# Rows are buffered and written every row_group_size members, one row group per table in parquet
+# (one record batch in arrow), so memory stays bounded whatever the number of members. CSV has no row
+# groups and only batches its writes, 1024 members at a time by default. The code,
+# label and community columns are dictionary encoded in parquet and arrow. The arrow format is the
+# Arrow IPC stream format, which allows the dictionaries to change from one batch to the next.
+
+FORMATS = ("csv", "parquet", "arrow")
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrows"}
+ROW_GROUP_SIZE = 65536
+
+# (column, type) of each table, the types being "str", "int", "float" or "dict" (dictionary encoded strings)
+TABLES = {
+    "members": (("member_id", "str"), ("eob_count", "int"), ("service_level_count", "int"), ("risk_score", "float"),
+                ("risk_score_normalized", "float"), ("risk_score_demographics", "float"), ("risk_score_hcc", "float"),
+                ("community", "dict"), ("error", "str")),
+    "hccs": (("member_id", "str"), ("code", "dict"), ("coefficient", "float")),
+    "hcc_dx": (("member_id", "str"), ("code", "dict"), ("dx", "dict")),
+    "interactions": (("member_id", "str"), ("code", "dict"), ("coefficient", "float")),
+    "demographics": (("member_id", "str"), ("code", "dict"), ("label", "dict"), ("coefficient", "float")),
+    "labels": (("kind", "dict"), ("code", "str"), ("label", "str")),
+}
+
+
+@lru_cache(maxsize=4096)
+def _demographics_labels(fields: tuple, names: tuple) -> tuple:
+    """(community, category, demographics label) of one demographics record"""
+    demo = dict(zip(names, fields))
+    entry = make_demographics_breakdown({"data": demo, "coefficient": None})[0]
+    return make_community_label(demo), entry["code"], entry["label"]
+
+
+def demographics_labels(demographics) -> tuple:
+    if isinstance(demographics, DemographicsRecord):
+        names = DemographicsRecord.__slots__
+        return _demographics_labels(tuple([getattr(demographics, name) for name in names]), names)
+    demo = sanitize_for_JSON(demographics)
+    return _demographics_labels(tuple(demo.values()), tuple(demo))
+
+
+class ColumnarWriter(abc.ABC):
+    """
+    Buffers the rows of each table and writes them every row_group_size members. Use as a context
+    manager, or call close() when done, which writes the remaining rows and the labels.
+    """
+
+    row_group_size = ROW_GROUP_SIZE
+
+    def __init__(self, directory: str, row_group_size: int|None = None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        if row_group_size is not None:
+            self.row_group_size = row_group_size
+        self.member_count = 0
+        self._rows = {table: [] for table in TABLES}
+
+    def path(self, table: str, extension: str) -> str:
+        return os.path.join(self.directory, table + extension)
+
+    def write(self, member_id, raf_response=None, error: str|None = None, eob_count: int|None = None,
+              service_level_count: int|None = None) -> None:
+        """Add one member: their calculate_raf() result, or the error scoring them"""
+        member_id = None if member_id is None else str(member_id)
+        self.member_count += 1
+        rows = self._rows
+        if raf_response is None:
+            row = (member_id, eob_count, service_level_count, None, None, None, None, None, error)
+        else:
+            risk_score = raf_response["risk_score"]
+            community, category, label = demographics_labels(raf_response["demographics"])
+            normalized = round(risk_score / NORM_FACTOR, 3) if raf_response.get("model_name", "CMS-HCC Model V28") == "CMS-HCC Model V28" else None
+            row = (member_id, eob_count, service_level_count, round(risk_score, 3), normalized,
+                   round(raf_response["risk_score_demographics"], 3), round(raf_response["risk_score_hcc"], 3), community, None)
+            rows["demographics"].append((member_id, category, label, raf_response["risk_score_demographics"]))
+
+            coefficients = raf_response["coefficients"]
+            cc_to_dx = raf_response["cc_to_dx"]
+            for hcc in raf_response["hcc_list"]:
+                if hcc in coefficients:
+                    rows["hccs"].append((member_id, hcc, coefficients[hcc]))
+                    rows["hcc_dx"].extend([(member_id, hcc, dx) for dx in cc_to_dx.get(hcc, ())])
+            for key, value in raf_response["interactions"].items():
+                if value == 1 and key in coefficients and not is_model_code(key):
+                    rows["interactions"].append((member_id, key, coefficients[key]))
+        members = rows["members"]
+        members.append(row)
+        if len(members) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered rows"""
+        for table, rows in self._rows.items():
+            if rows:
+                self.write_rows(table, rows)
+                rows.clear()
+
+    def close(self) -> None:
+        for kind in ("hcc", "interactions"):
+            self._rows["labels"].extend((kind, code, label) for code, label in coefficient_labels[kind].items())
+        self.flush()
+        self.close_files()
+
+    @abc.abstractmethod
+    def write_rows(self, table: str, rows: list) -> None:
+        """Write rows of a table to its file"""
+
+    @abc.abstractmethod
+    def close_files(self) -> None:
+        """Close the file of every table"""
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class CSVWriter(ColumnarWriter):
+    """One CSV file per table, with a header row. Missing values are empty cells."""
+
+    row_group_size = 1024  # CSV has no row groups, only the writes are batched
+
+    def __init__(self, directory: str, row_group_size: int|None = None):
+        super().__init__(directory, row_group_size)
+        self._files = {}
+        self._writers = {}
+        for table, columns in TABLES.items():
+            f = self._files[table] = open(self.path(table, EXTENSIONS["csv"]), "w", newline="")
+            self._writers[table] = csv.writer(f)
+            self._writers[table].writerow([name for name, _ in columns])
+
+    def write_rows(self, table: str, rows: list) -> None:
+        self._writers[table].writerows(rows)
+
+    def close_files(self) -> None:
+        for f in self._files.values():
+            f.close()
+
+
+class ArrowWriter(ColumnarWriter):
+    """One parquet file (a row group per flush) or Arrow IPC stream (a record batch per flush) per table"""
+
+    def __init__(self, directory: str, format: str = "parquet", row_group_size: int|None = None):
+        if pyarrow is None:
+            raise RuntimeError(f"The {format} format needs pyarrow, pip install -r requirements-optional.txt")
+        super().__init__(directory, row_group_size)
+        types = {"str": pyarrow.string(), "int": pyarrow.int64(), "float": pyarrow.float64(),
+                 "dict": pyarrow.dictionary(pyarrow.int32(), pyarrow.string())}
+        self._types = {table: [types[kind] for _, kind in columns] for table, columns in TABLES.items()}
+        self._schemas = {table: pyarrow.schema([(name, types[kind]) for name, kind in columns]) for table, columns in TABLES.items()}
+        self._writers = {}
+        for table, schema in self._schemas.items():
+            path = self.path(table, EXTENSIONS[format])
+            if format == "parquet":
+                self._writers[table] = pyarrow.parquet.ParquetWriter(path, schema)
+            else:
+                self._writers[table] = pyarrow.ipc.new_stream(path, schema)
+
+    def write_rows(self, table: str, rows: list) -> None:
+        arrays = []
+        for column, arrow_type in zip(zip(*rows), self._types[table]):
+            if pyarrow.types.is_dictionary(arrow_type):
+                arrays.append(pyarrow.array(column, pyarrow.string()).dictionary_encode())
+            else:
+                arrays.append(pyarrow.array(column, arrow_type))
+        self._writers[table].write_table(pyarrow.Table.from_arrays(arrays, schema=self._schemas[table]))
+
+    def close_files(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+
+
+def open_writer(format: str, directory: str, row_group_size: int|None = None) -> ColumnarWriter:
+    if format == "csv":
+        return CSVWriter(directory, row_group_size)
+    if format in ("parquet", "arrow"):
+        return ArrowWriter(directory, format, row_group_size)
+    raise ValueError(f"Unknown format {format}, expected one of {', '.join(FORMATS)}")
+
+
+def write_members(writer: ColumnarWriter, members) -> None:
+    """Score /batch member objects with calculate_batch_v28 and write them"""
+    for member_id, raf_response, error in calculate_batch_v28(members):
+        writer.write(member_id, raf_response, error)
+
+
+def main(argv=None):
+    from app.bulk import open_input  # app.bulk imports this module
+
+    parser = argparse.ArgumentParser(description="Score a member file and write the results as columnar tables.")
+    parser.add_argument("input", help="NDJSON of /batch member objects, gzipped if it ends in .gz, or - for stdin")
+    parser.add_argument("-o", "--output", required=True, help="Output directory, one file per table")
+    parser.add_argument("--format", choices=FORMATS, default="parquet" if pyarrow is not None else "csv",
+                        help="parquet and arrow need pyarrow (default parquet if installed, else csv)")
+    parser.add_argument("--row-group-size", type=int, help=f"Members buffered per row group (default {ROW_GROUP_SIZE}, 1024 for csv)")
+    args = parser.parse_args(argv)
+
+    try:
+        writer = open_writer(args.format, args.output, args.row_group_size)
+    except RuntimeError as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    malformed = 0
+    with open_input(args.input) as lines, contextlib.redirect_stdout(sys.stderr), writer:
+        members = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                members.append(loads(line))
+            except ValueError as e:
+                write_members(writer, members)  # keep the rows in file order
+                members = []
+                writer.write(None, error=f"Malformed JSON: {e}")
+                malformed += 1
+            if len(members) == 1000:
+                write_members(writer, members)
+                members = []
+        write_members(writer, members)
+    elapsed = time.perf_counter() - start
+    print(f"{writer.member_count} members ({malformed} malformed lines) written to {args.output} as {args.format} "
+          f"in {elapsed:.1f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import json
+import logging
+import os
+import random
+import sys
+
+# Structured logging for the service: one JSON object per line on stderr, under the "raf" logger.
+#
+# RAF_LOG_LEVEL sets the level (default WARNING). Per-request records (payloads, raw results) are
+# logged at DEBUG through log_sampled(), and only for a RAF_LOG_SAMPLE_RATE fraction of requests
+# (default 1.0, every request), so debug logging can stay on in production at a low rate. With DEBUG
+# off, log_sampled() returns before building anything.
+
+LOG_LEVEL = os.getenv("RAF_LOG_LEVEL", "WARNING").upper()
+LOG_SAMPLE_RATE = float(os.getenv("RAF_LOG_SAMPLE_RATE", "1.0"))
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON line, with the fields passed in extra={"fields": {...}}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)  # sets, pydantic models and records are logged by str()
+
+
+logger = logging.getLogger("raf")
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def log_sampled(message: str, **fields) -> None:
+    """Debug-log a per-request record for a sampled fraction of requests; free when DEBUG is off."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if LOG_SAMPLE_RATE < 1 and random.random() >= LOG_SAMPLE_RATE:
+        return
+    logger.debug(message, extra={"fields": fields})
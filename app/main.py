@@ -1,10 +1,20 @@
 import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
-from flask import Flask
+import os
+from flask import Flask, Response, request
 from flask_restx import Api, Resource, fields
+from app import metrics, profiler
+from app.member_state import get_member_store
+from app.population import DEFAULT_BUCKET_WIDTH, DEFAULT_PERCENTILES, PopulationAggregate, aggregate_stream, parse_percentiles
+from app.response_cache import cached_response, etag_matches, response_cache
 from app.auth import require_auth
-from app.utils import get_multi_response_v28, get_single_response_v28
+from app.log import log_sampled
+from app.render import dumps, render_multi_response_v28, render_batch_response_v28
+from app.utils import get_single_response_v28, get_single_bulk_response_v28, get_what_if_response_v28, get_blended_response, get_cache_stats, get_claims_response_v28, flatten_eobs, parse_ndjson_text
 app = Flask(__name__)
 
+# Upper bound on members per batch request, keeps a single request from monopolizing a worker
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+
 # Initialize Flask-RESTPlus API
 api = Api(
     app,
@@ -172,6 +182,161 @@ single_raf_model = api.model(
     },
 )
 
+batch_member_model = api.inherit(
+    "BatchMemberRequest",
+    multi_raf_model,
+    {
+        "member_id": fields.String(
+            required=True,
+            example="member-0001",
+            description="Caller-supplied identifier, echoed back with this member's result or error.",
+        ),
+    },
+)
+
+batch_raf_model = api.model(
+    "BatchRAFRequest",
+    {
+        "members": fields.List(
+            fields.Nested(batch_member_model),
+            required=True,
+            description=f"List of member payloads (max {MAX_BATCH_SIZE}), each with the same fields as MultiRAFRequest plus a member_id.",
+        ),
+    },
+)
+
+what_if_raf_model = api.inherit(
+    "WhatIfRAFRequest",
+    multi_raf_model,
+    {
+        "add": fields.List(
+            fields.String,
+            example=["I5021", "J449"],
+            description="Candidate diagnosis codes to add to diagnosis_codes, scored one at a time.",
+        ),
+        "remove": fields.List(
+            fields.String,
+            example=["E1122"],
+            description="Candidate diagnosis codes to remove from diagnosis_codes, scored one at a time.",
+        ),
+    },
+)
+
+single_bulk_raf_model = api.inherit(
+    "SingleBulkRAFRequest",
+    multi_raf_model,
+    {
+        "diagnosis_codes": fields.List(
+            fields.String,
+            required=True,
+            example=["E119", "I10", "I5021"],
+            description=f"ICD-10-CM diagnosis codes (max {MAX_BATCH_SIZE}) to score one at a time, with or without the decimal point.",
+        ),
+    },
+)
+
+blended_raf_model = api.inherit(
+    "BlendedRAFRequest",
+    multi_raf_model,
+    {
+        "payment_years": fields.List(
+            fields.Integer,
+            example=[2024, 2025],
+            description="Payment years to score, each blending its models (e.g. V24 and V28 during the V28 phase-in). Default is RAF_PAYMENT_YEAR (2025).",
+        ),
+        "year_factors": fields.Raw(
+            example={"2025": {"coding_intensity": 0.059}},
+            description="Overrides of the configured factors, keyed by payment year: coding_intensity, and/or models as {model name: {weight, normalization}}. A year that isn't configured needs models.",
+        ),
+    },
+)
+
+# The claims routes take the demographic fields of MultiRAFRequest, and claims in place of diagnosis codes
+claims_demographic_fields = {key: field for key, field in multi_raf_model.items() if key != "diagnosis_codes"}
+claims_filter_field = fields.Boolean(
+    default=True,
+    description="Apply the CMS risk adjustment filtering rules (eligible CPT/HCPCS codes and bill types) before scoring.",
+)
+
+eob_raf_model = api.model(
+    "EOBRAFRequest",
+    {
+        "eobs": fields.List(
+            fields.Raw,
+            description=f"FHIR ExplanationOfBenefit resources or Bundles of them (max {MAX_BATCH_SIZE} EOBs), all for one patient.",
+        ),
+        "ndjson": fields.String(
+            description="Alternatively, EOBs as NDJSON text (one resource per line), e.g. a bulk export of one patient.",
+        ),
+        "filter_claims": claims_filter_field,
+        **claims_demographic_fields,
+    },
+)
+
+x12_raf_model = api.model(
+    "X12RAFRequest",
+    {
+        "x12": fields.Raw(
+            required=True,
+            description=f"Raw 837P/837I text, or a list of them (max {MAX_BATCH_SIZE}), all for one patient.",
+        ),
+        "filter_claims": claims_filter_field,
+        **claims_demographic_fields,
+    },
+)
+
+member_ingest_model = api.model(
+    "MemberIngestRequest",
+    {
+        "members": fields.List(
+            fields.Raw,
+            required=True,
+            example=[{"member_id": "A100", "diagnosis_codes": ["I5021"], "age": 72, "sex": "F", "dual_elgbl_cd": "NonDual"}],
+            description=(
+                f"Members' new diagnosis codes since the last ingest (max {MAX_BATCH_SIZE} members): a member_id, diagnosis_codes and/or "
+                "claims (eobs or x12, with filter_claims, as on the claims routes), and the MultiRAFRequest demographic fields. "
+                "Demographics are required the first time a member is ingested, afterwards only the fields that changed."
+            ),
+        ),
+    },
+)
+
+population_model = api.model(
+    "PopulationRequest",
+    {
+        "members": fields.List(
+            fields.Raw,
+            required=True,
+            description=f"List of member payloads (max {MAX_BATCH_SIZE}), as in BatchRAFRequest. Larger populations can be streamed as an application/x-ndjson body, one member per line.",
+        ),
+        "percentiles": fields.List(
+            fields.Float,
+            example=[5, 50, 95],
+            description="Percentiles of the risk scores to report, 1, 5, 10, 25, 50, 75, 90, 95 and 99 if omitted. Query parameter percentiles=5,50,95 for NDJSON bodies.",
+        ),
+        "bucket_width": fields.Float(
+            example=0.25,
+            description="Width of the normalized score distribution buckets, 0.25 if omitted. Query parameter for NDJSON bodies.",
+        ),
+    },
+)
+
+def payload_object() -> dict|None:
+    """The JSON body of the request if it is an object, {} if there is none, None for any other JSON value"""
+    data = api.payload
+    if data is None:
+        return {}
+    return data if isinstance(data, dict) else None
+
+NOT_AN_OBJECT = {"error": "Request body must be a JSON object"}, 400
+
+def cached_json_response(route: str, data: dict, compute) -> Response:
+    """The JSON response of a scoring route through the response cache, with its ETag, or a 304 when If-None-Match matches it"""
+    response = cached_response(route, data, compute)
+    if etag_matches(request.headers.get("If-None-Match"), response.etag):
+        return Response(status=304, headers={"ETag": response.etag})
+    return Response(response.body, 200, mimetype="application/json", headers={"ETag": response.etag})
+
 # Defining calculate-raf-v28 route with POST method
 # CMS-HCC Model V28 is the latest version of the CMS-HCC risk adjustment model. CMS defines annual updates to the model and will eventually deprecate this version.
 @ns_v1.route("/raf-v28/multi")
@@ -181,10 +346,9 @@ class CalculateRAFMulti(Resource):
     def post(self):
         """Calculate RAF using the provided diagnosis codes, age, and sex."""
         data = api.payload
-        print("Received data:", data)  # Debugging line to check incoming data
+        log_sampled("request", route="/raf-v28/multi", payload=data)
         try:
-            response = get_multi_response_v28(**data)
-            return response, 200
+            return cached_json_response("/v1/raf-v28/multi", data, lambda: render_multi_response_v28(**data))
         except Exception as e:
             return {"error": str(e)}, 400
         
@@ -195,14 +359,258 @@ class CalculateRAFSingle(Resource):
     def post(self):
         """Calculate the RAF coefficient of a single diagnosis, with the ICD-10, age, and sex."""
         data = api.payload
-        print("Received data:", data)  # Debugging line to check incoming data
+        log_sampled("request", route="/raf-v28/single", payload=data)
 
         try:
-            response = get_single_response_v28(**data)
+            return cached_json_response("/v1/raf-v28/single", data, lambda: dumps(get_single_response_v28(**data)))
+        except Exception as e:
+            return {"error": str(e)}, 400
+
+@ns_v1.route("/raf-v28/single/bulk")
+class CalculateRAFSingleBulk(Resource):
+    @api.expect(single_bulk_raf_model)
+    @require_auth
+    def post(self):
+        """Calculate the RAF coefficient of each diagnosis on its own, for one age/sex/eligibility. Errors are reported per code."""
+        data = payload_object()
+        if data is None:
+            return NOT_AN_OBJECT
+        diagnosis_codes = data.get("diagnosis_codes")
+        if not isinstance(diagnosis_codes, list):
+            return {"error": "diagnosis_codes must be a list"}, 400
+        if len(diagnosis_codes) > MAX_BATCH_SIZE:
+            return {"error": f"Too many diagnosis codes: {len(diagnosis_codes)}, maximum is {MAX_BATCH_SIZE}"}, 413
+
+        try:
+            response = get_single_bulk_response_v28(**data)
+            return response, 200
+        except Exception as e:
+            return {"error": str(e)}, 400
+
+@ns_v1.route("/raf-v28/what-if")
+class CalculateRAFWhatIf(Resource):
+    @api.expect(what_if_raf_model)
+    @require_auth
+    def post(self):
+        """Calculate the score change of adding or removing each candidate diagnosis, one at a time, against the member's current codes."""
+        data = payload_object()
+        if data is None:
+            return NOT_AN_OBJECT
+        for key in ("diagnosis_codes", "add", "remove"):
+            if data.get(key) is not None and not isinstance(data[key], list):
+                return {"error": f"{key} must be a list"}, 400
+        candidate_count = len(data.get("add") or []) + len(data.get("remove") or [])
+        if candidate_count > MAX_BATCH_SIZE:
+            return {"error": f"Too many candidates: {candidate_count}, maximum is {MAX_BATCH_SIZE}"}, 413
+
+        try:
+            response = get_what_if_response_v28(**data)
+            return response, 200
+        except Exception as e:
+            return {"error": str(e)}, 400
+
+@ns_v1.route("/raf/blended")
+class CalculateRAFBlended(Resource):
+    @api.expect(blended_raf_model)
+    @require_auth
+    def post(self):
+        """Score one member under every model of the requested payment years, with per-model and blended scores."""
+        data = payload_object()
+        if data is None:
+            return NOT_AN_OBJECT
+        log_sampled("request", route="/raf/blended", payload=data)
+        for key in ("diagnosis_codes", "payment_years"):
+            if data.get(key) is not None and not isinstance(data[key], list):
+                return {"error": f"{key} must be a list"}, 400
+        if data.get("year_factors") is not None and not isinstance(data["year_factors"], dict):
+            return {"error": "year_factors must be an object"}, 400
+
+        try:
+            return cached_json_response("/v1/raf/blended", data, lambda: dumps(get_blended_response(**data)))
+        except Exception as e:
+            return {"error": str(e)}, 400
+
+@ns_v1.route("/raf-v28/batch")
+class CalculateRAFBatch(Resource):
+    @api.expect(batch_raf_model)
+    @require_auth
+    def post(self):
+        """Calculate RAF for many members in one request. Errors are reported per member and don't fail the batch."""
+        data = payload_object()
+        if data is None:
+            return NOT_AN_OBJECT
+        members = data.get("members")
+        if not isinstance(members, list):
+            return {"error": "members must be a list"}, 400
+        if len(members) > MAX_BATCH_SIZE:
+            return {"error": f"Batch too large: {len(members)} members, maximum is {MAX_BATCH_SIZE}"}, 413
+
+        try:
+            response = render_batch_response_v28(members)
+            return Response(response, 200, mimetype="application/json")
+        except Exception as e:
+            return {"error": str(e)}, 400
+
+@ns_v1.route("/raf-v28/population")
+class PopulationAggregates(Resource):
+    @api.expect(population_model)
+    @require_auth
+    def post(self):
+        """Aggregate the scores of a population: score percentiles and distribution, HCC prevalence, and interaction and payable HCC count frequencies by community segment."""
+        if request.mimetype == "application/x-ndjson":
+            options = request.args
+            try:
+                percentiles = parse_percentiles(options["percentiles"]) if "percentiles" in options else DEFAULT_PERCENTILES
+            except ValueError as e:
+                return {"error": f"percentiles: {e}"}, 400
+        else:
+            options = payload_object()
+            if options is None:
+                return NOT_AN_OBJECT
+            members = options.get("members")
+            if not isinstance(members, list):
+                return {"error": "members must be a list"}, 400
+            if len(members) > MAX_BATCH_SIZE:
+                return {"error": f"Too many members: {len(members)}, maximum is {MAX_BATCH_SIZE}. Stream larger populations as NDJSON"}, 413
+            percentiles = options.get("percentiles") or DEFAULT_PERCENTILES
+            if not isinstance(percentiles, list | tuple) or not all(isinstance(p, int | float) and 0 < p <= 100 for p in percentiles):
+                return {"error": "percentiles must be a list of numbers between 0 (excluded) and 100"}, 400
+        try:
+            bucket_width = float(options.get("bucket_width", DEFAULT_BUCKET_WIDTH))
+        except (TypeError, ValueError):
+            bucket_width = 0
+        if not bucket_width >= 0.001:
+            return {"error": "bucket_width must be a number, at least 0.001"}, 400
+
+        try:
+            if request.mimetype == "application/x-ndjson":
+                aggregate = aggregate_stream(request.stream)
+            else:
+                aggregate = PopulationAggregate().add_members(members)
+            return aggregate.summary(percentiles, bucket_width), 200
+        except Exception as e:
+            return {"error": str(e)}, 400
+
+@ns_v1.route("/raf-v28/eob")
+class CalculateRAFEOB(Resource):
+    @api.expect(eob_raf_model)
+    @require_auth
+    def post(self):
+        """Calculate RAF from one patient's FHIR EOBs: extract the service lines, apply the risk adjustment filter and score the remaining diagnoses."""
+        data = payload_object()
+        if data is None:
+            return NOT_AN_OBJECT
+        data = dict(data)
+        eobs, ndjson = data.pop("eobs", None), data.pop("ndjson", None)
+        if (eobs is None) == (ndjson is None):
+            return {"error": "Provide exactly one of eobs or ndjson"}, 400
+        if ndjson is not None:
+            if not isinstance(ndjson, str):
+                return {"error": "ndjson must be a string"}, 400
+            eobs, errors = parse_ndjson_text(ndjson)
+        elif isinstance(eobs, (list, dict)):
+            errors = []
+        else:
+            return {"error": "eobs must be a list or a Bundle"}, 400
+        eobs = flatten_eobs(eobs)
+        if len(eobs) > MAX_BATCH_SIZE:
+            return {"error": f"Too many EOBs: {len(eobs)}, maximum is {MAX_BATCH_SIZE}"}, 413
+
+        try:
+            response = get_claims_response_v28(eobs, "fhir", errors=errors, **data)
+            return response, 200
+        except Exception as e:
+            return {"error": str(e)}, 400
+
+@ns_v1.route("/raf-v28/837")
+class CalculateRAF837(Resource):
+    @api.expect(x12_raf_model)
+    @require_auth
+    def post(self):
+        """Calculate RAF from one patient's 837 claims: extract the service lines, apply the risk adjustment filter and score the remaining diagnoses."""
+        data = payload_object()
+        if data is None:
+            return NOT_AN_OBJECT
+        data = dict(data)
+        documents = data.pop("x12", None)
+        if isinstance(documents, str):
+            documents = [documents]
+        if not isinstance(documents, list):
+            return {"error": "x12 must be a string or a list of strings"}, 400
+        if len(documents) > MAX_BATCH_SIZE:
+            return {"error": f"Too many 837 documents: {len(documents)}, maximum is {MAX_BATCH_SIZE}"}, 413
+
+        try:
+            response = get_claims_response_v28(documents, "837", **data)
             return response, 200
         except Exception as e:
             return {"error": str(e)}, 400
 
+MEMBER_STORE_DISABLED = {"error": "The member state store is disabled, set RAF_MEMBER_STATE_DB"}, 503
+
+@ns_v1.route("/raf-v28/members/ingest")
+class IngestMembers(Resource):
+    @api.expect(member_ingest_model)
+    @require_auth
+    def post(self):
+        """Add members' new diagnosis codes or claims to their stored state, rescoring only the members whose CCs or demographics changed."""
+        store = get_member_store()
+        if store is None:
+            return MEMBER_STORE_DISABLED
+        data = payload_object()
+        if data is None:
+            return NOT_AN_OBJECT
+        members = data.get("members")
+        if not isinstance(members, list):
+            return {"error": "members must be a list"}, 400
+        if len(members) > MAX_BATCH_SIZE:
+            return {"error": f"Batch too large: {len(members)} members, maximum is {MAX_BATCH_SIZE}"}, 413
+
+        try:
+            response = store.ingest(members)
+            return response, 200
+        except Exception as e:
+            return {"error": str(e)}, 400
+
+@ns_v1.route("/raf-v28/members/<string:member_id>")
+class MemberState(Resource):
+    @require_auth
+    def get(self, member_id):
+        """The /multi response for a member's stored state, scored on every diagnosis code ingested for them."""
+        store = get_member_store()
+        if store is None:
+            return MEMBER_STORE_DISABLED
+        response = store.render(member_id)
+        if response is None:
+            return {"error": f"Unknown member {member_id}"}, 404
+        return Response(response, 200, mimetype="application/json")
+
+    @require_auth
+    def delete(self, member_id):
+        """Forget a member's stored state."""
+        store = get_member_store()
+        if store is None:
+            return MEMBER_STORE_DISABLED
+        if not store.delete(member_id):
+            return {"error": f"Unknown member {member_id}"}, 404
+        return {"member_id": member_id, "deleted": True}, 200
+
+@ns_v1.route("/cache-stats")
+class CacheStats(Resource):
+    @require_auth
+    def get(self):
+        """Hit/miss/eviction counters of the demographic profile cache (size it with HCCINFHIR_PROFILE_CACHE_SIZE) and of the response cache."""
+        stats = get_cache_stats()
+        stats["response_cache"] = response_cache.stats() if response_cache is not None else None
+        return stats, 200
+
+
+# Optional instrumentation, off by default: GET /metrics (RAF_METRICS) and per-request profiling (RAF_PROFILING)
+if metrics.METRICS_ENABLED:
+    metrics.init_flask(app, api)
+if profiler.PROFILING_ENABLED:
+    profiler.init_flask(app)
+
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,272 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import os
+import sqlite3
+import threading
+import time
+from hccinfhir.model_calculate import calculate_raf_from_mapping, get_demographic_profile
+from hccinfhir.datamodels import DemographicsRecord
+from hccinfhir.model_dx_to_cc import apply_mapping
+from hccinfhir.extractor import extract_sld
+from hccinfhir.stream import loads
+from app.render import dumps, render_multi_response
+from app.utils import claims_processor, flatten_eobs, resolve_dual_elgbl_cd
+
+# Longitudinal member state, for scoring members incrementally as their claims come in.
+#
+# Each member's state is what scoring their year-to-date diagnosis codes depends on: the CC -> dx sets
+# of apply_mapping, their demographics, and the result of the last scoring (scores, HCCs after
+# hierarchies, interactions and coefficients). Ingesting new codes maps only the new codes and merges
+# them into the stored sets. Hierarchies, interactions and coefficients run again only when the
+# member's CC set or demographics changed. New codes that only add a dx to a CC the member already had
+# update the stored sets without rescoring, and codes already known change nothing.
+#
+# The store is a SQLite database named by RAF_MEMBER_STATE_DB, which gunicorn workers can share (WAL
+# mode, each ingest is one write transaction). Unset, the member routes are disabled. The stored CCs
+# come from the dx to CC tables loaded when they were ingested: rebuild the store when the tables
+# change (e.g. for a new payment year), or the old mapping carries over.
+
+MEMBER_STATE_DB = os.getenv("RAF_MEMBER_STATE_DB")
+MODEL_NAME = "CMS-HCC Model V28"
+
+DEMOGRAPHIC_FIELDS = ("age", "sex", "dual_elgbl_cd", "orec", "crec", "new_enrollee", "snp")
+
+# Members read per SELECT, below SQLite's limit of bound parameters
+READ_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS member_state (
+    member_id TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    demographics TEXT NOT NULL,
+    cc_to_dx TEXT NOT NULL,
+    score TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    scored_at REAL NOT NULL,
+    PRIMARY KEY (member_id, model_name)
+)
+"""
+
+
+def normalize_demographics(fields: dict) -> dict:
+    """The demographic fields of a request, with the dual status aliases resolved, so that equal demographics compare equal"""
+    demographics = {key: fields.get(key) for key in DEMOGRAPHIC_FIELDS}
+    demographics["dual_elgbl_cd"] = resolve_dual_elgbl_cd(demographics["dual_elgbl_cd"])
+    demographics["new_enrollee"] = bool(demographics["new_enrollee"])
+    demographics["snp"] = bool(demographics["snp"])
+    return demographics
+
+
+def claims_diagnosis_codes(claims, format: str, filter_claims: bool = True) -> list:
+    """The diagnosis codes of claims (FHIR EOBs or Bundles, or 837 documents when format is "837") left by the risk adjustment filter"""
+    if format == "fhir":
+        claims = flatten_eobs(claims)
+    elif isinstance(claims, str):
+        claims = [claims]
+    if not isinstance(claims, list):
+        raise ValueError("Claims must be a list")
+    sld_list = [sld for claim in claims for sld in extract_sld(claim, format)]
+    if filter_claims:
+        sld_list = claims_processor.claim_filter.filter(sld_list)
+    return sorted({code for sld in sld_list for code in sld.claim_diagnosis_codes})
+
+
+def merge_mapping(cc_to_dx: dict, new_cc_to_dx: dict) -> tuple[dict, bool, bool]:
+    """(merged CC -> dx sets, whether the CC set changed, whether any dx set changed), cc_to_dx itself when nothing changed"""
+    if all(cc in cc_to_dx and dx.issubset(cc_to_dx[cc]) for cc, dx in new_cc_to_dx.items()):
+        return cc_to_dx, False, False
+    merged = {cc: set(dx) for cc, dx in cc_to_dx.items()}
+    ccs_changed = dx_changed = False
+    for cc, dx in new_cc_to_dx.items():
+        current = merged.get(cc)
+        if current is None:
+            merged[cc] = set(dx)
+            ccs_changed = True
+        elif not dx <= current:
+            current |= dx
+            dx_changed = True
+    return merged, ccs_changed, dx_changed
+
+
+class MemberStateStore:
+    """
+    Member states in a SQLite database. Thread-safe (one connection per thread), and safe to share
+    between processes.
+    """
+
+    def __init__(self, path: str, model_name: str = MODEL_NAME):
+        self.path = path
+        self.model_name = model_name
+        self._local = threading.local()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _read(self, connection: sqlite3.Connection, member_ids: list) -> dict:
+        rows = {}
+        for start in range(0, len(member_ids), READ_CHUNK):
+            chunk = member_ids[start:start + READ_CHUNK]
+            cursor = connection.execute(
+                "SELECT member_id, demographics, cc_to_dx, score, updated_at, scored_at FROM member_state "
+                f"WHERE model_name = ? AND member_id IN ({','.join('?' * len(chunk))})",
+                (self.model_name, *chunk))
+            for member_id, demographics, cc_to_dx, score, updated_at, scored_at in cursor:
+                rows[member_id] = {
+                    "demographics": loads(demographics),
+                    "cc_to_dx": loads(cc_to_dx),  # CC -> dx lists, merge_mapping() makes sets when they change
+                    "score": score,
+                    "updated_at": updated_at,
+                    "scored_at": scored_at,
+                }
+        return rows
+
+    def get(self, member_id: str) -> dict|None:
+        """The stored state of a member: demographics, CC -> dx lists and last score (JSON), or None"""
+        return self._read(self.connection(), [member_id]).get(member_id)
+
+    def score(self, demographics: dict, cc_to_dx: dict) -> str:
+        """
+        Hierarchies, interactions and coefficients for a member's CCs, as the JSON stored for the member:
+        the calculate_raf() result without the mapping, and only the interactions that are set.
+        """
+        profile = get_demographic_profile(self.model_name, **demographics)
+        raw_response = calculate_raf_from_mapping(cc_to_dx, [], profile, self.model_name)
+        return dumps({
+            **{key: raw_response[key] for key in ("risk_score", "risk_score_demographics", "risk_score_chronic_only",
+                                                  "risk_score_hcc", "hcc_list", "coefficients")},
+            "interactions": {key: value for key, value in raw_response["interactions"].items() if value},
+            "demographics": raw_response["demographics"].model_dump(),
+        })
+
+    def ingest(self, records: list) -> dict:
+        """
+        Add the new diagnosis codes (and changed demographics) of members, each record being
+        {"member_id", "diagnosis_codes", and the demographic fields}. Demographics are required for a
+        member the store doesn't know yet; later records only need the fields that changed. A record can
+        also carry claims, "eobs" or "x12" as on the claims routes, whose codes are extracted and filtered
+        (unless "filter_claims" is false).
+
+        Returns how many members were created, rescored, updated without rescoring (a new dx for a CC
+        they already had) and left unchanged, and the status of each record. Errors are reported per
+        record and don't fail the others.
+        """
+        counts = {"created": 0, "rescored": 0, "updated": 0, "unchanged": 0, "error_count": 0}
+        results = [None] * len(records)
+        prepared = []
+        # Mapping (and claims extraction) happens before taking the database's write lock
+        for index, record in enumerate(records):
+            try:
+                prepared.append((index, *self._prepare(record)))
+            except Exception as e:
+                counts["error_count"] += 1
+                results[index] = {"member_id": record.get("member_id") if isinstance(record, dict) else None, "error": str(e)}
+
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            states = self._read(connection, list(dict.fromkeys(member_id for _, member_id, *_ in prepared)))
+            writes = {}
+            now = time.time()
+            for index, member_id, new_cc_to_dx, fields in prepared:
+                try:
+                    status = self._apply(member_id, new_cc_to_dx, fields, writes.get(member_id) or states.get(member_id), writes, now)
+                except Exception as e:
+                    counts["error_count"] += 1
+                    results[index] = {"member_id": member_id, "error": str(e)}
+                    continue
+                counts[status] += 1
+                results[index] = {"member_id": member_id, "status": status}
+
+            connection.executemany(
+                "INSERT INTO member_state (member_id, model_name, demographics, cc_to_dx, score, created_at, updated_at, scored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (member_id, model_name) DO UPDATE SET demographics = excluded.demographics, "
+                "cc_to_dx = excluded.cc_to_dx, score = excluded.score, updated_at = excluded.updated_at, scored_at = excluded.scored_at",
+                [(member_id, self.model_name, dumps(state["demographics"]),
+                  dumps({cc: sorted(dx) for cc, dx in state["cc_to_dx"].items()}),
+                  state["score"], now, now, state["scored_at"])
+                 for member_id, state in writes.items()])
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return {"member_count": len(results), **counts, "results": results}
+
+    def _prepare(self, record) -> tuple[str, dict, dict]:
+        """(member_id, CC -> dx sets of the record's new codes, the demographic fields it sends)"""
+        if not isinstance(record, dict):
+            raise ValueError("Each member must be an object")
+        member_id = record.get("member_id")
+        if not isinstance(member_id, str) or not member_id:
+            raise ValueError("member_id must be a non-empty string")
+        diagnosis_codes = record.get("diagnosis_codes") or []
+        if not isinstance(diagnosis_codes, list):
+            raise ValueError("diagnosis_codes must be a list")
+        for key, format in (("eobs", "fhir"), ("x12", "837")):
+            if record.get(key):
+                diagnosis_codes = diagnosis_codes + claims_diagnosis_codes(record[key], format, record.get("filter_claims", True))
+        fields = {key: record[key] for key in DEMOGRAPHIC_FIELDS if key in record}
+        return member_id, apply_mapping(diagnosis_codes, self.model_name), fields
+
+    def _apply(self, member_id: str, new_cc_to_dx: dict, fields: dict, state: dict|None, writes: dict, now: float) -> str:
+        """Merge a record into the member's state, adding the new state to writes if it changed. Returns the status"""
+        if state is None:
+            missing = [key for key in ("age", "sex") if fields.get(key) is None]
+            if missing:
+                raise ValueError(f"Missing required field(s) for a new member: {', '.join(missing)}")
+            demographics = normalize_demographics(fields)
+            writes[member_id] = {"demographics": demographics, "cc_to_dx": new_cc_to_dx,
+                                 "score": self.score(demographics, new_cc_to_dx), "scored_at": now}
+            return "created"
+
+        demographics = normalize_demographics({**state["demographics"], **fields}) if fields else state["demographics"]
+        cc_to_dx, ccs_changed, dx_changed = merge_mapping(state["cc_to_dx"], new_cc_to_dx)
+        if ccs_changed or demographics != state["demographics"]:
+            writes[member_id] = {"demographics": demographics, "cc_to_dx": cc_to_dx,
+                                 "score": self.score(demographics, cc_to_dx), "scored_at": now}
+            return "rescored"
+        if dx_changed:
+            writes[member_id] = {**state, "cc_to_dx": cc_to_dx}
+            return "updated"
+        return "unchanged"
+
+    def render(self, member_id: str) -> bytes|None:
+        """The /multi response JSON for a member's stored state, as if all their codes were sent to /multi"""
+        state = self.get(member_id)
+        if state is None:
+            return None
+        score = loads(state["score"])
+        score["demographics"] = DemographicsRecord(**score["demographics"])
+        return render_multi_response({**score, "cc_to_dx": state["cc_to_dx"]})
+
+    def delete(self, member_id: str) -> bool:
+        cursor = self.connection().execute("DELETE FROM member_state WHERE member_id = ? AND model_name = ?",
+                                           (member_id, self.model_name))
+        return cursor.rowcount > 0
+
+    def stats(self) -> dict:
+        (members,) = self.connection().execute("SELECT COUNT(*) FROM member_state WHERE model_name = ?",
+                                               (self.model_name,)).fetchone()
+        return {"path": self.path, "model_name": self.model_name, "members": members}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_member_store() -> MemberStateStore|None:
+    """The store at RAF_MEMBER_STATE_DB, opened on first use, or None when it isn't configured"""
+    global _store
+    if MEMBER_STATE_DB is None:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = MemberStateStore(MEMBER_STATE_DB)
+    return _store
@@ -0,0 +1,298 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# Prometheus metrics for the service, served in the text exposition format on GET /metrics.
+#
+# Off unless RAF_METRICS=true. Disabled, nothing is wrapped and no hooks are registered, so the
+# request path is exactly the uninstrumented one. Enabled, instrument() wraps the scoring stages
+# (categorize_demographics, apply_mapping, apply_hierarchies, apply_interactions, apply_coefficients),
+# the response formatting and the payload validation with timers, each observation costing about a
+# microsecond.
+#
+# Metrics live in the memory of the process that records them: under gunicorn each worker serves its
+# own, and with the ASGI process executor the stage timings stay in the executor processes (request
+# counts and latencies are still recorded by the server process).
+
+METRICS_ENABLED = os.getenv("RAF_METRICS", "false").lower() == "true"
+
+# Seconds; stages run in microseconds, whole requests in milliseconds
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1.0)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Counter:
+    """A monotonically increasing count, per combination of label values"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            return [(self.name, format_labels(self.labels, key), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations, per combination of label values"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def _entry(self, label_values: tuple) -> list:
+        entry = self._values.get(label_values)
+        if entry is None:
+            entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        return entry
+
+    def observe(self, *label_values, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._entry(label_values)
+            entry[0][index] += 1
+            entry[1] += value
+
+    def bind(self, *label_values):
+        """observe() bound to one combination of label values, without the per-call lookup"""
+        with self._lock:
+            counts, _ = entry = self._entry(label_values)
+        buckets, lock = self.buckets, self._lock
+
+        def observe(value: float) -> None:
+            index = bisect_left(buckets, value)
+            with lock:
+                counts[index] += 1
+                entry[1] += value
+
+        return observe
+
+    def samples(self) -> list:
+        with self._lock:
+            values = sorted((key, list(counts), total) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((self.name + "_bucket", format_labels(self.labels + ("le",), key + (le,)), cumulative))
+            samples.append((self.name + "_sum", format_labels(self.labels, key), total))
+            samples.append((self.name + "_count", format_labels(self.labels, key), cumulative))
+        return samples
+
+
+class Collected:
+    """Values read from elsewhere at scrape time, e.g. the counters of a cache: fn() returns {label values: value}"""
+
+    def __init__(self, name: str, documentation: str, kind: str, fn, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labels = labels
+        self.fn = fn
+
+    def samples(self) -> list:
+        return [(self.name, format_labels(self.labels, key), value) for key, value in sorted(self.fn().items())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        self._metrics.pop(name, None)
+
+    def render(self) -> bytes:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {float(value)!r}")
+        return ("\n".join(lines) + "\n").encode()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry()
+stage_seconds = registry.register(Histogram(
+    "raf_stage_seconds", "Time spent in each stage of a request", ("stage",), STAGE_BUCKETS))
+request_seconds = registry.register(Histogram(
+    "raf_request_seconds", "Request handling time, until the response is ready", ("route",), REQUEST_BUCKETS))
+requests_total = registry.register(Counter(
+    "raf_requests_total", "Requests answered, by route and status", ("route", "status")))
+errors_total = registry.register(Counter(
+    "raf_request_errors_total", "Requests answered with a 4xx or 5xx status, by route and status", ("route", "status")))
+unmapped_dx_total = registry.register(Counter(
+    "raf_unmapped_diagnosis_codes_total", "Submitted diagnosis codes that map to no CC in the model (unknown or not risk adjusting)"))
+diagnosis_codes_total = registry.register(Counter(
+    "raf_diagnosis_codes_total", "Distinct diagnosis codes submitted for mapping"))
+
+
+def observe_request(route: str, status: int, seconds: float) -> None:
+    request_seconds.observe(route, value=seconds)
+    requests_total.inc(route, str(status))
+    if status >= 400:
+        errors_total.inc(route, str(status))
+
+
+def timed(stage: str, fn):
+    """fn, recording each call's duration under stage in raf_stage_seconds"""
+    observe = stage_seconds.bind(stage)
+    perf_counter = time.perf_counter
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            observe(perf_counter() - start)
+
+    wrapper.__wrapped_stage__ = stage
+    return wrapper
+
+
+def timed_mapping(fn):
+    """apply_mapping, timed, also counting the submitted codes that map to no CC"""
+    observe = stage_seconds.bind("apply_mapping")
+    perf_counter = time.perf_counter
+
+    @wraps(fn)
+    def wrapper(diagnoses, *args, **kwargs):
+        start = perf_counter()
+        try:
+            cc_to_dx = fn(diagnoses, *args, **kwargs)
+        finally:
+            observe(perf_counter() - start)
+        submitted = {dx.upper().replace(".", "") for dx in diagnoses}
+        diagnosis_codes_total.inc(amount=len(submitted))
+        unmapped_dx_total.inc(amount=len(submitted.difference(*cc_to_dx.values())))
+        return cc_to_dx
+
+    wrapper.__wrapped_stage__ = "apply_mapping"
+    return wrapper
+
+
+def wrap(module, name: str, wrapper) -> None:
+    """Replace module.name by wrapper(module.name), once"""
+    fn = getattr(module, name)
+    if not hasattr(fn, "__wrapped_stage__"):
+        setattr(module, name, wrapper(fn))
+
+
+_instrumented = False
+
+
+def instrument() -> None:
+    """Wrap the scoring stages and the response formatting with timers, and register the cache metrics"""
+    global _instrumented
+    if _instrumented:
+        return
+    _instrumented = True
+    from hccinfhir import model_calculate
+    from app import render, utils
+
+    # The scoring stages are looked up as globals of model_calculate when calculate_raf runs
+    wrap(model_calculate, "categorize_demographics_record", lambda fn: timed("categorize_demographics", fn))
+    wrap(model_calculate, "apply_mapping", timed_mapping)
+    wrap(model_calculate, "apply_mapping_models", lambda fn: timed("apply_mapping", fn))
+    for stage in ("apply_hierarchies", "apply_interactions", "apply_coefficients"):
+        wrap(model_calculate, stage, lambda fn, stage=stage: timed(stage, fn))
+    wrap(render, "render_multi_response", lambda fn: timed("format_response", fn))
+    for name in ("format_multi_response", "make_profile_summary", "make_impact_breakdown"):
+        wrap(utils, name, lambda fn: timed("format_response", fn))
+
+    def profile_cache_counters():
+        stats = utils.profile_cache.stats()
+        return {("hit",): stats["hits"], ("miss",): stats["misses"], ("eviction",): stats["evictions"]}
+
+    registry.register(Collected(
+        "raf_profile_cache_total", "Demographic profile cache lookups and evictions", "counter", profile_cache_counters, ("result",)))
+    registry.register(Collected(
+        "raf_profile_cache_size", "Demographic profiles cached", "gauge", lambda: {(): utils.profile_cache.stats()["size"]}))
+
+    from app.response_cache import response_cache
+    if response_cache is None:
+        return
+
+    def response_cache_counters():
+        stats = response_cache.stats()
+        return {(result,): stats[key] for result, key in
+                (("hit", "hits"), ("miss", "misses"), ("eviction", "evictions"), ("expiration", "expirations"))}
+
+    registry.register(Collected(
+        "raf_response_cache_total", "Response cache lookups, evictions and expirations", "counter", response_cache_counters, ("result",)))
+    registry.register(Collected(
+        "raf_response_cache_size", "Responses cached", "gauge", lambda: {(): response_cache.stats()["size"]}))
+
+
+def init_flask(app, api) -> None:
+    """Instrument the Flask app: stage timers, request metrics, payload validation timing and GET /metrics"""
+    from flask import Response, g, request
+    from flask_restx import Resource
+    from app.auth import require_auth
+
+    instrument()
+
+    # Flask-RESTX validates the payload of routes with @api.expect in Resource.validate_payload. Parse
+    # the body there as well (Flask caches it for api.payload), so the stage covers JSON parsing too
+    validate_payload = Resource.validate_payload
+
+    def timed_validate_payload(self, func):
+        start = time.perf_counter()
+        try:
+            request.get_json(silent=True)
+            return validate_payload(self, func)
+        finally:
+            stage_seconds.observe("validation", value=time.perf_counter() - start)
+
+    Resource.validate_payload = timed_validate_payload
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None and request.url_rule is not None and request.path != "/metrics":
+            observe_request(request.url_rule.rule, response.status_code, time.perf_counter() - start)
+        return response
+
+    @app.route("/metrics")
+    @require_auth
+    def metrics():
+        return Response(registry.render(), 200, content_type=CONTENT_TYPE)
@@ -0,0 +1,81 @@
+import json
+import os
+
+# Per payment year factors for blended scoring: the models CMS blends that year with their weights and
+# normalization factors, and the MA coding pattern (coding intensity) adjustment. For a payment year:
+#
+#   risk_score_normalized (per model) = risk_score / normalization
+#   blended_risk_score = sum(weight * risk_score_normalized)
+#   risk_score_adjusted = blended_risk_score * (1 - coding_intensity)
+#
+# The defaults are the CY2024 and CY2025 rate announcement values for the CMS-HCC model. Other years, or
+# corrected factors, are added from a JSON file named by RAF_PAYMENT_YEARS_FILE, same shape as
+# PAYMENT_YEARS (years as keys, a year given in the file replaces the default one). Requests can override
+# the factors of a year too (see resolve_payment_year()).
+#
+# RAF_PAYMENT_YEAR is the payment year of the single-model V28 routes, whose risk_score_normalized
+# divides by that year's V28 normalization factor (NORM_FACTOR in app/utils.py).
+
+PAYMENT_YEARS = {
+    2024: {
+        "coding_intensity": 0.059,
+        "models": {
+            "CMS-HCC Model V24": {"weight": 0.67, "normalization": 1.146},
+            "CMS-HCC Model V28": {"weight": 0.33, "normalization": 1.015},
+        },
+    },
+    2025: {
+        "coding_intensity": 0.059,
+        "models": {
+            "CMS-HCC Model V24": {"weight": 0.33, "normalization": 1.067},
+            "CMS-HCC Model V28": {"weight": 0.67, "normalization": 1.045},
+        },
+    },
+}
+
+PAYMENT_YEARS_FILE = os.getenv("RAF_PAYMENT_YEARS_FILE")
+if PAYMENT_YEARS_FILE:
+    with open(PAYMENT_YEARS_FILE) as f:
+        PAYMENT_YEARS.update({int(year): factors for year, factors in json.load(f).items()})
+
+PAYMENT_YEAR = int(os.getenv("RAF_PAYMENT_YEAR", "2025"))
+
+
+def validate_payment_year(year: int, factors: dict) -> dict:
+    """Check the factors of a payment year, raising ValueError when they cannot be used for blending"""
+    models = factors.get("models")
+    if not isinstance(models, dict) or not models:
+        raise ValueError(f"Payment year {year} has no models")
+    coding_intensity = factors.get("coding_intensity", 0)
+    if not isinstance(coding_intensity, (int, float)) or not 0 <= coding_intensity < 1:
+        raise ValueError(f"Payment year {year}: coding_intensity must be a number in [0, 1)")
+    for model_name, model in models.items():
+        weight, normalization = model.get("weight"), model.get("normalization")
+        if not isinstance(weight, (int, float)) or weight < 0:
+            raise ValueError(f"Payment year {year}, {model_name}: weight must be a non-negative number")
+        if not isinstance(normalization, (int, float)) or normalization <= 0:
+            raise ValueError(f"Payment year {year}, {model_name}: normalization must be a positive number")
+    total = sum(model["weight"] for model in models.values())
+    if abs(total - 1) > 1e-6:
+        raise ValueError(f"Payment year {year}: model weights must add up to 1, got {total:g}")
+    return factors
+
+
+def resolve_payment_year(year: int, overrides: dict|None = None) -> dict:
+    """
+    The factors of a payment year, with a request's overrides: a coding_intensity, and/or models replacing
+    the configured ones. Raises ValueError for unknown years or invalid factors.
+    """
+    factors = PAYMENT_YEARS.get(year)
+    if factors is None and not (overrides and "models" in overrides):
+        raise ValueError(f"Unknown payment year {year}, configured years are {sorted(PAYMENT_YEARS)}")
+    factors = {**(factors or {}), **(overrides or {})}
+    return validate_payment_year(year, factors)
+
+
+def normalization_factor(model_name: str, year: int = PAYMENT_YEAR) -> float:
+    """The normalization factor of a model in a payment year"""
+    try:
+        return PAYMENT_YEARS[year]["models"][model_name]["normalization"]
+    except KeyError:
+        raise ValueError(f"No normalization factor for {model_name} in payment year {year}") from None
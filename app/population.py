@@ -0,0 +1,349 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import contextlib
+import json
+import math
+import sys
+import time
+from collections import Counter
+from functools import lru_cache
+from hccinfhir.stream import loads
+from app.bulk import open_input
+from app.utils import NORM_FACTOR, calculate_batch_v28, coefficient_labels, is_model_code, make_community_label
+
+# Plan-level aggregates of V28 scores in one streaming pass, from the command line or the
+# /v1/raf-v28/population route:
+#
+#   python -m app.population members.ndjson --workers 4 -o population.json
+#
+# Members are scored as they are read and folded into counters: score histograms, HCC prevalence, and
+# per community segment the interaction and payable HCC count (D1..D10P) frequencies. Nothing per
+# member is kept, so memory depends on the number of distinct scores and codes, not on members.
+#
+# Scores are counted at the 3 decimals the routes report, so the percentiles are exact for the scores
+# a /multi call per member would return. The counters add up: aggregates of parts of a population
+# (worker processes, or runs over shards of the member file saved with --state) merge into the
+# aggregate of the whole.
+
+DEFAULT_PERCENTILES = (1, 5, 10, 25, 50, 75, 90, 95, 99)
+DEFAULT_BUCKET_WIDTH = 0.25
+D_COUNT_CODES = ("D1", "D2", "D3", "D4", "D5", "D6", "D7", "D8", "D9", "D10P")
+STATE_SCHEMA = 1
+
+
+@lru_cache(maxsize=None)
+def segment_label(new_enrollee: bool, pbd: bool, fbd: bool, disabled: bool) -> str:
+    return make_community_label({"new_enrollee": new_enrollee, "pbd": pbd, "fbd": fbd, "disabled": disabled})
+
+
+class ScoreHistogram:
+    """Counts of scores at the 3 decimals of the responses, with their sum for the mean"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0.0
+
+    def add(self, score: float) -> None:
+        self.counts[round(round(score, 3) * 1000)] += 1  # rounded as the routes round, then an exact integer key
+        self.total += score
+
+    def merge(self, other: "ScoreHistogram") -> None:
+        self.counts.update(other.counts)
+        self.total += other.total
+
+    def percentile(self, p: float) -> float|None:
+        """Nearest-rank percentile, the smallest score at or above p% of the members"""
+        n = self.counts.total()
+        if n == 0:
+            return None
+        rank = max(1, math.ceil(p / 100 * n))
+        seen = 0
+        for milli in sorted(self.counts):
+            seen += self.counts[milli]
+            if seen >= rank:
+                return milli / 1000
+
+    def distribution(self, bucket_width: float) -> list:
+        """Member counts in [from, to) buckets of bucket_width, empty buckets included between the first and the last"""
+        if not self.counts:
+            return []
+        width = round(bucket_width * 1000)
+        buckets = Counter()
+        for milli, count in self.counts.items():
+            buckets[milli // width] += count
+        return [{"from": index * width / 1000, "to": (index + 1) * width / 1000, "count": buckets[index]}
+                for index in range(min(buckets), max(buckets) + 1)]
+
+    def summary(self, percentiles) -> dict:
+        n = self.counts.total()
+        return {
+            "mean": round(self.total / n, 3) if n else None,
+            "min": min(self.counts) / 1000 if n else None,
+            "max": max(self.counts) / 1000 if n else None,
+            "percentiles": {f"p{p:g}": self.percentile(p) for p in percentiles},
+        }
+
+    def state(self) -> dict:
+        return {"counts": {str(milli): count for milli, count in self.counts.items()}, "total": self.total}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "ScoreHistogram":
+        histogram = cls()
+        histogram.counts.update({int(milli): count for milli, count in state["counts"].items()})
+        histogram.total = state["total"]
+        return histogram
+
+
+class Segment:
+    """Counters of the members of one community segment"""
+
+    def __init__(self):
+        self.member_count = 0
+        self.risk_score_total = 0.0
+        self.interactions = Counter()
+        self.d_count = Counter()
+
+    def merge(self, other: "Segment") -> None:
+        self.member_count += other.member_count
+        self.risk_score_total += other.risk_score_total
+        self.interactions.update(other.interactions)
+        self.d_count.update(other.d_count)
+
+    def state(self) -> dict:
+        return {"member_count": self.member_count, "risk_score_total": self.risk_score_total,
+                "interactions": dict(self.interactions), "d_count": dict(self.d_count)}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "Segment":
+        segment = cls()
+        segment.member_count = state["member_count"]
+        segment.risk_score_total = state["risk_score_total"]
+        segment.interactions.update(state["interactions"])
+        segment.d_count.update(state["d_count"])
+        return segment
+
+
+class PopulationAggregate:
+    """
+    Mergeable aggregates of V28 calculate_raf() results: risk score and normalized score histograms,
+    HCC prevalence (the payable HCCs of /multi), and per community segment the interactions and the
+    payable HCC count. Memory does not grow with the number of members.
+    """
+
+    def __init__(self, norm_factor: float = NORM_FACTOR):
+        self.norm_factor = norm_factor
+        self.member_count = 0
+        self.error_count = 0
+        self.risk_score = ScoreHistogram()
+        self.risk_score_normalized = ScoreHistogram()
+        self.hccs = Counter()
+        self.segments: dict[str, Segment] = {}
+
+    def add(self, raf_response) -> None:
+        """Count one member's calculate_raf() result"""
+        risk_score = raf_response["risk_score"]
+        coefficients = raf_response["coefficients"]
+        interactions = raf_response["interactions"]
+        demographics = raf_response["demographics"]
+        label = segment_label(bool(demographics.new_enrollee), bool(demographics.pbd), bool(demographics.fbd), bool(demographics.disabled))
+
+        self.member_count += 1
+        self.risk_score.add(risk_score)
+        self.risk_score_normalized.add(risk_score / self.norm_factor)
+        self.hccs.update(hcc for hcc in raf_response["hcc_list"] if hcc in coefficients)
+
+        segment = self.segments.get(label)
+        if segment is None:
+            segment = self.segments[label] = Segment()
+        segment.member_count += 1
+        segment.risk_score_total += risk_score
+        d_count = "D0"
+        for key, value in interactions.items():
+            # As /multi reports them: set, with a coefficient (new enrollees have no D-count factors)
+            if value == 1 and key in coefficients:
+                if key in D_COUNT_CODES:
+                    d_count = key
+                elif not is_model_code(key):
+                    segment.interactions[key] += 1
+        segment.d_count[d_count] += 1
+
+    def add_members(self, members) -> "PopulationAggregate":
+        """Score and count /batch member objects, counting the ones that fail as errors"""
+        for _, raf_response, error in calculate_batch_v28(members):
+            if error is None:
+                self.add(raf_response)
+            else:
+                self.error_count += 1
+        return self
+
+    def merge(self, other: "PopulationAggregate") -> "PopulationAggregate":
+        if other.norm_factor != self.norm_factor:
+            raise ValueError(f"Can't merge aggregates normalized by {other.norm_factor} and {self.norm_factor}")
+        self.member_count += other.member_count
+        self.error_count += other.error_count
+        self.risk_score.merge(other.risk_score)
+        self.risk_score_normalized.merge(other.risk_score_normalized)
+        self.hccs.update(other.hccs)
+        for label, segment in other.segments.items():
+            self.segments.setdefault(label, Segment()).merge(segment)
+        return self
+
+    def summary(self, percentiles=DEFAULT_PERCENTILES, bucket_width: float = DEFAULT_BUCKET_WIDTH) -> dict:
+        """The population response: score statistics, the normalized score distribution, HCC prevalence and segments"""
+        n = self.member_count
+
+        def frequencies(counts: Counter, labels: dict, total: int) -> list:
+            return [{"code": code, "label": labels.get(code, "Unidentified"), "count": count, "frequency": round(count / total, 4)}
+                    for code, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))]
+
+        return {
+            "member_count": n,
+            "error_count": self.error_count,
+            "risk_score": self.risk_score.summary(percentiles),
+            "risk_score_normalized": {
+                **self.risk_score_normalized.summary(percentiles),
+                "distribution": self.risk_score_normalized.distribution(bucket_width),
+            },
+            "hcc_prevalence": frequencies(self.hccs, coefficient_labels["hcc"], n),
+            "segments": [
+                {
+                    "community": label,
+                    "member_count": segment.member_count,
+                    "share": round(segment.member_count / n, 4),
+                    "risk_score_mean": round(segment.risk_score_total / segment.member_count, 3),
+                    "interactions": frequencies(segment.interactions, coefficient_labels["interactions"], segment.member_count),
+                    "d_count": frequencies(segment.d_count, {"D0": "No payable HCCs", **coefficient_labels["interactions"]}, segment.member_count),
+                }
+                for label, segment in sorted(self.segments.items(), key=lambda item: -item[1].member_count)
+            ],
+        }
+
+    def state(self) -> dict:
+        """The counters as JSON, to merge with other partial aggregates later (see from_state)"""
+        return {
+            "schema": STATE_SCHEMA,
+            "norm_factor": self.norm_factor,
+            "member_count": self.member_count,
+            "error_count": self.error_count,
+            "risk_score": self.risk_score.state(),
+            "risk_score_normalized": self.risk_score_normalized.state(),
+            "hccs": dict(self.hccs),
+            "segments": {label: segment.state() for label, segment in self.segments.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "PopulationAggregate":
+        if state.get("schema") != STATE_SCHEMA:
+            raise ValueError(f"Unsupported population state schema {state.get('schema')}")
+        aggregate = cls(state["norm_factor"])
+        aggregate.member_count = state["member_count"]
+        aggregate.error_count = state["error_count"]
+        aggregate.risk_score = ScoreHistogram.from_state(state["risk_score"])
+        aggregate.risk_score_normalized = ScoreHistogram.from_state(state["risk_score_normalized"])
+        aggregate.hccs.update(state["hccs"])
+        aggregate.segments = {label: Segment.from_state(segment) for label, segment in state["segments"].items()}
+        return aggregate
+
+
+def parse_member_lines(lines) -> tuple[list, int]:
+    """(members, malformed line count) of NDJSON lines holding /batch member objects"""
+    members, malformed = [], 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            members.append(loads(line))
+        except ValueError:
+            malformed += 1
+    return members, malformed
+
+
+def aggregate_lines(lines) -> PopulationAggregate:
+    members, malformed = parse_member_lines(lines)
+    aggregate = PopulationAggregate().add_members(members)
+    aggregate.error_count += malformed
+    return aggregate
+
+
+def aggregate_chunk(processor, lines: list) -> PopulationAggregate:
+    """ParallelScorer.map score function: the aggregate of a chunk of member lines, scored in the worker"""
+    return aggregate_lines(lines)
+
+
+def line_chunks(lines, chunk_size: int):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def aggregate_stream(lines, workers: int = 1, chunk_size: int = 1000) -> PopulationAggregate:
+    """
+    Aggregate an NDJSON stream of members in one pass. With workers > 1, chunks of raw lines are parsed,
+    scored and aggregated in worker processes, and only their aggregates come back to be merged.
+    """
+    if workers <= 1:
+        aggregate = PopulationAggregate()
+        for chunk in line_chunks(lines, chunk_size):
+            aggregate.merge(aggregate_lines(chunk))
+        return aggregate
+    from hccinfhir.parallel import ParallelScorer
+    aggregate = PopulationAggregate()
+    with ParallelScorer(workers=workers, chunk_size=1) as scorer:
+        for partial in scorer.map(aggregate_chunk, line_chunks(lines, chunk_size), ordered=False):
+            aggregate.merge(partial)
+    return aggregate
+
+
+def parse_percentiles(value: str) -> list:
+    percentiles = [float(p) for p in value.split(",") if p.strip()]
+    if not all(0 < p <= 100 for p in percentiles):
+        raise ValueError("Percentiles must be between 0 (excluded) and 100")
+    return percentiles
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate V28 scores over a member file: score percentiles and distribution, HCC prevalence, segments.")
+    parser.add_argument("input", nargs="?", help="NDJSON of /batch member objects, gzipped if it ends in .gz, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Output JSON file, - for stdout (default)")
+    parser.add_argument("--percentiles", type=parse_percentiles, default=list(DEFAULT_PERCENTILES), help="Comma separated, e.g. 5,50,95")
+    parser.add_argument("--bucket-width", type=float, default=DEFAULT_BUCKET_WIDTH, help="Width of the normalized score distribution buckets")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes scoring members (default 1, in process)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Members sent to a worker at a time")
+    parser.add_argument("--state", help="Also write the mergeable counters to this file")
+    parser.add_argument("--merge", nargs="+", default=[], metavar="STATE", help="Add the counters of --state files from other runs")
+    args = parser.parse_args(argv)
+    if args.input is None and not args.merge:
+        parser.error("give an input file, or --merge state files")
+    if args.bucket_width < 0.001:
+        parser.error("--bucket-width must be at least 0.001")
+
+    start = time.perf_counter()
+    aggregate = PopulationAggregate()
+    if args.input is not None:
+        with open_input(args.input) as lines, contextlib.redirect_stdout(sys.stderr):
+            aggregate.merge(aggregate_stream(lines, args.workers, args.chunk_size))
+    for path in args.merge:
+        with open(path) as f:
+            aggregate.merge(PopulationAggregate.from_state(json.load(f)))
+    elapsed = time.perf_counter() - start
+
+    if args.state:
+        with open(args.state, "w") as f:
+            json.dump(aggregate.state(), f)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        json.dump(aggregate.summary(args.percentiles, args.bucket_width), output, indent=2)
+        output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"{aggregate.member_count} members ({aggregate.error_count} errors) in {elapsed:.1f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
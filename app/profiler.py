@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from app.log import logger
+
+# Per-request sampling profiler, to catch the payloads that are pathologically slow in production.
+#
+# With RAF_PROFILING=true, a request sent with the header "X-RAF-Profile: 1" is profiled: a thread
+# samples the stack of the thread scoring it every RAF_PROFILE_INTERVAL seconds (default 0.001), and
+# the folded stacks ("outer;inner;innermost count", the input of flamegraph.pl and speedscope) are
+# logged at WARNING with the route, the duration and the payload size. Other requests, and every
+# request when RAF_PROFILING is off, pay nothing beyond reading the header.
+
+PROFILING_ENABLED = os.getenv("RAF_PROFILING", "false").lower() == "true"
+PROFILE_INTERVAL = float(os.getenv("RAF_PROFILE_INTERVAL", "0.001"))
+PROFILE_HEADER = "X-RAF-Profile"
+
+# Stacks kept in the log record, the most sampled first
+MAX_LOGGED_STACKS = 50
+
+
+def wants_profile(header_value: str|None) -> bool:
+    return PROFILING_ENABLED and header_value is not None and header_value.strip().lower() in ("1", "true", "yes")
+
+
+def fold_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread (the current one by default) from a background thread, between
+    start() and stop(). Usable as a context manager.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, thread_id: int|None = None):
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.stacks = Counter()
+        self.samples = 0
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._sampler = None
+        self._start = 0.0
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.stacks[fold_stack(frame)] += 1
+            self.samples += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._start = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name="raf-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.seconds = time.perf_counter() - self._start
+        return self
+
+    def __enter__(self) -> "SamplingProfiler":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def folded(self, limit: int|None = None) -> list:
+        """Folded stacks with their sample counts, the most sampled first"""
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common(limit)]
+
+    def log(self, route: str, payload_bytes: int|None = None) -> None:
+        logger.warning("request profile", extra={"fields": {
+            "route": route,
+            "seconds": round(self.seconds, 6),
+            "payload_bytes": payload_bytes,
+            "interval": self.interval,
+            "samples": self.samples,
+            "stacks": self.folded(MAX_LOGGED_STACKS),
+        }})
+
+
+def init_flask(app) -> None:
+    """Profile the Flask requests sent with the profiling header"""
+    from flask import g, request
+
+    @app.before_request
+    def start_profile():
+        if wants_profile(request.headers.get(PROFILE_HEADER)):
+            g.profiler = SamplingProfiler().start()
+
+    @app.teardown_request
+    def log_profile(exc):
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop().log(request.path, request.content_length)
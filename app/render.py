@@ -0,0 +1,122 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import json
+from functools import lru_cache
+from hccinfhir.model_calculate import RAFResult
+from hccinfhir.datamodels import DemographicsRecord
+from app.utils import NORM_FACTOR, coefficient_labels, calculate_multi_v28, calculate_batch_v28, is_model_code, make_community_label, make_demographics_breakdown, sanitize_for_JSON
+
+try:
+    from orjson import dumps as _orjson_dumps  # optional, several times faster than json.dumps
+except ImportError:
+    _orjson_dumps = None
+
+# Renders calculate_raf() results straight to the JSON bytes of the /multi and /batch responses,
+# instead of format_multi_response() (a sanitize_for_JSON() copy of the whole result, then the
+# breakdown dicts) followed by Flask-RESTX serializing the dicts.
+#
+# Everything that does not depend on the member is rendered once and reused: the code and label of
+# each HCC and interaction entry, and the community label and demographics entry of each distinct
+# demographics record. Per request only the scores, coefficients and diagnosis codes are serialized.
+# The output parses to exactly what format_multi_response() returns (see benchmarks/bench_response.py).
+
+
+def dumps(value) -> bytes:
+    """JSON-serialize to bytes, through orjson when it is installed"""
+    if _orjson_dumps is not None:
+        return _orjson_dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+@lru_cache(maxsize=None)
+def _hcc_fragments(hcc: str) -> tuple:
+    """The rendered entry of an HCC around its dx list and coefficient"""
+    return (
+        b'{"code":' + dumps(hcc) + b',"dx":',
+        b',"label":' + dumps(coefficient_labels["hcc"].get(hcc, "Unidentified HCC")) + b',"coefficient":',
+    )
+
+
+@lru_cache(maxsize=None)
+def _interaction_fragment(key: str) -> bytes|None:
+    """The rendered entry of an interaction up to its coefficient, None for the model codes the response leaves out"""
+    if is_model_code(key):
+        return None
+    label = coefficient_labels["interactions"].get(key, "Unidentified Interaction")
+    return b'{"code":' + dumps(key) + b',"label":' + dumps(label) + b',"coefficient":'
+
+
+@lru_cache(maxsize=4096)
+def _demographics_fragments(fields: tuple, names: tuple, coefficient: float) -> tuple:
+    """The rendered community label and demographics entry of one demographics record"""
+    demo = dict(zip(names, fields))
+    return (
+        dumps(make_community_label(demo)),
+        dumps(make_demographics_breakdown({"data": demo, "coefficient": coefficient})),
+    )
+
+
+def render_multi_response(raf_response: RAFResult) -> bytes:
+    """Render the format_multi_response() JSON of a calculate_raf() result."""
+    demographics = raf_response["demographics"]
+    if isinstance(demographics, DemographicsRecord):
+        names = DemographicsRecord.__slots__
+        fields = tuple([getattr(demographics, name) for name in names])
+    else:
+        demo = sanitize_for_JSON(demographics)
+        names, fields = tuple(demo), tuple(demo.values())
+    community, demographics_entry = _demographics_fragments(fields, names, raf_response["risk_score_demographics"])
+    coefficients = raf_response["coefficients"]
+    cc_to_dx = raf_response["cc_to_dx"]
+
+    interactions = []
+    for key, value in raf_response["interactions"].items():
+        if value == 1 and key in coefficients:
+            fragment = _interaction_fragment(key)
+            if fragment is not None:
+                interactions.append(fragment + dumps(coefficients[key]) + b"}")
+
+    hccs = []
+    for hcc in raf_response["hcc_list"]:
+        if hcc in coefficients:
+            dx_prefix, label = _hcc_fragments(hcc)
+            dx = cc_to_dx.get(hcc, "Unidentified Diagnosis Code")
+            hccs.append(dx_prefix + dumps(dx if isinstance(dx, str) else list(dx)) + label + dumps(coefficients[hcc]) + b"}")
+
+    risk_score = raf_response["risk_score"]
+    return b"".join((
+        b'{"risk_score":', dumps(round(risk_score, 3)),
+        b',"risk_score_normalized":', dumps(round(risk_score / NORM_FACTOR, 3)),
+        b',"community":', community,
+        b',"interactions":[', b",".join(interactions),
+        b'],"hcc":[', b",".join(hccs),
+        b'],"demographics":', demographics_entry,
+        b"}",
+    ))
+
+
+def render_multi_response_v28(**request) -> bytes:
+    """The /multi response JSON, takes the calculate_multi_v28() arguments"""
+    return render_multi_response(calculate_multi_v28(**request))
+
+
+def render_batch_response_v28(members: list) -> bytes:
+    """
+    The /batch response JSON: the member and error counts, then per member its /multi response or the
+    error scoring it. Members with identical demographics share one cached demographic profile.
+    """
+    results = []
+    error_count = 0
+    for member_id, raw_response, error in calculate_batch_v28(members):
+        if error is None:
+            try:
+                results.append(b'{"member_id":' + dumps(member_id) + b"," + render_multi_response(raw_response)[1:])
+                continue
+            except Exception as e:
+                error = str(e)
+        error_count += 1
+        results.append(dumps({"member_id": member_id, "error": error}))
+    return b"".join((
+        b'{"member_count":', dumps(len(results)),
+        b',"error_count":', dumps(error_count),
+        b',"results":[', b",".join(results), b"]}",
+    ))
@@ -0,0 +1,283 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from hccinfhir.model_impact import normalize_diagnosis_code
+from app.payment_years import PAYMENT_YEARS
+from app.render import dumps
+from app.utils import NORM_FACTOR, resolve_dual_elgbl_cd
+
+# Response cache of the scoring routes (/multi, /single and /blended), keyed on the canonical form of
+# the request, so a payload sent again with its codes reordered, repeated, lowercased or dotted, or with
+# "FBDual" for "02", is answered from the cache. Only successful responses are cached.
+#
+# RAF_RESPONSE_CACHE picks the backend: "memory" (default), an LRU per worker process; "sqlite", one
+# database at RAF_RESPONSE_CACHE_DB shared by the gunicorn workers (and kept across restarts), by
+# default raf_response_cache.db in the system temporary directory, not in the working directory; or
+# "off". RAF_RESPONSE_CACHE_SIZE bounds the number of responses (default 10000), RAF_RESPONSE_CACHE_TTL
+# their age in seconds (default 3600).
+#
+# Responses carry an ETag, a hash of the body, and requests with a matching If-None-Match get a 304
+# without the body, cache on or off. Keys include a fingerprint of the scoring configuration (the
+# bundled tables and the payment year factors), so a shared cache never answers with responses of
+# another configuration.
+
+RESPONSE_CACHE = os.getenv("RAF_RESPONSE_CACHE", "memory").lower()
+RESPONSE_CACHE_SIZE = int(os.getenv("RAF_RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RAF_RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_DB = os.getenv("RAF_RESPONSE_CACHE_DB") or os.path.join(tempfile.gettempdir(), "raf_response_cache.db")
+
+# The routes' optional demographic fields whose absence means None
+NONE_DEFAULTS = ("dual_elgbl_cd", "orec", "crec")
+
+
+def scoring_fingerprint() -> str:
+    """Identifies what the responses depend on besides the request: the bundled tables and the payment year factors"""
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "vendor", "hccinfhir", "data")
+    tables = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                    for entry in os.scandir(data_dir) if entry.is_file()) if os.path.isdir(data_dir) else []
+    config = {"tables": tables, "norm_factor": NORM_FACTOR, "payment_years": PAYMENT_YEARS}
+    return hashlib.blake2b(json.dumps(config, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+SCORING_FINGERPRINT = scoring_fingerprint()
+
+
+def canonical_request(payload: dict) -> dict|None:
+    """
+    The payload with the codes uppercased, de-dotted, deduplicated and sorted, and the dual status
+    aliases resolved: payloads with the same canonical form get the same response. None when the
+    payload is malformed, such requests aren't cached.
+    """
+    if not isinstance(payload, dict):
+        return None
+    canonical = {key: value for key, value in payload.items() if not (value is None and key in NONE_DEFAULTS)}
+    if "diagnosis_codes" in canonical:
+        codes = canonical["diagnosis_codes"]
+        if not isinstance(codes, list) or not all(isinstance(dx, str) for dx in codes):
+            return None
+        canonical["diagnosis_codes"] = sorted({normalize_diagnosis_code(dx) for dx in codes})
+    if "diagnosis_code" in canonical:
+        if not isinstance(canonical["diagnosis_code"], str):
+            return None
+        canonical["diagnosis_code"] = normalize_diagnosis_code(canonical["diagnosis_code"])
+    if "dual_elgbl_cd" in canonical:
+        dual_elgbl_cd = canonical.pop("dual_elgbl_cd")
+        if not isinstance(dual_elgbl_cd, str):
+            return None
+        if resolve_dual_elgbl_cd(dual_elgbl_cd) is not None:
+            canonical["dual_elgbl_cd"] = resolve_dual_elgbl_cd(dual_elgbl_cd)
+    return canonical
+
+
+def request_key(route: str, payload: dict) -> str|None:
+    """Hash of the route and the canonical request, or None when the request can't be cached"""
+    canonical = canonical_request(payload)
+    if canonical is None:
+        return None
+    try:
+        # Fields sorted, the key must not depend on the order of the payload's keys (nested objects, like
+        # year_factors, keep theirs: reordering them only costs a miss)
+        text = dumps([SCORING_FINGERPRINT, route, dict(sorted(canonical.items()))])
+    except (TypeError, ValueError):
+        return None
+    return hashlib.blake2b(text, digest_size=16).hexdigest()
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str|None, etag: str) -> bool:
+    """Whether an If-None-Match header value matches etag (weak comparison, as RFC 9110 requires for it)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class MemoryBackend:
+    """LRU of (expiry time, response) in the memory of one process"""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, now: float) -> tuple[CachedResponse|None, bool]:
+        """(response, whether an expired entry was dropped)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            if entry[0] <= now:
+                del self._entries[key]
+                return None, True
+            self._entries.move_to_end(key)
+            return entry[1], False
+
+    def put(self, key: str, response: CachedResponse, expires_at: float) -> int:
+        """Store a response, returning the number of entries evicted to make room"""
+        with self._lock:
+            self._entries[key] = (expires_at, response)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Responses in a SQLite database shared by processes. Expired entries, then the least recently
+    stored ones past maxsize, are deleted every PRUNE_EVERY puts rather than on each one, so the
+    database can briefly hold a little more than maxsize responses.
+    """
+
+    name = "sqlite"
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, maxsize: int):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._puts = 0
+        self._lock = threading.Lock()
+        self.connection().execute(
+            "CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, expires_at REAL NOT NULL)")
+        self.connection().execute("CREATE INDEX IF NOT EXISTS response_cache_stored_at ON response_cache (stored_at)")
+
+    def connection(self) -> sqlite3.Connection:
+        # Per thread, and per process: the cache is built at import, before gunicorn forks its workers
+        # when it preloads the app, and a SQLite connection must not be used across a fork
+        pid, connection = getattr(self._local, "connection", (None, None))
+        if pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = os.getpid(), connection
+        return connection
+
+    def get(self, key: str, now: float) -> tuple[CachedResponse|None, bool]:
+        row = self.connection().execute("SELECT body, etag, expires_at FROM response_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, False
+        if row[2] <= now:
+            self.connection().execute("DELETE FROM response_cache WHERE key = ? AND expires_at <= ?", (key, now))
+            return None, True
+        return CachedResponse(row[0], row[1]), False
+
+    def put(self, key: str, response: CachedResponse, expires_at: float) -> int:
+        now = time.time()
+        connection = self.connection()
+        connection.execute("INSERT OR REPLACE INTO response_cache (key, body, etag, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                           (key, response.body, response.etag, now, expires_at))
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % self.PRUNE_EVERY == 0
+        if not prune:
+            return 0
+        evicted = connection.execute(
+            "DELETE FROM response_cache WHERE key IN (SELECT key FROM response_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,)).rowcount
+        connection.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+        return evicted
+
+    def clear(self) -> None:
+        self.connection().execute("DELETE FROM response_cache")
+
+    def size(self) -> int:
+        return self.connection().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """Canonical request -> response body and ETag, with hit/miss/eviction/expiration counters for sizing it"""
+
+    def __init__(self, backend, ttl: float = RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> CachedResponse|None:
+        response, expired = self.backend.get(key, time.time())
+        with self._lock:
+            if response is None:
+                self.misses += 1
+                self.expirations += expired
+            else:
+                self.hits += 1
+        return response
+
+    def put(self, key: str, body: bytes) -> CachedResponse:
+        response = CachedResponse(body, make_etag(body))
+        evicted = self.backend.put(key, response, time.time() + self.ttl)
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+        return response
+
+    def clear(self) -> None:
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "expirations": self.expirations}
+        return {"backend": self.backend.name, **counters, "size": self.backend.size(), "maxsize": self.backend.maxsize, "ttl": self.ttl}
+
+
+def build_response_cache() -> ResponseCache|None:
+    if RESPONSE_CACHE == "off" or RESPONSE_CACHE_SIZE <= 0:
+        return None
+    if RESPONSE_CACHE == "memory":
+        return ResponseCache(MemoryBackend(RESPONSE_CACHE_SIZE))
+    if RESPONSE_CACHE == "sqlite":
+        return ResponseCache(SQLiteBackend(RESPONSE_CACHE_DB, RESPONSE_CACHE_SIZE))
+    raise ValueError(f'RAF_RESPONSE_CACHE must be "memory", "sqlite" or "off", got {RESPONSE_CACHE}')
+
+
+response_cache = build_response_cache()
+
+
+def cached_response(route: str, payload: dict, compute) -> CachedResponse:
+    """
+    The response to a scoring request: from the cache, or compute() (the response JSON bytes, raising
+    on errors) stored in the cache
+    """
+    key = request_key(route, payload) if response_cache is not None else None
+    if key is not None:
+        response = response_cache.get(key)
+        if response is not None:
+            return response
+    body = compute()
+    if key is None:
+        return CachedResponse(body, make_etag(body))
+    return response_cache.put(key, body)
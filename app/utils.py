@@ -1,9 +1,19 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+from collections import Counter
+from typing import Iterator
 from pydantic import BaseModel
-from vendor.hccinfhir.model_calculate import calculate_raf, RAFResult
+from hccinfhir.model_calculate import calculate_raf_record, calculate_raf_models, get_demographic_profile, profile_cache, DemographicProfile, RAFResult
+from hccinfhir.model_impact import get_diagnosis_impact, DiagnosisImpact, MarginalScorer
+from hccinfhir.hccinfhir import HCCInFHIR
+from hccinfhir.extractor import extract_sld
+from hccinfhir.stream import loads
+from app.log import log_sampled
+from app.payment_years import PAYMENT_YEAR, PAYMENT_YEARS, normalization_factor, resolve_payment_year
 
 # This file contains utilities for cleaning up the output of calculate_raf() so it can be returned as a useful JSON response.
 
-NORM_FACTOR = 1.045  # This is the 2025 normalization factor for the CMS-HCC V28 model. It is defined yearly, and compensates for increase in dx capture over time, making 2025 scores comparable to 2024 and earlier.
+# The normalization factor for the CMS-HCC V28 model in the RAF_PAYMENT_YEAR payment year (1.045 for 2025, see app/payment_years.py). It is defined yearly, and compensates for increase in dx capture over time, making 2025 scores comparable to 2024 and earlier.
+NORM_FACTOR = normalization_factor("CMS-HCC Model V28", PAYMENT_YEAR)
 
 # This is a map of all of the possible coefficient keys that can be returned from the calculate_raf() function for CMS HCC V28.
 # It is used to map the keys to human readable labels for the API response.
@@ -184,10 +194,10 @@ def sanitize_for_JSON(d: dict) -> dict:
         return {
             k: sanitize_for_JSON(v) for k, v in d.items()
         }  # Recursively clean dicts
-    elif isinstance(d, BaseModel):
+    elif isinstance(d, BaseModel) or callable(getattr(d, "model_dump", None)):
         return {
             k: sanitize_for_JSON(v) for k, v in d.model_dump().items()
-        }  # Convert Pydantic model to dict
+        }  # Convert Pydantic model (or hccinfhir's DemographicsRecord) to dict
     elif issubclass(type(d), set):
         return list(d) # Angry linter
     else:
@@ -228,6 +238,12 @@ def make_coefficient_breakdown(
                         }
                     )
                     
+    coefficient_breakdown["demographics"] = make_demographics_breakdown(demographics)
+    return coefficient_breakdown
+
+
+def make_demographics_breakdown(demographics: dict) -> list:
+    """Utility function: The demographics entry of the coefficient breakdown, with a human readable label."""
     # Generate a label for the demographics information
     demo_label = []
     for key, value in demographics['data'].items():
@@ -236,32 +252,35 @@ def make_coefficient_breakdown(
                 demo_label.append(str(coefficient_labels["demographics"].get(key))) # Not adding anything not in our list of known demo codes
             elif type(value) is str and coefficient_labels["demographics"].get(value):
                 demo_label.append(str(coefficient_labels["demographics"].get(value))) # Not adding anything not in our list of known demo codes
-    coefficient_breakdown["demographics"] = [{
+    return [{
         'code': demographics["data"]["category"],
         'label': ", ".join(demo_label),
         'coefficient': demographics["coefficient"]
     }]
-    return coefficient_breakdown
+
+
+def make_community_label(demo: dict) -> str:
+    """Utility function: Describe the community segment (new enrollee, dual status, aged/disabled) of sanitized demographics."""
+    if demo.get("new_enrollee"):
+        return "New Enrollee"
+    com_dual_prefix = (
+        " PBDual," if demo["pbd"] else
+        " FBDual," if demo["fbd"] else
+        " NonDual,"
+    )
+    com_suffix = " Disabled" if demo["disabled"] else " Aged"
+    return "Community," + com_dual_prefix + com_suffix
+
+
+def is_model_code(label: str) -> bool:
+    """True for the Medicaid and dual status codes that calculate_raf reports among the interactions"""
+    return "MCAID_" in label or "NMCAID_" in label or "FBDual_" in label
 
 
 def format_multi_response(raf_response: dict) -> dict:
     """Format response for downstream UI consumption."""
     raf_response = sanitize_for_JSON(raf_response)
-    demo = raf_response["demographics"]
-
-    if demo.get("new_enrollee"):
-        community = "New Enrollee"
-    else:
-        com_dual_prefix = (
-            " PBDual," if demo["pbd"] else
-            " FBDual," if demo["fbd"] else
-            " NonDual,"
-        )
-        com_suffix = " Disabled" if demo["disabled"] else " Aged"
-        community = "Community," + com_dual_prefix + com_suffix
-
-    def is_model_code(label: str) -> bool:
-        return "MCAID_" in label or "NMCAID_" in label or "FBDual_" in label
+    community = make_community_label(raf_response["demographics"])
 
     filtered_interactions = {
         key: value
@@ -283,44 +302,152 @@ def format_multi_response(raf_response: dict) -> dict:
     }
 
 
-def format_single_response(raf_response: dict) -> dict:
-    """Utility function: Strip out unnecessary fields from the calculate_raf() output, and insert the coefficient breakdown."""
-    raf_response = sanitize_for_JSON(raf_response)
-    demo = raf_response["demographics"]
+def resolve_dual_elgbl_cd(dual_elgbl_cd: str|None) -> str|None:
+    """Utility function: Translate the API's dual status aliases into the dual eligibility codes calculate_raf() expects."""
+    match dual_elgbl_cd:
+        case "FBDual": # Medicare with full benefit from Medicaid
+            return "02"
+        case "PBDual": # Medicare with partial benefit from Medicaid
+            return "01"
+        case "NonDual": # Medicare only
+            return None
+    return dual_elgbl_cd
 
-    if demo.get("new_enrollee"):
-        community = "New Enrollee"
-    else:
-        com_dual_prefix = (
-            " PBDual," if demo["pbd"] else
-            " FBDual," if demo["fbd"] else
-            " NonDual,"
-        )
-        com_suffix = " Disabled" if demo["disabled"] else " Aged"
-        community = "Community," + com_dual_prefix + com_suffix
 
-    def is_model_code(label: str) -> bool:
-        return "MCAID_" in label or "NMCAID_" in label or "FBDual_" in label
+def calculate_multi_v28(
+    diagnosis_codes: list,
+    age: int,
+    sex: str,
+    dual_elgbl_cd: str|None = None,
+    orec: str|None = None,
+    crec: str|None = None,
+    new_enrollee: bool = False,
+    snp: bool = False,
+) -> RAFResult:
+    """Get the raw V28 calculate_raf() result for a /multi request."""
+    raw_response = calculate_raf_record(
+        diagnosis_codes=diagnosis_codes,
+        model_name="CMS-HCC Model V28",
+        age=age,
+        sex=sex,
+        dual_elgbl_cd=resolve_dual_elgbl_cd(dual_elgbl_cd),
+        orec=orec,
+        crec=crec,
+        new_enrollee=new_enrollee,
+        snp=snp,
+    )
+    log_sampled("raf result", raw_response=raw_response)
+    return raw_response
 
-    filtered_interactions = {
-        key: value
-        for key, value in raf_response["interactions"].items()
-        if value != 0 and not is_model_code(key)
+def get_single_response_v28(
+    diagnosis_code: str,
+    age: int,
+    sex: str,
+    dual_elgbl_cd: str|None = None,
+    orec: str|None = None,
+    crec: str|None = None,
+    new_enrollee: bool = False,
+    snp: bool = False,
+) -> dict:
+    """Get the V28 RAF impact of a single diagnosis: the community label, an hcc entry per HCC the diagnosis maps to, and the demographics entry.
+
+    The diagnosis part comes from the memoized (dx, coefficient prefix) impact table and the demographic
+    part from the cached demographic profile, so the full calculate_raf() pipeline doesn't run.
+    """
+    profile = get_demographic_profile(
+        model_name="CMS-HCC Model V28",
+        age=age,
+        sex=sex,
+        dual_elgbl_cd=resolve_dual_elgbl_cd(dual_elgbl_cd),
+        orec=orec,
+        crec=crec,
+        new_enrollee=new_enrollee,
+        snp=snp,
+    )
+    impact = get_diagnosis_impact(diagnosis_code, profile.prefix, "CMS-HCC Model V28")
+    summary = make_profile_summary(profile)
+    return {
+        "community": summary["community"],
+        "hcc": make_impact_breakdown(impact),
+        "demographics": summary["demographics"],
     }
+
+def get_single_bulk_response_v28(
+    diagnosis_codes: list,
+    age: int,
+    sex: str,
+    dual_elgbl_cd: str|None = None,
+    orec: str|None = None,
+    crec: str|None = None,
+    new_enrollee: bool = False,
+    snp: bool = False,
+) -> dict:
+    """Get the V28 RAF impact of each diagnosis on its own, for one set of demographics. Errors are reported per code."""
+    profile = get_demographic_profile(
+        model_name="CMS-HCC Model V28",
+        age=age,
+        sex=sex,
+        dual_elgbl_cd=resolve_dual_elgbl_cd(dual_elgbl_cd),
+        orec=orec,
+        crec=crec,
+        new_enrollee=new_enrollee,
+        snp=snp,
+    )
+    results = []
+    for diagnosis_code in diagnosis_codes:
+        try:
+            if not isinstance(diagnosis_code, str):
+                raise ValueError("Each diagnosis code must be a string")
+            impact = get_diagnosis_impact(diagnosis_code, profile.prefix, "CMS-HCC Model V28")
+            results.append({"diagnosis_code": diagnosis_code, "hcc": make_impact_breakdown(impact)})
+        except Exception as e:
+            results.append({"diagnosis_code": diagnosis_code, "error": str(e)})
     return {
-        "community": community,
-        **make_coefficient_breakdown(
-            demographics={'data': raf_response["demographics"],'coefficient': raf_response['risk_score_demographics']},
-            interactions=filtered_interactions,
-            coefficients=raf_response["coefficients"],
-            hcc_list=raf_response["hcc_list"],
-            cc_to_dx=raf_response["cc_to_dx"],
-            single=True
-        ),
+        **make_profile_summary(profile),
+        "results": results,
     }
 
+def get_what_if_response_v28(
+    diagnosis_codes: list,
+    age: int,
+    sex: str,
+    dual_elgbl_cd: str|None = None,
+    orec: str|None = None,
+    crec: str|None = None,
+    new_enrollee: bool = False,
+    snp: bool = False,
+    add: list|None = None,
+    remove: list|None = None,
+) -> dict:
+    """Get a member's V28 RAF and the score change of each candidate diagnosis addition or removal, each applied on its own."""
+    profile = get_demographic_profile(
+        model_name="CMS-HCC Model V28",
+        age=age,
+        sex=sex,
+        dual_elgbl_cd=resolve_dual_elgbl_cd(dual_elgbl_cd),
+        orec=orec,
+        crec=crec,
+        new_enrollee=new_enrollee,
+        snp=snp,
+    )
+    scorer = MarginalScorer(diagnosis_codes, profile, "CMS-HCC Model V28")
+    candidates = []
+    for action, codes in (("add", add or []), ("remove", remove or [])):
+        for diagnosis_code in codes:
+            try:
+                if not isinstance(diagnosis_code, str):
+                    raise ValueError("Each diagnosis code must be a string")
+                impact = scorer.add(diagnosis_code) if action == "add" else scorer.remove(diagnosis_code)
+                candidates.append({"diagnosis_code": diagnosis_code, **format_marginal_impact(impact)})
+            except Exception as e:
+                candidates.append({"diagnosis_code": diagnosis_code, "action": action, "error": str(e)})
+    return {
+        "risk_score": round(scorer.risk_score, 3),
+        "risk_score_normalized": round(scorer.risk_score / NORM_FACTOR, 3),
+        "candidates": candidates,
+    }
 
-def get_multi_response_v28(
+def get_blended_response(
     diagnosis_codes: list,
     age: int,
     sex: str,
@@ -329,31 +456,209 @@ def get_multi_response_v28(
     crec: str|None = None,
     new_enrollee: bool = False,
     snp: bool = False,
+    payment_years: list|None = None,
+    year_factors: dict|None = None,
 ) -> dict:
-    """Get the V28 RAF response from calculate_raf() and apply formatting."""
-    match dual_elgbl_cd:
-        case "FBDual": # Medicare with full benefit from Medicaid
-            dual_elgbl_cd = "02"
-        case "PBDual": # Medicare with partial benefit from Medicaid
-            dual_elgbl_cd = "01"
-        case "NonDual": # Medicare only
-            dual_elgbl_cd = None
-    raw_response = calculate_raf(
+    """Score a member under every model of the requested payment years in one pass, with each year's blended score.
+
+    The diagnosis codes are normalized and mapped once for all models (calculate_raf_models). year_factors
+    overrides the configured factors of a year, keyed by year: {"2025": {"coding_intensity": 0.059, "models": {...}}}.
+    """
+    years = payment_years or [PAYMENT_YEAR]
+    year_factors = year_factors or {}
+    factors = {}
+    for year in years:
+        if not isinstance(year, int) or isinstance(year, bool):
+            raise ValueError("Each payment year must be an integer")
+        factors[year] = resolve_payment_year(year, year_factors.get(str(year), year_factors.get(year)))
+    model_names = list(dict.fromkeys(model_name for year in years for model_name in factors[year]["models"]))
+
+    results = calculate_raf_models(
         diagnosis_codes=diagnosis_codes,
-        model_name="CMS-HCC Model V28",
+        model_names=model_names,
         age=age,
         sex=sex,
-        dual_elgbl_cd=dual_elgbl_cd,
+        dual_elgbl_cd=resolve_dual_elgbl_cd(dual_elgbl_cd),
         orec=orec,
         crec=crec,
         new_enrollee=new_enrollee,
         snp=snp,
     )
-    print(raw_response)
-    return format_multi_response(raw_response)
 
-def get_single_response_v28(
-    diagnosis_code: str,
+    blended = []
+    for year in years:
+        models = []
+        for model_name, model in factors[year]["models"].items():
+            risk_score = results[model_name]["risk_score"]
+            models.append({
+                "model_name": model_name,
+                "weight": model["weight"],
+                "normalization": model["normalization"],
+                "risk_score_normalized": risk_score / model["normalization"],
+            })
+        blended_risk_score = sum(model["weight"] * model["risk_score_normalized"] for model in models)
+        coding_intensity = factors[year].get("coding_intensity", 0)
+        for model in models:
+            model["risk_score_normalized"] = round(model["risk_score_normalized"], 3)
+        blended.append({
+            "payment_year": year,
+            "models": models,
+            "blended_risk_score": round(blended_risk_score, 3),
+            "coding_intensity": coding_intensity,
+            "risk_score_adjusted": round(blended_risk_score * (1 - coding_intensity), 3),
+        })
+
+    return {
+        "models": {model_name: format_model_score(result) for model_name, result in results.items()},
+        "payment_years": blended,
+    }
+
+def format_model_score(raf_response: RAFResult) -> dict:
+    """Utility function: Scores, HCCs and interactions of one model's calculate_raf() result, without the V28 labels."""
+    coefficients = raf_response["coefficients"]
+    return {
+        "risk_score": round(raf_response["risk_score"], 3),
+        "risk_score_demographics": round(raf_response["risk_score_demographics"], 3),
+        "risk_score_hcc": round(raf_response["risk_score_hcc"], 3),
+        "hcc": [
+            {"code": hcc, "dx": sorted(raf_response["cc_to_dx"].get(hcc, ())), "coefficient": coefficients[hcc]}
+            for hcc in sorted(raf_response["hcc_list"], key=lambda hcc: (len(hcc), hcc))
+            if hcc in coefficients
+        ],
+        "interactions": [
+            {"code": key, "coefficient": coefficients[key]}
+            for key, value in raf_response["interactions"].items()
+            if value != 0 and key in coefficients and not is_model_code(key)
+        ],
+    }
+
+def format_marginal_impact(impact) -> dict:
+    """Utility function: Labelled score change of one what-if candidate."""
+    def labelled(codes: dict) -> list:
+        return [
+            {
+                "code": code,
+                "label": coefficient_labels["hcc"].get(code) or coefficient_labels["interactions"].get(code, "Unidentified Coefficient"),
+                "coefficient": coefficient,
+            }
+            for code, coefficient in codes.items()
+        ]
+
+    return {
+        "action": impact.action,
+        "risk_score": round(impact.risk_score, 3),
+        "risk_score_normalized": round(impact.risk_score / NORM_FACTOR, 3),
+        "delta": round(impact.delta, 3),
+        "hcc_added": list(impact.hccs_added),
+        "hcc_removed": list(impact.hccs_removed),
+        "coefficients_added": labelled(impact.coefficients_added),
+        "coefficients_removed": labelled(impact.coefficients_removed),
+    }
+
+def make_profile_summary(profile: DemographicProfile) -> dict:
+    """Utility function: The community label and demographics breakdown of a demographic profile."""
+    demo = sanitize_for_JSON(profile.demographics)
+    return {
+        "community": make_community_label(demo),
+        "demographics": make_demographics_breakdown(
+            {'data': demo, 'coefficient': sum(profile.coefficients_demographics.values())}
+        ),
+    }
+
+def make_impact_breakdown(impact: DiagnosisImpact) -> list:
+    """Utility function: The hcc entries of the coefficient breakdown for a single diagnosis."""
+    return [
+        {
+            "code": hcc,
+            "dx": [impact.diagnosis_code],
+            "label": coefficient_labels["hcc"].get(hcc, "Unidentified HCC"),
+            "coefficient": coefficient,
+        }
+        for hcc, coefficient in impact.hccs
+    ]
+
+def calculate_batch_v28(members: list) -> Iterator[tuple]:
+    """Utility function: Score each member of a batch, yielding (member_id, raw calculate_raf() result, None) or (member_id, None, error)."""
+    for member in members:
+        member_id = member.get("member_id") if isinstance(member, dict) else None
+        try:
+            if not isinstance(member, dict):
+                raise ValueError("Each member must be an object")
+            missing = [key for key in ("diagnosis_codes", "age", "sex") if member.get(key) is None]
+            if missing:
+                raise ValueError(f"Missing required field(s): {', '.join(missing)}")
+            if not isinstance(member["diagnosis_codes"], list):
+                raise ValueError("diagnosis_codes must be a list")
+
+            raw_response = calculate_raf_record(
+                diagnosis_codes=member["diagnosis_codes"],
+                model_name="CMS-HCC Model V28",
+                age=member["age"],
+                sex=member["sex"],
+                dual_elgbl_cd=resolve_dual_elgbl_cd(member.get("dual_elgbl_cd")),
+                orec=member.get("orec"),
+                crec=member.get("crec"),
+                new_enrollee=bool(member.get("new_enrollee", False)),
+                snp=bool(member.get("snp", False)),
+            )
+        except Exception as e:
+            yield member_id, None, str(e)
+            continue
+        yield member_id, raw_response, None
+
+def preload_models() -> list:
+    """Load the tables of every model the routes score and compile their rules, by scoring one member.
+
+    The tables are otherwise loaded the first time each model is scored. gunicorn.conf.py calls this in
+    the master before forking the workers, so they share one copy instead of each loading its own.
+    """
+    model_names = list(dict.fromkeys(["CMS-HCC Model V28", *(
+        model_name for year in PAYMENT_YEARS for model_name in PAYMENT_YEARS[year]["models"])]))
+    calculate_raf_models(diagnosis_codes=["E1122", "I5021", "N1831"], model_names=model_names, age=70, sex="F")
+    profile_cache.clear()
+    return model_names
+
+def get_cache_stats() -> dict:
+    """Hit/miss/eviction counters of the caches behind the RAF routes, for sizing them"""
+    return {"profile_cache": profile_cache.stats()}
+
+
+# One processor per worker process for the claims routes. Its procedure filtering and dx to CC tables
+# are loaded once per process and shared (see the loaders in hccinfhir/utils.py), not per request.
+claims_processor = HCCInFHIR(model_name="CMS-HCC Model V28")
+
+def flatten_eobs(resources) -> list:
+    """Utility function: Expand FHIR Bundles (searchset or collection) into their ExplanationOfBenefit entries, leaving other resources as they are."""
+    if isinstance(resources, dict):
+        resources = [resources]
+    eobs = []
+    for resource in resources:
+        if isinstance(resource, dict) and resource.get("resourceType") == "Bundle":
+            eobs.extend(
+                entry["resource"]
+                for entry in resource.get("entry") or []
+                if isinstance(entry, dict) and isinstance(entry.get("resource"), dict)
+                and entry["resource"].get("resourceType") == "ExplanationOfBenefit"
+            )
+        else:
+            eobs.append(resource)
+    return eobs
+
+def parse_ndjson_text(text: str) -> tuple[list, list]:
+    """Utility function: Parse an NDJSON body into resources, returning the malformed lines as errors instead of failing."""
+    resources, errors = [], []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            resources.append(loads(line))
+        except ValueError as e:
+            errors.append({"line": line_number, "error": f"Malformed JSON: {e}"})
+    return resources, errors
+
+def get_claims_response_v28(
+    claims: list,
+    format: str,
     age: int,
     sex: str,
     dual_elgbl_cd: str|None = None,
@@ -361,24 +666,58 @@ def get_single_response_v28(
     crec: str|None = None,
     new_enrollee: bool = False,
     snp: bool = False,
+    filter_claims: bool = True,
+    errors: list|None = None,
 ) -> dict:
-    """Get the V28 RAF response from calculate_raf() and apply formatting."""
-    match dual_elgbl_cd:
-        case "FBDual": # Medicare with full benefit from Medicaid
-            dual_elgbl_cd = "02"
-        case "PBDual": # Medicare with partial benefit from Medicaid
-            dual_elgbl_cd = "01"
-        case "NonDual": # Medicare only
-            dual_elgbl_cd = None
-    raw_response = calculate_raf(
-        diagnosis_codes=[diagnosis_code],
-        model_name="CMS-HCC Model V28",
+    """Get the V28 RAF response for one patient's claims (FHIR EOBs, or 837 documents when format is "837").
+
+    Extraction, risk adjustment filtering and scoring run in one pass over the claims, as HCCInFHIR.run()
+    does, and the response adds the filtering statistics: how many claims and service lines were used,
+    how many lines each filter rule kept or dropped, and which diagnosis codes only appeared on service
+    lines the filter excluded. Claims that fail to extract are skipped and reported in the statistics
+    rather than failing the request.
+    """
+    errors = list(errors or [])
+    sld_list = []
+    for index, claim in enumerate(claims):
+        try:
+            sld_list.extend(extract_sld(claim, format))
+        except (TypeError, ValueError) as e:
+            errors.append({"index": index, "error": str(e)})
+
+    patient_ids = sorted({sld.patient_id for sld in sld_list if sld.patient_id})
+    if len(patient_ids) > 1:
+        raise ValueError(f"Claims must be for one patient, got {len(patient_ids)}: {', '.join(patient_ids[:5])}")
+
+    rule_counts = Counter()
+    eligible = claims_processor.claim_filter.filter(sld_list, rule_counts) if filter_claims else sld_list
+    diagnosis_codes = sorted({code for sld in eligible for code in sld.claim_diagnosis_codes})
+    excluded_codes = {code for sld in sld_list for code in sld.claim_diagnosis_codes}.difference(diagnosis_codes)
+
+    raw_response = calculate_raf_record(
+        diagnosis_codes=diagnosis_codes,
+        model_name=claims_processor.model_name,
         age=age,
         sex=sex,
-        dual_elgbl_cd=dual_elgbl_cd,
+        dual_elgbl_cd=resolve_dual_elgbl_cd(dual_elgbl_cd),
         orec=orec,
         crec=crec,
         new_enrollee=new_enrollee,
         snp=snp,
+        dx_to_cc_mapping=claims_processor.dx_to_cc_mapping,
     )
-    return format_single_response(raw_response)
+    return {
+        **format_multi_response(raw_response),
+        "filtering": {
+            "patient_id": patient_ids[0] if patient_ids else None,
+            "claim_count": len(claims),
+            "skipped_claim_count": sum(1 for error in errors if "index" in error),
+            "service_level_count": len(sld_list),
+            "eligible_service_level_count": len(eligible),
+            "filter_applied": filter_claims,
+            "rule_counts": dict(rule_counts),
+            "diagnosis_codes": diagnosis_codes,
+            "excluded_diagnosis_codes": sorted(excluded_codes),
+            "errors": errors,
+        },
+    }
@@ -0,0 +1 @@
+# Benchmark scripts, run from the repo root, e.g. `python -m benchmarks.bench_vectorized`
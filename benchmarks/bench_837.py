@@ -0,0 +1,99 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Throughput and peak memory of the 837 extractor on large synthetic interchanges, built by repeating
+# the transaction sets of the bundled samples (samples/sample_837_*.txt) across several ISA/GS
+# envelopes, with each claim's service lines repeated to get long claims. "list" reads the whole file
+# and calls extract_sld_837, "stream" iterates iter_sld_837 over the open file. Each runs in a fresh
+# process so peak RSS is its own.
+
+SAMPLES = os.path.join(bootstrap.vendor_dir, "hccinfhir", "samples", "sample_837_*.txt")
+VERSIONS = {"837P": "005010X222A1", "837I": "005010X223A2"}
+
+CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+from hccinfhir.extractor_837 import extract_sld_837, iter_sld_837
+start = time.perf_counter()
+if sys.argv[3] == "list":
+    with open(sys.argv[2]) as f:
+        lines = len(extract_sld_837(f.read()))
+else:
+    with open(sys.argv[2], "rb") as f:
+        lines = sum(1 for _ in iter_sld_837(f))
+seconds = time.perf_counter() - start
+print(json.dumps({"lines": lines, "seconds": seconds, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def transaction_sets(claim_type: str, lines_per_claim: int) -> list:
+    """ST..SE transaction sets of the samples of one claim type, service lines repeated per claim"""
+    sets = []
+    for path in sorted(glob.glob(SAMPLES)):
+        with open(path) as f:
+            segments = [segment.strip() for segment in f.read().split("~") if segment.strip()]
+        if not any(s.startswith("GS*") and s.endswith(VERSIONS[claim_type]) for s in segments):
+            continue
+        current = None
+        for segment in segments:
+            if segment.startswith("ST*"):
+                current, line = [segment], None
+            elif current is not None:
+                if segment.startswith("LX*"):
+                    line = [segment]
+                    current.append(line)
+                elif segment.startswith("SE*"):
+                    sets.append([s for item in current
+                                 for s in (item * lines_per_claim if isinstance(item, list) else [item])])
+                    current = None
+                elif line is not None:
+                    line.append(segment)
+                else:
+                    current.append(segment)
+    return sets
+
+
+def write_interchange(path: str, claim_type: str, claims: int, envelopes: int, lines_per_claim: int) -> None:
+    sets = transaction_sets(claim_type, lines_per_claim)
+    with open(path, "w") as out:
+        for envelope in range(envelopes):
+            out.write(f"ISA*00*          *00*          *ZZ*SUBMITTER      *ZZ*RECEIVER       *241205*2042*^*00501*{envelope:09d}*0*P*:~\n")
+            out.write(f"GS*HC*SUBMITTER*RECEIVER*20241205*2042*{envelope}*X*{VERSIONS[claim_type]}~\n")
+            for i in range(claims // envelopes):
+                for segment in sets[i % len(sets)]:
+                    out.write(segment + "~\n")
+            out.write(f"GE*{claims // envelopes}*{envelope}~\nIEA*1*{envelope:09d}~\n")
+
+
+def measure(path: str, mode: str) -> dict:
+    output = subprocess.run([sys.executable, "-c", CHILD, bootstrap.vendor_dir, path, mode],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure 837P/837I extraction throughput and peak RSS, list vs. streaming.")
+    parser.add_argument("--claims", type=int, default=20000)
+    parser.add_argument("--envelopes", type=int, default=10)
+    parser.add_argument("--lines-per-claim", type=int, default=4, help="Repeats of each claim's service lines")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for claim_type in VERSIONS:
+            path = os.path.join(tmp, f"{claim_type}.txt")
+            write_interchange(path, claim_type, args.claims, args.envelopes, args.lines_per_claim)
+            size_mb = os.path.getsize(path) / 1024 ** 2
+            for mode in ("list", "stream"):
+                result = measure(path, mode)
+                print(f"{claim_type} {size_mb:>6.1f} MB {mode:<7}{result['lines']:>9} lines {result['seconds']:>7.2f} s "
+                      f"{result['lines'] / result['seconds']:>9.0f} lines/s {result['peak_rss_mb']:>7.1f} MB peak RSS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import time
+from hccinfhir.model_calculate import calculate_raf_models, calculate_raf_record
+from benchmarks.synthetic import synthetic_population
+
+# Scoring synthetic members under several models: one calculate_raf_record() call per model (the
+# calculate_raf path, with the demographics record calculate_raf_models also returns) against
+# calculate_raf_models(), which normalizes and maps the diagnosis codes once for all models (the
+# /v1/raf/blended route). Checks first that both give the same result for every member and model.
+
+MODELS = ["CMS-HCC Model V24", "CMS-HCC Model V28"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare calculate_raf per model with one shared mapping pass for several models per member.")
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--models", nargs="*", default=MODELS)
+    args = parser.parse_args()
+
+    members = [{key: value for key, value in member.items() if key != "member_id"}
+               for member in synthetic_population(args.members)]
+
+    def per_model(member):
+        return {model_name: calculate_raf_record(model_name=model_name, **member) for model_name in args.models}
+
+    def one_pass(member):
+        codes = member["diagnosis_codes"]
+        return calculate_raf_models(codes, args.models, **{k: v for k, v in member.items() if k != "diagnosis_codes"})
+
+    for member in members:
+        expected, actual = per_model(member), one_pass(member)
+        for model_name in args.models:
+            a, b = expected[model_name], actual[model_name]
+            assert {**a, "hcc_list": sorted(a["hcc_list"])} == {**b, "hcc_list": sorted(b["hcc_list"])}, (member, model_name)
+
+    print(f"{args.members} members, {len(args.models)} models: {', '.join(args.models)}")
+    for label, fn in (("calculate_raf per model", per_model), ("calculate_raf_models", one_pass)):
+        start = time.perf_counter()
+        for member in members:
+            fn(member)
+        print(f"{label:<28}{(time.perf_counter() - start) / len(members) * 1e6:>8.1f} us per member")
+
+
+if __name__ == "__main__":
+    main()
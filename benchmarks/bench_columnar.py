@@ -0,0 +1,125 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from app.columnar import EXTENSIONS, open_writer, pyarrow
+from app.render import dumps, render_multi_response
+from app.utils import calculate_batch_v28
+from benchmarks.synthetic import synthetic_population
+
+# Bulk output as columnar tables (app/columnar.py) against NDJSON of the /batch result entries, for
+# synthetic members scored beforehand: bytes written, write time and the peak memory traced while
+# writing. The CSV tables are read back and each member's /multi response rebuilt from them, with the
+# labels joined from the labels table, which must equal the rendered response. Parquet and arrow are
+# only measured when pyarrow is installed.
+
+
+def write_ndjson(path: str, results: list) -> None:
+    with open(path, "wb") as f:
+        for member_id, raw, _ in results:
+            f.write(b'{"member_id":' + dumps(member_id) + b"," + render_multi_response(raw)[1:] + b"\n")
+
+
+def write_columnar(format: str, directory: str, results: list, row_group_size: int) -> None:
+    with open_writer(format, directory, row_group_size) as writer:
+        for member_id, raw, error in results:
+            writer.write(member_id, raw, error)
+
+
+def read_csv_responses(directory: str) -> dict:
+    """Each member's /multi response, rebuilt from the CSV tables"""
+    def rows(table: str):
+        with open(os.path.join(directory, table + EXTENSIONS["csv"]), newline="") as f:
+            yield from csv.DictReader(f)
+
+    labels = {(row["kind"], row["code"]): row["label"] for row in rows("labels")}
+    dx = defaultdict(list)
+    for row in rows("hcc_dx"):
+        dx[row["member_id"], row["code"]].append(row["dx"])
+    responses = {row["member_id"]: {
+        "risk_score": float(row["risk_score"]),
+        "risk_score_normalized": float(row["risk_score_normalized"]),
+        "community": row["community"],
+        "interactions": [], "hcc": [], "demographics": [],
+    } for row in rows("members")}
+    for row in rows("interactions"):
+        responses[row["member_id"]]["interactions"].append({
+            "code": row["code"], "label": labels.get(("interactions", row["code"]), "Unidentified Interaction"),
+            "coefficient": float(row["coefficient"])})
+    for row in rows("hccs"):
+        responses[row["member_id"]]["hcc"].append({
+            "code": row["code"], "dx": dx.get((row["member_id"], row["code"]), "Unidentified Diagnosis Code"),
+            "label": labels.get(("hcc", row["code"]), "Unidentified HCC"), "coefficient": float(row["coefficient"])})
+    for row in rows("demographics"):
+        responses[row["member_id"]]["demographics"].append({"code": row["code"], "label": row["label"], "coefficient": float(row["coefficient"])})
+    return responses
+
+
+def canonical(response: dict) -> dict:
+    """A /multi response with its HCCs and their dx lists sorted, their order follows set iteration"""
+    for hcc in response["hcc"]:
+        hcc["dx"] = sorted(hcc["dx"]) if isinstance(hcc["dx"], list) else hcc["dx"]
+    response["hcc"].sort(key=lambda hcc: hcc["code"])
+    return response
+
+
+def measure(fn) -> tuple:
+    """(seconds, peak traced bytes), from two runs as tracing slows it down"""
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path))
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare bulk output as columnar tables with NDJSON: size, write time and peak memory.")
+    parser.add_argument("--members", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--row-group-size", type=int, help="Default per format, see app/columnar.py")
+    args = parser.parse_args()
+
+    results = list(calculate_batch_v28(synthetic_population(args.members, args.seed)))
+    assert all(error is None for *_, error in results)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_columnar("csv", os.path.join(tmp, "check"), results, args.row_group_size)
+        rebuilt = read_csv_responses(os.path.join(tmp, "check"))
+        for member_id, raw, _ in results:
+            assert canonical(rebuilt[member_id]) == canonical(json.loads(render_multi_response(raw))), member_id
+        print(f"{args.members} members, the /multi responses rebuilt from the CSV tables equal the rendered ones")
+
+        outputs = [("ndjson", os.path.join(tmp, "results.ndjson"), lambda path: write_ndjson(path, results))]
+        for format in ("csv", "parquet", "arrow"):
+            if format == "csv" or pyarrow is not None:
+                outputs.append((format, os.path.join(tmp, format), lambda path, format=format: write_columnar(format, path, results, args.row_group_size)))
+        rows = []
+        for label, path, write in outputs:
+            seconds, peak = measure(lambda: write(path))
+            rows.append((label, size(path), seconds, peak))
+
+    if pyarrow is None:
+        print("pyarrow is not installed, parquet and arrow skipped")
+    json_bytes = rows[0][1]
+    print(f"{'format':<10}{'MiB':>8}{'vs ndjson':>11}{'write s':>9}{'us/member':>11}{'peak MiB':>10}")
+    for label, written, seconds, peak in rows:
+        print(f"{label:<10}{written / 1024 ** 2:>8.1f}{written / json_bytes:>10.0%}{seconds:>9.2f}"
+              f"{seconds / args.members * 1e6:>11.1f}{peak / 1024 ** 2:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import json
+import os
+import time
+from hccinfhir import stream
+from hccinfhir.extractor_fhir import extract_sld_fhir, extract_sld_fhir_models
+
+# Per-EOB cost of FHIR extraction on sample_eob_200.ndjson repeated --copies times: parsing the NDJSON
+# line (json against orjson, when installed) and extracting service level data (validating through the
+# pydantic EOB models against walking the raw dict). Both extractors are checked to agree first.
+
+SAMPLE = os.path.join(bootstrap.vendor_dir, "hccinfhir", "samples", "sample_eob_200.ndjson")
+
+
+def per_eob_us(fn, items: list) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the per-EOB FHIR parsing and extraction cost, pydantic models vs. dict walk.")
+    parser.add_argument("--copies", type=int, default=50)
+    args = parser.parse_args()
+
+    with open(SAMPLE, "rb") as f:
+        lines = [line for line in f if line.strip()] * args.copies
+    eobs = [json.loads(line) for line in lines[:len(lines) // args.copies]]
+    for eob in eobs:
+        assert extract_sld_fhir(eob) == extract_sld_fhir_models(eob)
+    eobs *= args.copies
+
+    rows = [("parse, json", per_eob_us(json.loads, lines))]
+    if stream._orjson_loads is not None:
+        rows.append(("parse, orjson", per_eob_us(stream.loads, lines)))
+    rows += [
+        ("extract, pydantic models", per_eob_us(extract_sld_fhir_models, eobs)),
+        ("extract, dict walk", per_eob_us(extract_sld_fhir, eobs)),
+        ("parse + extract, before", per_eob_us(lambda line: extract_sld_fhir_models(json.loads(line)), lines)),
+        ("parse + extract, now", per_eob_us(lambda line: extract_sld_fhir(stream.loads(line)), lines)),
+    ]
+    print(f"{len(lines)} EOBs")
+    for label, us in rows:
+        print(f"{label:<28}{us:>8.1f} us/EOB")
+
+
+if __name__ == "__main__":
+    main()
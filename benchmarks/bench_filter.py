@@ -0,0 +1,69 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import contextlib
+import glob
+import json
+import os
+import time
+from collections import Counter
+from hccinfhir.extractor import extract_sld_list
+from hccinfhir.filter import RULES, CompiledFilter, apply_filter
+from hccinfhir.stream import group_by_patient
+
+# Cost of the risk adjustment filter per service line, on the service lines of the bundled samples
+# (the EOB patients and the 837 files) repeated --copies times: apply_filter called once per patient,
+# as HCCInFHIR.run does, CompiledFilter.filter over the whole list, and filter_columns over the same
+# lines as columns. Also prints how many lines each rule kept and dropped.
+
+SAMPLES = os.path.join(bootstrap.vendor_dir, "hccinfhir", "samples")
+
+
+def sample_patients() -> list:
+    """Service lines of each sample patient (each 837 file counts as one patient)"""
+    with open(os.path.join(SAMPLES, "sample_eob_200.ndjson")) as f:
+        groups = [eobs for _, eobs in group_by_patient(json.loads(line) for line in f if line.strip())]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        patients = [extract_sld_list(eobs) for eobs in groups]
+        for path in sorted(glob.glob(os.path.join(SAMPLES, "sample_837_*.txt"))):
+            with open(path) as f:
+                patients.append(extract_sld_list([f.read()], "837"))
+    return patients
+
+
+def per_line_ns(fn, lines: int, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best / lines * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the risk adjustment filter cost per service line.")
+    parser.add_argument("--copies", type=int, default=500)
+    args = parser.parse_args()
+
+    patients = sample_patients() * args.copies
+    lines = [sld for patient in patients for sld in patient]
+    columns = ([sld.procedure_code for sld in lines], [sld.facility_type for sld in lines], [sld.service_type for sld in lines])
+    compiled = CompiledFilter()
+    assert apply_filter(lines) == compiled.filter(lines) == [sld for sld, kept in zip(lines, compiled.filter_columns(*columns)) if kept]
+
+    rows = [
+        ("apply_filter per patient", per_line_ns(lambda: [apply_filter(patient) for patient in patients], len(lines))),
+        ("CompiledFilter.filter", per_line_ns(lambda: compiled.filter(lines), len(lines))),
+        ("CompiledFilter.filter_columns", per_line_ns(lambda: compiled.filter_columns(*columns), len(lines))),
+    ]
+    counts = Counter()
+    compiled.filter(lines, counts)
+
+    print(f"{len(lines)} service lines, {len(patients)} patients")
+    for label, ns in rows:
+        print(f"{label:<32}{ns:>8.0f} ns/line")
+    for rule in RULES:
+        print(f"{rule:<32}{counts[rule]:>8}")
+
+
+if __name__ == "__main__":
+    main()
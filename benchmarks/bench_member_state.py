@@ -0,0 +1,95 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from app.member_state import MemberStateStore
+from app.render import render_multi_response_v28
+from benchmarks.synthetic import synthetic_population
+
+# Daily claims feeds against the member state store (app/member_state.py). Each synthetic member's
+# year of diagnosis codes arrives over --days feeds: a feed holds the members who had claims that day,
+# with a few of their codes, often ones already sent (the same chronic condition coded visit after
+# visit). The previous way re-scores each of these members on their whole year-to-date list, as
+# /multi requires; the store ingests the day's codes and rescores only the members whose CCs changed.
+# At the end, every member's stored response must equal /multi on their year-to-date codes.
+
+DEMOGRAPHIC_FIELDS = ("age", "sex", "dual_elgbl_cd", "orec", "crec", "new_enrollee", "snp")
+
+
+def daily_feeds(members: list, days: int, rng: random.Random) -> list:
+    """For each day, the records of the members with claims that day: {"member_id", "diagnosis_codes"}"""
+    feeds = [[] for _ in range(days)]
+    for member in members:
+        codes = member["diagnosis_codes"]
+        for _ in range(rng.randint(1, 12)):  # claim days in the year
+            sent = [rng.choice(codes) for _ in range(rng.randint(1, 3))] if codes else []
+            feeds[rng.randrange(days)].append({"member_id": member["member_id"], "diagnosis_codes": sent})
+    return feeds
+
+
+def canonical(response: bytes) -> dict:
+    """A /multi response with the HCCs and each HCC's dx list sorted, their order follows set iteration"""
+    response = json.loads(response)
+    for hcc in response["hcc"]:
+        hcc["dx"] = sorted(hcc["dx"]) if isinstance(hcc["dx"], list) else hcc["dx"]
+    response["hcc"].sort(key=lambda hcc: hcc["code"])
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay daily claims feeds, member state store vs. rescoring year-to-date codes.")
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    members = synthetic_population(args.members, args.seed)
+    demographics = {m["member_id"]: {key: m[key] for key in DEMOGRAPHIC_FIELDS} for m in members}
+    feeds = daily_feeds(members, args.days, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemberStateStore(os.path.join(tmp, "member_state.db"))
+        seen = set()
+        year_to_date = {}
+        full_seconds = store_seconds = 0.0
+        counts = Counter()
+        for feed in feeds:
+            start = time.perf_counter()
+            for record in feed:
+                codes = year_to_date.setdefault(record["member_id"], [])
+                codes.extend(record["diagnosis_codes"])
+                render_multi_response_v28(diagnosis_codes=codes, **demographics[record["member_id"]])
+            full_seconds += time.perf_counter() - start
+
+            records = []
+            for record in feed:
+                if record["member_id"] not in seen:
+                    seen.add(record["member_id"])
+                    record = {**record, **demographics[record["member_id"]]}
+                records.append(record)
+            start = time.perf_counter()
+            result = store.ingest(records)
+            store_seconds += time.perf_counter() - start
+            assert result["error_count"] == 0, result
+            counts.update({key: result[key] for key in ("created", "rescored", "updated", "unchanged")})
+
+        for member_id, codes in year_to_date.items():
+            expected = render_multi_response_v28(diagnosis_codes=codes, **demographics[member_id])
+            assert canonical(store.render(member_id)) == canonical(expected), member_id
+        size_mb = os.path.getsize(os.path.join(tmp, "member_state.db")) / 1024 ** 2
+
+    records = sum(len(feed) for feed in feeds)
+    print(f"{len(year_to_date)} members, {records} member records over {args.days} days, stored responses equal /multi on year-to-date codes")
+    print(f"created {counts['created']}, rescored {counts['rescored']}, updated without rescoring {counts['updated']}, "
+          f"unchanged {counts['unchanged']}, database {size_mb:.1f} MB")
+    print(f"{'full year-to-date rescoring':<30}{full_seconds:>8.2f} s {full_seconds / records * 1e6:>8.1f} us/record")
+    print(f"{'member state store':<30}{store_seconds:>8.2f} s {store_seconds / records * 1e6:>8.1f} us/record")
+
+
+if __name__ == "__main__":
+    main()
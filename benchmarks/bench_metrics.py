@@ -0,0 +1,42 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import time
+from app import metrics
+from app.render import render_multi_response_v28
+from benchmarks.synthetic import synthetic_population
+
+# Overhead of the stage timers of app/metrics.py: /multi responses for synthetic members, built before
+# and after metrics.instrument() wraps the scoring stages and the response formatting (what RAF_METRICS=true
+# does at startup). Uninstrumented is also the cost with RAF_METRICS off, nothing is wrapped then.
+
+
+def per_member_us(requests: list) -> float:
+    start = time.perf_counter()
+    for request in requests:
+        render_multi_response_v28(**request)
+    return (time.perf_counter() - start) / len(requests) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the overhead of the RAF_METRICS stage timers per /multi response.")
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    requests = [{key: value for key, value in member.items() if key != "member_id"}
+                for member in synthetic_population(args.members)]
+    per_member_us(requests)  # warm up the profile and fragment caches
+
+    off = min(per_member_us(requests) for _ in range(args.rounds))
+    metrics.instrument()
+    on = min(per_member_us(requests) for _ in range(args.rounds))
+    observations = sum(value for name, _, value in metrics.stage_seconds.samples() if name.endswith("_count"))
+
+    print(f"{args.members} members, best of {args.rounds}")
+    print(f"{'uninstrumented (RAF_METRICS off)':<36}{off:>8.1f} us")
+    print(f"{'instrumented (RAF_METRICS on)':<36}{on:>8.1f} us   +{on - off:.1f} us, "
+          f"{observations / (args.members * args.rounds):.1f} stage observations per member")
+
+
+if __name__ == "__main__":
+    main()
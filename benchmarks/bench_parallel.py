@@ -0,0 +1,87 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import contextlib
+import json
+import os
+import time
+from hccinfhir.hccinfhir import HCCInFHIR
+from hccinfhir.parallel import ParallelScorer, calculate_member
+from hccinfhir.stream import group_by_patient, score_ndjson
+from benchmarks.synthetic import synthetic_population
+
+# Scaling of ParallelScorer from 1 to N worker processes, against scoring in-process. "eob" replays the
+# sample EOB patients as NDJSON lines through score_ndjson, as the bulk CLI does (extraction dominates);
+# "dx" scores synthetic diagnosis-code members (scoring only, so shipping results weighs more).
+
+SAMPLE = os.path.join(bootstrap.vendor_dir, "hccinfhir", "samples", "sample_eob_200.ndjson")
+
+
+def eob_lines(n: int) -> list:
+    """NDJSON lines of n patients, each a copy of one of the sample patients"""
+    with open(SAMPLE) as f:
+        groups = [eobs for _, eobs in group_by_patient(json.loads(line) for line in f if line.strip())]
+    lines = []
+    for i in range(n):
+        for eob in groups[i % len(groups)]:
+            lines.append(json.dumps({**eob, "patient": {"reference": f"Patient/member-{i}"}}).encode() + b"\n")
+    return lines
+
+
+def demographics_for(patient_id: str) -> dict:
+    return {"age": 70 + len(patient_id) % 20, "sex": "F"}
+
+
+def dx_members(n: int) -> list:
+    return [(m["member_id"], m["diagnosis_codes"],
+             {key: value for key, value in m.items() if key not in ("member_id", "diagnosis_codes")})
+            for m in synthetic_population(n)]
+
+
+def worker_counts(max_workers: int) -> list:
+    counts, workers = [], 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    return counts + [max_workers]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure ParallelScorer scaling with the number of workers.")
+    parser.add_argument("--mode", choices=["eob", "dx"], default="eob")
+    parser.add_argument("--members", type=int, default=None, help="Default 1500 for eob, 100000 for dx")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=None, help="Default 8 for eob, 256 for dx")
+    args = parser.parse_args()
+
+    eob = args.mode == "eob"
+    n = args.members or (1500 if eob else 100000)
+    chunk_size = args.chunk_size or (8 if eob else 256)
+    processor = HCCInFHIR()
+    if eob:
+        lines = eob_lines(n)
+        score = lambda workers: score_ndjson(lines, demographics_for, processor, workers, chunk_size)
+    else:
+        members = dx_members(n)
+        def score(workers):
+            if workers == 0:
+                yield from (calculate_member(processor, member) for member in members)
+                return
+            with ParallelScorer(processor, workers, chunk_size) as scorer:
+                yield from scorer.calculate(members)
+
+    # The extractor prints warnings for the odd sample EOB, keep them out of the table
+    rows = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for workers in [0] + worker_counts(args.max_workers):
+            start = time.perf_counter()
+            for _ in score(workers):
+                pass
+            rows.append(("in process" if workers == 0 else f"{workers} workers", time.perf_counter() - start))
+
+    print(f"{n} {args.mode} members, chunk size {chunk_size}")
+    for label, seconds in rows:
+        print(f"{label:<14}{seconds:>8.2f} s{n / seconds:>10.0f} members/s{rows[0][1] / seconds:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
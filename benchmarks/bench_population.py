@@ -0,0 +1,127 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import json
+import math
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from app.population import DEFAULT_PERCENTILES, PopulationAggregate, aggregate_stream
+from app.render import render_multi_response_v28
+from benchmarks.synthetic import synthetic_population
+
+# Plan-level aggregates (app/population.py) against the way they were computed before: a /multi
+# response per member, every row kept, then the statistics over the whole table (here plain lists,
+# standing in for the pandas frame). Both must agree: the same percentiles and HCC, interaction and
+# payable HCC count frequencies, and means within the 3 decimals the responses round to. The aggregate
+# of --shards parts, saved as JSON states and merged, and of --workers processes must equal the
+# single pass. Then times both ways, and the peak memory traced while they run. The single pass also
+# parses the members from NDJSON lines, the table starts from the parsed members.
+
+DEMOGRAPHIC_FIELDS = ("age", "sex", "dual_elgbl_cd", "orec", "crec", "new_enrollee", "snp")
+
+
+def table_aggregates(members: list) -> dict:
+    """The previous way: every /multi response kept as a row, then aggregated"""
+    rows = []
+    for member in members:
+        response = json.loads(render_multi_response_v28(diagnosis_codes=member["diagnosis_codes"],
+                                                         **{key: member[key] for key in DEMOGRAPHIC_FIELDS}))
+        codes = [entry["code"] for entry in response["interactions"]]
+        rows.append({
+            "risk_score": response["risk_score"],
+            "risk_score_normalized": response["risk_score_normalized"],
+            "community": response["community"],
+            "hccs": [entry["code"] for entry in response["hcc"]],
+            "interactions": [code for code in codes if not (code.startswith("D") and code[1:].rstrip("P").isdigit())],
+            "d_count": next((code for code in codes if code.startswith("D") and code[1:].rstrip("P").isdigit()), "D0"),
+        })
+
+    def percentiles(column: str) -> dict:
+        values = sorted(row[column] for row in rows)
+        return {f"p{p:g}": values[max(1, math.ceil(p / 100 * len(values))) - 1] for p in DEFAULT_PERCENTILES}
+
+    segments = defaultdict(lambda: {"member_count": 0, "interactions": Counter(), "d_count": Counter()})
+    for row in rows:
+        segment = segments[row["community"]]
+        segment["member_count"] += 1
+        segment["interactions"].update(row["interactions"])
+        segment["d_count"][row["d_count"]] += 1
+    return {
+        "member_count": len(rows),
+        "risk_score_mean": sum(row["risk_score"] for row in rows) / len(rows),
+        "risk_score": percentiles("risk_score"),
+        "risk_score_normalized": percentiles("risk_score_normalized"),
+        "hccs": Counter(code for row in rows for code in row["hccs"]),
+        "segments": {label: {**segment, "interactions": dict(segment["interactions"]), "d_count": dict(segment["d_count"])}
+                     for label, segment in segments.items()},
+    }
+
+
+def check_equal(summary: dict, table: dict) -> None:
+    assert summary["member_count"] == table["member_count"] and summary["error_count"] == 0
+    assert abs(summary["risk_score"]["mean"] - table["risk_score_mean"]) <= 0.001
+    assert summary["risk_score"]["percentiles"] == table["risk_score"]
+    assert summary["risk_score_normalized"]["percentiles"] == table["risk_score_normalized"]
+    assert {entry["code"]: entry["count"] for entry in summary["hcc_prevalence"]} == table["hccs"]
+    segments = {segment["community"]: {
+        "member_count": segment["member_count"],
+        "interactions": {entry["code"]: entry["count"] for entry in segment["interactions"]},
+        "d_count": {entry["code"]: entry["count"] for entry in segment["d_count"]},
+    } for segment in summary["segments"]}
+    assert segments == table["segments"], (segments, table["segments"])
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def peak_bytes(fn) -> int:
+    """Most memory allocated at once while fn runs, in a separate untimed run (tracing slows it down)"""
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare population aggregates in one streaming pass with a table of /multi responses.")
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    members = synthetic_population(args.members, args.seed)
+    lines = [json.dumps(member).encode() for member in members]
+
+    table = table_aggregates(members)
+    aggregate = aggregate_stream(iter(lines))
+    summary = aggregate.summary()
+    check_equal(summary, table)
+
+    merged = PopulationAggregate()
+    for shard in range(args.shards):
+        part = aggregate_stream(iter(lines[shard::args.shards]))
+        merged.merge(PopulationAggregate.from_state(json.loads(json.dumps(part.state()))))
+    assert merged.summary() == summary
+    assert aggregate_stream(iter(lines), workers=args.workers, chunk_size=500).summary() == summary
+    print(f"{args.members} members: aggregates equal the /multi-per-member table, {args.shards} merged shards "
+          f"and {args.workers} workers equal the single pass")
+
+    table_run = lambda: table_aggregates(members)
+    single_pass = lambda: aggregate_stream(iter(lines))
+    rows = [
+        ("/multi per member, table", timed(table_run), peak_bytes(table_run)),
+        ("single pass", timed(single_pass), peak_bytes(single_pass)),
+        (f"single pass, {args.workers} workers", timed(lambda: aggregate_stream(iter(lines), workers=args.workers, chunk_size=500)), None),
+    ]
+    for label, seconds, peak in rows:
+        memory = f"{peak / 1024 ** 2:>8.1f} MiB peak" if peak is not None else ""
+        print(f"{label:<28}{seconds:>8.2f} s {seconds / args.members * 1e6:>8.1f} us/member{memory}")
+
+
+if __name__ == "__main__":
+    main()
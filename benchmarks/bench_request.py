@@ -0,0 +1,67 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import time
+from hccinfhir.datamodels import Demographics, DemographicsRecord
+from hccinfhir.model_demographics import categorize_demographics_record
+from hccinfhir import model_calculate
+from app.render import render_multi_response_v28
+from app.utils import sanitize_for_JSON
+
+# Per-request cost of the /multi route: the demographics record against the pydantic Demographics it
+# replaced on the hot path (categorization and JSON sanitizing), and the full route with and without
+# the demographic profile cache.
+
+REQUEST = {
+    "diagnosis_codes": ["E1121", "E1122", "I4820", "I5021", "N1831"],
+    "age": 66,
+    "sex": "M",
+    "dual_elgbl_cd": "FBDual",
+    "orec": "0",
+    "crec": "0",
+    "new_enrollee": False,
+    "snp": False,
+}
+
+
+def per_call_us(fn, n: int) -> float:
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def set_profile_cache_size(maxsize: int) -> None:
+    model_calculate.profile_cache.resize(maxsize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the per-request cost of the /multi route and its demographics handling.")
+    parser.add_argument("-n", type=int, default=20000)
+    args = parser.parse_args()
+
+    args_v28 = (66, "M", "02", "0", "0", "V2", False, False, False, None)
+    record = categorize_demographics_record(*args_v28)
+    fields = record.model_dump()
+    model = Demographics(**fields)
+    result = model_calculate.calculate_raf(REQUEST["diagnosis_codes"], "CMS-HCC Model V28", 66, "M", "02")
+
+    rows = [
+        ("Demographics(**fields), validated", per_call_us(lambda: Demographics(**fields), args.n)),
+        ("DemographicsRecord(**fields)", per_call_us(lambda: DemographicsRecord(**fields), args.n)),
+        ("Demographics.model_dump()", per_call_us(model.model_dump, args.n)),
+        ("DemographicsRecord.model_dump()", per_call_us(record.model_dump, args.n)),
+        ("sanitize result, Demographics", per_call_us(lambda: sanitize_for_JSON({**result, "demographics": model}), args.n)),
+        ("sanitize result, DemographicsRecord", per_call_us(lambda: sanitize_for_JSON({**result, "demographics": record}), args.n)),
+    ]
+    set_profile_cache_size(0)
+    rows.append(("/multi request, profile cache off", per_call_us(lambda: render_multi_response_v28(**REQUEST), args.n)))
+    set_profile_cache_size(model_calculate.PROFILE_CACHE_SIZE)
+    rows.append(("/multi request, profile cache on", per_call_us(lambda: render_multi_response_v28(**REQUEST), args.n)))
+
+    for label, us in rows:
+        print(f"{label:<40}{us:>8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+os.environ.setdefault("RAF_RESPONSE_CACHE", "off")  # time the responses being built, not the response cache
+from app import render
+from app.main import app
+from app.utils import calculate_multi_v28, format_multi_response
+from benchmarks.synthetic import synthetic_population
+
+# Cost of building the /multi response from a calculate_raf() result, for synthetic members: the
+# previous path (format_multi_response(), then json.dumps as Flask-RESTX serializes, plus the debug
+# print of the raw result the route used to do) against render_multi_response() with json and with
+# orjson (when installed). Peak bytes is the most memory traced while building one response. The
+# last row is the whole /multi route through the Flask test client.
+
+
+def previous_path(raw: dict, devnull) -> bytes:
+    print(raw, file=devnull)
+    return (json.dumps(format_multi_response(raw)) + "\n").encode()
+
+
+def per_call(fn, items: list) -> tuple:
+    for item in items[:100]:
+        fn(item)  # warm up the fragment caches
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    us = (time.perf_counter() - start) / len(items) * 1e6
+
+    tracemalloc.start()
+    peaks = []
+    for item in items[:1000]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        fn(item)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return us, sum(peaks) / len(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare /multi response construction time and peak bytes, previous path vs. app/render.py.")
+    parser.add_argument("--members", type=int, default=20000)
+    args = parser.parse_args()
+
+    requests = [{key: value for key, value in member.items() if key != "member_id"}
+                for member in synthetic_population(args.members)]
+    raws = [calculate_multi_v28(**request) for request in requests]
+    for raw in raws[:1000]:
+        assert json.loads(render.render_multi_response(raw)) == json.loads(json.dumps(format_multi_response(raw)))
+
+    orjson_dumps = render._orjson_dumps
+    with open(os.devnull, "w") as devnull:
+        rows = [("format + json.dumps + print", per_call(lambda raw: previous_path(raw, devnull), raws))]
+    render._orjson_dumps = None
+    render._hcc_fragments.cache_clear(), render._interaction_fragment.cache_clear(), render._demographics_fragments.cache_clear()
+    rows.append(("render_multi_response, json", per_call(render.render_multi_response, raws)))
+    render._orjson_dumps = orjson_dumps
+    if orjson_dumps is not None:
+        render._hcc_fragments.cache_clear(), render._interaction_fragment.cache_clear(), render._demographics_fragments.cache_clear()
+        rows.append(("render_multi_response, orjson", per_call(render.render_multi_response, raws)))
+
+    client = app.test_client()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        rows.append(("/multi route, test client", per_call(lambda request: client.post("/v1/raf-v28/multi", json=request), requests[:5000])))
+
+    print(f"{len(raws)} members")
+    for label, (us, peak) in rows:
+        print(f"{label:<34}{us:>8.1f} us{peak / 1024:>8.1f} KiB peak")
+
+
+if __name__ == "__main__":
+    main()
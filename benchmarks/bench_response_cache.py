@@ -0,0 +1,130 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import json
+import random
+import time
+from app import response_cache as cache_module
+from app.main import app
+from app.render import dumps, render_multi_response_v28
+from app.response_cache import MemoryBackend, ResponseCache, cached_response
+from app.utils import get_blended_response, get_single_response_v28
+from benchmarks.synthetic import synthetic_population
+
+# The response cache of the scoring routes (app/response_cache.py), through the Flask test client. Each
+# synthetic member is sent once, then again as a variant with the same canonical form: its codes
+# shuffled, repeated, lowercased or dotted, its dual status as "FBDual"/"PBDual", None for the absent
+# optional fields. The variant must be a cache hit, and its response must equal the response computed
+# for the variant itself, without the cache. Then times computing the responses against looking them
+# up, and the routes with the cache off, on a miss and on a hit, and a hit revalidated with
+# If-None-Match (a 304 without the body).
+
+DEMOGRAPHIC_FIELDS = ("age", "sex", "dual_elgbl_cd", "orec", "crec", "new_enrollee", "snp")
+DUAL_ALIASES = {"02": "FBDual", "01": "PBDual"}
+
+
+def variant(payload: dict, rng: random.Random) -> dict:
+    """A payload with the same canonical form"""
+    payload = dict(payload)
+    if "diagnosis_codes" in payload:
+        codes = payload["diagnosis_codes"] + rng.sample(payload["diagnosis_codes"], min(2, len(payload["diagnosis_codes"])))
+        rng.shuffle(codes)
+        payload["diagnosis_codes"] = [rng.choice((str.lower, dotted, str))(dx) for dx in codes]
+    if "diagnosis_code" in payload:
+        payload["diagnosis_code"] = dotted(payload["diagnosis_code"].lower())
+    if payload.get("dual_elgbl_cd") in DUAL_ALIASES:
+        payload["dual_elgbl_cd"] = DUAL_ALIASES[payload["dual_elgbl_cd"]]
+    for key in ("dual_elgbl_cd", "orec", "crec"):
+        payload.setdefault(key, None)
+    return dict(rng.sample(list(payload.items()), len(payload)))
+
+
+def dotted(dx: str) -> str:
+    return dx[:3] + "." + dx[3:] if len(dx) > 3 else dx
+
+
+def canonical(response) -> dict:
+    """A response with its HCCs and their dx lists sorted, their order follows set iteration"""
+    response = json.loads(response)
+    models = response["models"].values() if isinstance(response.get("models"), dict) else [response]
+    for model in models:
+        for hcc in model.get("hcc", []):
+            hcc["dx"] = sorted(hcc["dx"]) if isinstance(hcc.get("dx"), list) else hcc.get("dx")
+        if isinstance(model.get("hcc"), list):
+            model["hcc"].sort(key=lambda hcc: hcc["code"])
+    return response
+
+
+def per_request_us(client, route: str, payloads: list, headers: list|None = None, status: int = 200) -> float:
+    start = time.perf_counter()
+    for payload, header in zip(payloads, headers or [{}] * len(payloads)):
+        response = client.post(route, json=payload, headers=header)
+        assert response.status_code == status, (route, response.status_code, response.get_data(as_text=True)[:200])
+    return (time.perf_counter() - start) / len(payloads) * 1e6
+
+
+def per_call_us(fn, payloads: list, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best / len(payloads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time equivalent requests answered from the response cache.")
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    members = synthetic_population(args.members, args.seed)
+    multi = [{"diagnosis_codes": m["diagnosis_codes"], **{key: m[key] for key in DEMOGRAPHIC_FIELDS}} for m in members]
+    routes = [
+        ("/v1/raf-v28/multi", multi, lambda p: render_multi_response_v28(**p)),
+        ("/v1/raf-v28/single", [{**{key: p[key] for key in DEMOGRAPHIC_FIELDS}, "diagnosis_code": (p["diagnosis_codes"] or ["E119"])[0]}
+                                for p in multi], lambda p: dumps(get_single_response_v28(**p))),
+        ("/v1/raf/blended", multi[:500], lambda p: dumps(get_blended_response(**p))),
+    ]
+    client = app.test_client()
+
+    cache_module.response_cache = ResponseCache(MemoryBackend(len(multi) * 2))
+    checked = 0
+    for route, payloads, compute in routes:
+        for payload in payloads:
+            assert client.post(route, json=payload).status_code == 200
+            hits = cache_module.response_cache.hits
+            other = variant(payload, rng)
+            response = client.post(route, json=other)
+            assert response.status_code == 200 and cache_module.response_cache.hits == hits + 1, (route, other)
+            assert canonical(response.get_data()) == canonical(compute(other)), (route, other)
+            assert response.headers["ETag"] and client.post(
+                route, json=payload, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+            checked += 1
+    print(f"{checked} requests and variants (shuffled, repeated, lowercased, dotted codes, dual aliases), cached responses equal fresh ones")
+
+    # The response alone: computing it, against looking it up (canonical form, key hash and LRU lookup)
+    print(f"{'response':<24}{'computed':>12}{'cache hit':>12}  us")
+    for route, payloads, compute in routes:
+        cache_module.response_cache = ResponseCache(MemoryBackend(len(payloads)))
+        computed = per_call_us(compute, payloads)
+        for payload in payloads:
+            cached_response(route, payload, lambda: compute(payload))
+        hit = per_call_us(lambda payload: cached_response(route, payload, None), payloads)
+        print(f"{route:<24}{computed:>12.1f}{hit:>12.1f}")
+
+    print(f"\n{'route, test client':<24}{'cache off':>12}{'miss':>12}{'hit':>12}{'304':>12}  us/request")
+    for route, payloads, _ in routes:
+        cache_module.response_cache = None
+        off = per_request_us(client, route, payloads)
+        cache_module.response_cache = ResponseCache(MemoryBackend(len(payloads)))
+        miss = per_request_us(client, route, payloads)
+        hit = per_request_us(client, route, payloads)
+        etags = [{"If-None-Match": client.post(route, json=p).headers["ETag"]} for p in payloads]
+        not_modified = per_request_us(client, route, payloads, etags, 304)
+        print(f"{route:<24}{off:>12.1f}{miss:>12.1f}{hit:>12.1f}{not_modified:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import random
+import time
+import typing
+from hccinfhir import model_calculate
+from hccinfhir.datamodels import ModelName
+from hccinfhir.model_calculate import calculate_raf
+from hccinfhir.model_hierarchies import HIERARCHY_EXCLUSIONS, apply_hierarchies
+from hccinfhir.model_interactions import apply_interactions, get_compiled_interactions
+from benchmarks.synthetic import synthetic_population
+from tests.rules_reference import (get_diagnostic_categories, model_ccs, random_cc_set, random_demographics,
+                                   reference_apply_hierarchies, reference_apply_interactions)
+
+# Randomized comparison of the compiled hierarchy and interaction rules (bit masks, model_hierarchies.py
+# and model_interactions.py) against the set-based rules they replaced (tests/rules_reference.py), for
+# all six models: random CC sets and demographics through apply_hierarchies, the diagnostic categories
+# and apply_interactions, then synthetic members through calculate_raf. tests/test_rules.py runs a
+# smaller version of the first part. Results must be equal, including the iteration order of the
+# returned sets and dicts (calculate_raf's float sums follow it). Then times both versions.
+
+MODELS = list(typing.get_args(ModelName))
+
+
+def check_rules(model_name: str, cases: int, rng: random.Random) -> None:
+    ccs = model_ccs(model_name)
+    compiled = get_compiled_interactions(model_name)
+    rule_ccs = compiled.cc_codes + [cc for cc, _ in HIERARCHY_EXCLUSIONS.get(model_name, ())] or ccs
+    for _ in range(cases):
+        cc_set = random_cc_set(rng, ccs, rule_ccs)
+        demographics = random_demographics(rng, model_name)
+
+        expected_input, actual_input = set(cc_set), set(cc_set)
+        expected = reference_apply_hierarchies(expected_input, model_name)
+        actual = apply_hierarchies(actual_input, model_name)
+        assert list(expected) == list(actual) and list(expected_input) == list(actual_input), (model_name, cc_set)
+
+        for hcc_set in (cc_set, expected):
+            assert compiled.diagnostic_categories(hcc_set) == get_diagnostic_categories(model_name, hcc_set)
+            expected_interactions = reference_apply_interactions(demographics, hcc_set, model_name)
+            actual_interactions = apply_interactions(demographics, hcc_set, model_name)
+            assert list(expected_interactions.items()) == list(actual_interactions.items()), (model_name, hcc_set)
+            assert all(type(value) is int for value in actual_interactions.values())
+
+
+def check_calculate_raf(model_name: str, members: list) -> None:
+    actual = [calculate_raf(model_name=model_name, **member) for member in members]
+    model_calculate.apply_hierarchies, model_calculate.apply_interactions = reference_apply_hierarchies, reference_apply_interactions
+    try:
+        expected = [calculate_raf(model_name=model_name, **member) for member in members]
+    finally:
+        model_calculate.apply_hierarchies, model_calculate.apply_interactions = apply_hierarchies, apply_interactions
+    for member, a, b in zip(members, expected, actual):
+        assert a == b and list(a["hcc_list"]) == list(b["hcc_list"]), (model_name, member)
+
+
+def per_call_us(fn, items: list, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(*item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the compiled hierarchy and interaction rules against the set-based ones and time both.")
+    parser.add_argument("--cases", type=int, default=5000, help="Random CC sets per model")
+    parser.add_argument("--members", type=int, default=5000, help="Synthetic members per model through calculate_raf")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    members = [{key: value for key, value in member.items() if key != "member_id"}
+               for member in synthetic_population(args.members, args.seed)]
+    for model_name in MODELS:
+        check_rules(model_name, args.cases, rng)
+        check_calculate_raf(model_name, members)
+    print(f"{len(MODELS)} models: {args.cases} random CC sets and {args.members} members each, all equal")
+
+    model_name = "CMS-HCC Model V28"
+    profiles = [model_calculate.get_demographic_profile(model_name, m["age"], m["sex"], m["dual_elgbl_cd"], m["orec"],
+                                                        m["crec"], m["new_enrollee"], m["snp"]) for m in members]
+    cc_sets = [set(model_calculate.apply_mapping(m["diagnosis_codes"], model_name)) for m in members]
+    hcc_sets = [apply_hierarchies(set(ccs), model_name) for ccs in cc_sets]
+    interaction_args = [(p.demographics, hccs, model_name, p.demographic_interactions) for p, hccs in zip(profiles, hcc_sets)]
+    rows = [
+        ("apply_hierarchies, sets", per_call_us(lambda ccs: reference_apply_hierarchies(set(ccs), model_name), [(c,) for c in cc_sets])),
+        ("apply_hierarchies, compiled", per_call_us(lambda ccs: apply_hierarchies(set(ccs), model_name), [(c,) for c in cc_sets])),
+        ("apply_interactions, if/elif", per_call_us(reference_apply_interactions, interaction_args)),
+        ("apply_interactions, compiled", per_call_us(apply_interactions, interaction_args)),
+    ]
+    print(f"{model_name}, {len(members)} synthetic members")
+    for label, us in rows:
+        print(f"{label:<32}{us:>8.2f} us per member")
+
+
+if __name__ == "__main__":
+    main()
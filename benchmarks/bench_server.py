@@ -0,0 +1,151 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# Load test of the deployments: gunicorn with 2 sync workers serving the Flask app (the Docker image)
+# against uvicorn serving app/asgi.py with a thread or a process executor. The stand-in client opens
+# --concurrency connections that each send /multi requests back to back (a new connection per
+# request, as gunicorn's sync workers close them anyway) and reports p50/p99 latency and requests/s.
+#
+# --slow-clients holds that many extra connections open for the whole run, each having sent its
+# headers and half of its body, like clients on a slow network. Sync workers wait on them; the event
+# loop does not.
+
+REQUEST = {
+    "diagnosis_codes": ["E1121", "E1122", "I4820", "I5021", "N1831"],
+    "age": 66,
+    "sex": "M",
+    "dual_elgbl_cd": "FBDual",
+}
+
+SERVERS = {
+    "gunicorn -w 2 (sync)": (["-m", "gunicorn", "-w", "2", "-b", "127.0.0.1:{port}", "app.main:app"], {}),
+    "uvicorn, thread executor": (["-m", "uvicorn", "app.asgi:app", "--port", "{port}", "--log-level", "warning"],
+                                 {"RAF_EXECUTOR": "thread"}),
+    "uvicorn, process executor": (["-m", "uvicorn", "app.asgi:app", "--port", "{port}", "--log-level", "warning"],
+                                  {"RAF_EXECUTOR": "process"}),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def http_request(path: str, body: bytes) -> bytes:
+    return (f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode() + body
+
+
+async def send_one(port: int, request: bytes) -> tuple:
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request)
+        response = await reader.read()
+        writer.close()
+    except OSError:
+        response = b""
+    status = int(response.split(b" ", 2)[1]) if response.startswith(b"HTTP/") else 0
+    return status, time.perf_counter() - start
+
+
+async def slow_client(port: int, request: bytes, stop: asyncio.Event) -> None:
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        return
+    writer.write(request[:len(request) - len(json.dumps(REQUEST)) // 2])
+    await stop.wait()
+    writer.close()
+
+
+async def load(port: int, requests: int, concurrency: int, slow_clients: int) -> tuple:
+    request = http_request("/v1/raf-v28/multi", json.dumps(REQUEST).encode())
+    stop = asyncio.Event()
+    slow = [asyncio.create_task(slow_client(port, request, stop)) for _ in range(slow_clients)]
+    await asyncio.sleep(0.2)
+    remaining = requests
+    results = []
+
+    async def connection():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            results.append(await send_one(port, request))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*slow)
+    return results, elapsed
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def run_server(argv: list, env: dict, requests: int, concurrency: int, slow_clients: int, timeout: float) -> tuple:
+    port = free_port()
+    argv = [sys.executable] + [arg.format(port=port) for arg in argv]
+    # Keep the servers' access and error logs out of the table. Every request is the same, the response
+    # cache would answer all but the first
+    server = subprocess.Popen(argv, env={**os.environ, "RAF_RESPONSE_CACHE": "off", **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        asyncio.run(load(port, concurrency * 2, concurrency, 0))  # warm up
+        try:
+            return asyncio.run(asyncio.wait_for(load(port, requests, concurrency, slow_clients), timeout))
+        except asyncio.TimeoutError:
+            return None, timeout
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def percentile(values: list, p: float) -> float:
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test gunicorn + Flask against uvicorn + app/asgi.py.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--slow-clients", type=int, default=0, help="Connections that stall mid-body for the whole run")
+    parser.add_argument("--timeout", type=float, default=120, help="Give up on a server after this many seconds")
+    parser.add_argument("--servers", nargs="*", choices=list(SERVERS), default=list(SERVERS))
+    args = parser.parse_args()
+
+    print(f"{args.requests} /multi requests, {args.concurrency} connections, {args.slow_clients} slow clients")
+    for name in args.servers:
+        argv, env = SERVERS[name]
+        results, elapsed = run_server(argv, env, args.requests, args.concurrency, args.slow_clients, args.timeout)
+        if results is None:
+            print(f"{name:<28} no result within {args.timeout:g} s")
+            continue
+        latencies = sorted(latency for status, latency in results if status == 200)
+        errors = sum(1 for status, _ in results if status != 200)
+        if not latencies:
+            print(f"{name:<28} all {errors} requests failed")
+            continue
+        print(f"{name:<28}{len(latencies) / elapsed:>8.0f} req/s   p50 {percentile(latencies, 0.5) * 1000:>7.1f} ms"
+              f"   p99 {percentile(latencies, 0.99) * 1000:>7.1f} ms   {errors} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from hccinfhir.compiled_tables import build_tables, default_artifact_path
+
+# Import time and resident memory of a fresh process loading the model tables, parsed from the CSVs
+# against memory-mapped from the compiled artifact.
+
+# Runs in the child process: imports the table modules, scores one member so the lookups are exercised,
+# and reports wall time and RSS (read from /proc, Linux only)
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import hccinfhir.model_calculate, hccinfhir.filter
+tables_seconds = time.perf_counter() - start
+hccinfhir.model_calculate.calculate_raf(["E1121", "I5021", "N1831"], "CMS-HCC Model V28", 66, "M", "02", "0", "0", False, False)
+rss_kb = next(int(line.split()[1]) for line in open("/proc/self/status") if line.startswith("VmRSS"))
+print(json.dumps({"import_seconds": tables_seconds, "rss_mb": rss_kb / 1024}))
+"""
+
+
+def measure(mode: str, runs: int) -> dict:
+    env = dict(os.environ, HCCINFHIR_TABLES=mode)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", CHILD, bootstrap.vendor_dir],
+                                env=env, check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "import_seconds": statistics.median(s["import_seconds"] for s in samples),
+        "rss_mb": statistics.median(s["rss_mb"] for s in samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and RSS, parsing the CSV tables vs. loading the compiled artifact.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists(default_artifact_path()):
+        build_tables()
+
+    csv = measure("csv", args.runs)
+    compiled = measure(default_artifact_path(), args.runs)
+    print(f"runs:             {args.runs} (medians)")
+    print(f"csv:              {csv['import_seconds'] * 1000:.0f} ms import, {csv['rss_mb']:.1f} MB RSS")
+    print(f"compiled:         {compiled['import_seconds'] * 1000:.0f} ms import, {compiled['rss_mb']:.1f} MB RSS")
+    print(f"import speedup:   {csv['import_seconds'] / compiled['import_seconds']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Throughput and peak memory of the bulk NDJSON scorer (python -m app.bulk) on synthetic EOB exports
+# built by replaying the bundled sample EOBs under new patient references. Two file sizes are scored
+# in fresh processes: with streaming, peak RSS should stay flat as the file grows. Sample EOBs are
+# about 10 KB each, so a million EOBs is roughly a 10 GB file.
+
+SAMPLE = os.path.join(bootstrap.vendor_dir, "hccinfhir", "samples", "sample_eob_200.ndjson")
+
+
+def write_synthetic_file(path: str, eobs: int, eobs_per_patient: int) -> None:
+    with open(SAMPLE) as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    with open(path, "w") as out:
+        for i in range(eobs):
+            eob = samples[i % len(samples)]
+            eob["patient"] = {"reference": f"Patient/synthetic-{i // eobs_per_patient}"}
+            out.write(json.dumps(eob) + "\n")
+
+
+def score(path: str) -> dict:
+    """Run the CLI in a child process, returning wall time and the child's peak RSS"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "app.bulk", path, "-o", os.devnull,
+                                "--default-age", "70", "--default-sex", "F"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    if status != 0:
+        raise RuntimeError(f"app.bulk exited with status {status}")
+    return {"seconds": time.perf_counter() - start, "peak_rss_mb": usage.ru_maxrss / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bulk NDJSON scoring throughput and peak RSS.")
+    parser.add_argument("--eobs", type=int, default=100000, help="EOBs in the large file")
+    parser.add_argument("--eobs-per-patient", type=int, default=50)
+    args = parser.parse_args()
+
+    sizes = [max(args.eobs // 10, args.eobs_per_patient), args.eobs]
+    with tempfile.TemporaryDirectory() as tmp:
+        for eobs in sizes:
+            path = os.path.join(tmp, f"eobs_{eobs}.ndjson")
+            write_synthetic_file(path, eobs, args.eobs_per_patient)
+            size_mb = os.path.getsize(path) / 1024 ** 2
+            result = score(path)
+            os.remove(path)
+            print(f"{eobs:>10} EOBs ({size_mb:>8.0f} MB): {result['seconds']:>7.1f} s, "
+                  f"{eobs / result['seconds']:>6.0f} EOBs/s, {result['peak_rss_mb']:>6.1f} MB peak RSS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Resident memory and lookup latency of the model tables when only the scored model is loaded, against
+# every model loaded (what the flat (code, model_name) dicts always held), for both the CSV and the
+# compiled table sources. Each configuration runs in a fresh process; "grown MB" is RSS added by
+# importing the scoring modules and loading the tables.
+
+# Runs in the child process. argv: vendor dir, model name, "lazy" or "all", members to score
+CHILD = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+model_name, load, n_members = sys.argv[2], sys.argv[3], int(sys.argv[4])
+
+def rss_mb():
+    return next(int(line.split()[1]) for line in open("/proc/self/status") if line.startswith("VmRSS")) / 1024
+
+start_rss = rss_mb()
+from hccinfhir.model_calculate import calculate_raf, dx_to_cc_default, is_chronic_default
+from hccinfhir.model_coefficients import coefficients_default
+from hccinfhir.model_hierarchies import hierarchies_default
+from hccinfhir.model_dx_to_cc import get_cc
+from hccinfhir.utils import model_partition
+tables = [dx_to_cc_default, is_chronic_default, coefficients_default, hierarchies_default]
+
+start = time.perf_counter()
+if load == "all":
+    for table in tables:
+        len(table)  # iterating loads every model
+else:
+    for table in tables:
+        model_partition(table, model_name)
+load_seconds = time.perf_counter() - start
+
+codes = sorted(model_partition(dx_to_cc_default, model_name))[::50]
+start = time.perf_counter()
+for _ in range(20):
+    for dx in codes:
+        get_cc(dx, model_name)
+get_cc_us = (time.perf_counter() - start) / (20 * len(codes)) * 1e6
+
+start = time.perf_counter()
+for i in range(n_members):
+    calculate_raf(codes[i % len(codes):i % len(codes) + 6], model_name, 60 + i % 30, "MF"[i % 2])
+member_us = (time.perf_counter() - start) / n_members * 1e6
+
+print(json.dumps({
+    "models_loaded": max(len(table.loaded_models()) for table in tables),
+    "load_ms": load_seconds * 1000,
+    "rss_mb": rss_mb(),
+    "tables_rss_mb": rss_mb() - start_rss,
+    "get_cc_us": get_cc_us,
+    "calculate_raf_us": member_us,
+}))
+"""
+
+
+def measure(source: str, load: str, model_name: str, members: int) -> dict:
+    env = dict(os.environ, HCCINFHIR_TABLES=source)
+    output = subprocess.run([sys.executable, "-c", CHILD, bootstrap.vendor_dir, model_name, load, str(members)],
+                            env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure RSS and lookup latency with one model loaded vs. all models.")
+    parser.add_argument("--model", default="CMS-HCC Model V28")
+    parser.add_argument("--members", type=int, default=5000)
+    args = parser.parse_args()
+
+    from hccinfhir.compiled_tables import build_tables, default_artifact_path
+    if not os.path.exists(default_artifact_path()):
+        build_tables()
+
+    print(f"model: {args.model}")
+    print(f"{'source':<10}{'models':<8}{'load ms':>9}{'RSS MB':>9}{'grown MB':>11}{'get_cc us':>11}{'raf us':>9}")
+    for source_name, source in (("csv", "csv"), ("compiled", default_artifact_path())):
+        for load in ("all", "lazy"):
+            r = measure(source, load, args.model, args.members)
+            print(f"{source_name:<10}{r['models_loaded']:<8}{r['load_ms']:>9.1f}{r['rss_mb']:>9.1f}"
+                  f"{r['tables_rss_mb']:>11.1f}{r['get_cc_us']:>11.2f}{r['calculate_raf_us']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import time
+from hccinfhir.model_calculate import calculate_raf
+from hccinfhir.model_vectorized import calculate_raf_columnar, get_vectorized_model
+from benchmarks.synthetic import synthetic_population
+
+# Members/second of the columnar engine against the per-member calculate_raf loop, plus a check that
+# both produce the same scores.
+
+SCORE_KEYS = ["risk_score", "risk_score_demographics", "risk_score_hcc", "risk_score_chronic_only"]
+
+
+def score_loop(members: list, model_name: str) -> dict:
+    scores = {key: [] for key in SCORE_KEYS}
+    for m in members:
+        result = calculate_raf(m["diagnosis_codes"], model_name, m["age"], m["sex"], m["dual_elgbl_cd"],
+                               m["orec"], m["crec"], m["new_enrollee"], m["snp"])
+        for key in SCORE_KEYS:
+            scores[key].append(result[key])
+    return scores
+
+
+def score_columnar(members: list, model_name: str) -> dict:
+    return calculate_raf_columnar(
+        [m["diagnosis_codes"] for m in members],
+        age=[m["age"] for m in members],
+        sex=[m["sex"] for m in members],
+        dual_elgbl_cd=[m["dual_elgbl_cd"] for m in members],
+        orec=[m["orec"] for m in members],
+        crec=[m["crec"] for m in members],
+        new_enrollee=[m["new_enrollee"] for m in members],
+        snp=[m["snp"] for m in members],
+        model_name=model_name,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the columnar engine with a per-member calculate_raf loop.")
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--model", default="CMS-HCC Model V28")
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    members = synthetic_population(args.members, model_name=args.model)
+    get_vectorized_model(args.model)  # compile outside the timed region, like a long-running job would
+
+    start = time.perf_counter()
+    loop = score_loop(members, args.model)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columnar = score_columnar(members, args.model)
+    columnar_seconds = time.perf_counter() - start
+
+    worst = max(abs(a - b) for key in SCORE_KEYS for a, b in zip(loop[key], columnar[key]))
+    print(f"model:            {args.model}")
+    print(f"members:          {len(members)}")
+    print(f"per-member loop:  {len(members) / loop_seconds:,.0f} members/s ({loop_seconds:.2f}s)")
+    print(f"columnar:         {len(members) / columnar_seconds:,.0f} members/s ({columnar_seconds:.2f}s)")
+    print(f"speedup:          {loop_seconds / columnar_seconds:.1f}x")
+    print(f"max score diff:   {worst:.2e}")
+    if worst > args.tolerance:
+        raise SystemExit(f"Columnar scores differ from calculate_raf by {worst} (> {args.tolerance})")
+
+
+if __name__ == "__main__":
+    main()
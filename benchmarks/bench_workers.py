@@ -0,0 +1,143 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from benchmarks.bench_server import free_port, http_request
+from benchmarks.synthetic import synthetic_population
+
+# Memory and startup of gunicorn.conf.py as the number of workers grows, with the app preloaded in the
+# master (RAF_PRELOAD=true, the default) and imported by each worker after the fork (RAF_PRELOAD=false).
+# Time to ready runs from starting gunicorn until every worker has logged "Worker ready". Then each
+# worker serves /multi for synthetic members, and the memory of every process is read from
+# /proc/<pid>/smaps_rollup: USS, the pages only that process holds (Private_Clean + Private_Dirty),
+# and PSS, its RSS with each shared page divided among the processes sharing it. The sum of the PSS
+# of the master and the workers is what the deployment costs. Linux only.
+#
+# The responses of both deployments must equal each other, and the app must have imported each
+# vendored hccinfhir module once, whichever name it was imported under.
+
+DEMOGRAPHIC_FIELDS = ("age", "sex", "dual_elgbl_cd", "orec", "crec", "new_enrollee", "snp")
+READY = re.compile(rb"Worker ready \(pid: (\d+)\)")
+
+
+def memory_kib(pid: int) -> dict:
+    """Rss, Pss and USS of a process, in KiB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0])
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+async def post_all(port: int, bodies: list, concurrency: int) -> list:
+    """The status and body of each /multi response, in the order of the request bodies"""
+    responses = [None] * len(bodies)
+    pending = iter(range(len(bodies)))
+
+    async def fetch(i: int) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(http_request("/v1/raf-v28/multi", bodies[i]))
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def connection():
+        for i in pending:
+            head, _, body = (await fetch(i)).partition(b"\r\n\r\n")
+            responses[i] = (int(head.split(b" ", 2)[1]), body)
+
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    return responses
+
+
+def canonical(body: bytes) -> dict:
+    """A /multi response with its HCCs and their dx lists sorted, their order follows set iteration"""
+    response = json.loads(body)
+    for hcc in response["hcc"]:
+        hcc["dx"] = sorted(hcc["dx"]) if isinstance(hcc["dx"], list) else hcc["dx"]
+    response["hcc"].sort(key=lambda hcc: hcc["code"])
+    return response
+
+
+def run_server(workers: int, preload: bool, bodies: list, timeout: float = 120) -> dict:
+    port = free_port()
+    env = {**os.environ, "RAF_PRELOAD": "true" if preload else "false", "RAF_RESPONSE_CACHE": "off", "WEB_CONCURRENCY": str(workers)}
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}", "app.main:app"],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    ready = []
+    all_ready = threading.Event()
+
+    def read_log():
+        for line in server.stderr:  # keep reading so the pipe never fills up
+            match = READY.search(line)
+            if match:
+                ready.append(int(match.group(1)))
+                if len(ready) == workers:
+                    all_ready.set()
+
+    threading.Thread(target=read_log, daemon=True).start()
+    try:
+        if not all_ready.wait(timeout):
+            raise RuntimeError(f"{len(ready)} of {workers} workers ready after {timeout} s")
+        time_to_ready = time.perf_counter() - start
+        responses = asyncio.run(post_all(port, bodies, concurrency=workers * 2))
+        assert all(status == 200 for status, _ in responses), [status for status, _ in responses if status != 200][:5]
+        return {
+            "time_to_ready": time_to_ready,
+            "master": memory_kib(server.pid),
+            "workers": [memory_kib(pid) for pid in ready],
+            "responses": [body for _, body in responses],
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-worker USS/PSS and time to ready of gunicorn.conf.py, preloaded or not.")
+    parser.add_argument("--workers", default="1,2,4,8", help="Worker counts, comma separated")
+    parser.add_argument("--members", type=int, default=2000, help="/multi requests sent to each deployment")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    worker_counts = [int(n) for n in args.workers.split(",")]
+
+    import app.main  # noqa: F401, imports every vendored module the app uses
+    for name, module in list(sys.modules.items()):
+        if name.startswith("vendor.hccinfhir"):
+            assert module is sys.modules[name[len("vendor."):]], name
+    print("each vendored hccinfhir module is imported once")
+
+    bodies = [json.dumps({"diagnosis_codes": member["diagnosis_codes"], **{key: member[key] for key in DEMOGRAPHIC_FIELDS}}).encode()
+              for member in synthetic_population(args.members, args.seed)]
+    rows = []
+    expected = None
+    for workers in worker_counts:
+        for preload in (False, True):
+            result = run_server(workers, preload, bodies)
+            responses = [canonical(body) for body in result.pop("responses")]
+            if expected is None:
+                expected = responses
+            assert responses == expected, f"{workers} workers, preload {preload}: responses differ"
+            rows.append((workers, preload, result))
+    print(f"{args.members} /multi responses equal across every deployment\n")
+
+    print(f"{'workers':>7}  {'app import':<13}{'ready s':>8}{'worker USS':>12}{'worker PSS':>12}{'master PSS':>12}{'total PSS':>11}  MiB")
+    for workers, preload, result in rows:
+        uss = sum(worker["uss"] for worker in result["workers"]) / workers / 1024
+        pss = sum(worker["pss"] for worker in result["workers"]) / workers / 1024
+        master = result["master"]["pss"] / 1024
+        print(f"{workers:>7}  {'master' if preload else 'each worker':<13}{result['time_to_ready']:>8.2f}{uss:>12.1f}"
+              f"{pss:>12.1f}{master:>12.1f}{master + pss * workers:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import argparse
+import contextlib
+import datetime
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+os.environ.setdefault("RAF_RESPONSE_CACHE", "off")  # the route stages repeat their requests, which the cache would answer
+from hccinfhir.extractor import extract_sld_list
+from hccinfhir.extractor_837 import extract_sld_837
+from hccinfhir.filter import apply_filter
+from hccinfhir.hccinfhir import HCCInFHIR
+from hccinfhir.model_calculate import calculate_raf
+from hccinfhir.stream import group_by_patient
+from benchmarks.synthetic import synthetic_population
+
+# The benchmark suite of the scoring pipeline, and its regression gate. Each stage runs a fixed,
+# seeded workload, repeated until a run lasts --min-time, then --repeat timed runs of which the
+# fastest counts, per item (member, patient, claim file or request):
+#
+#   calculate_raf V28 / V24   synthetic members (benchmarks/synthetic.py)
+#   HCCInFHIR.run             the patients of samples/sample_eob_200.ndjson, with synthetic demographics
+#   extract_sld_837           each of the samples/sample_837_*.txt files
+#   apply_filter              the service lines of each sample patient, EOB and 837
+#   POST <route>              the routes through the Flask test client, with synthetic members
+#
+# --output writes the results as JSON. --baseline compares them with stored results (by default
+# benchmarks/baseline.json) and exits with status 1 when a stage got slower than the baseline by more
+# than --threshold (0.25 is 25%). Timings only compare on the same host; across hosts, --normalize
+# divides every stage by a pure Python calibration loop timed in the same run, which absorbs most of
+# the difference in CPU speed. --save-baseline writes the results as the new baseline.
+
+SAMPLES = os.path.join(bootstrap.vendor_dir, "hccinfhir", "samples")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SCHEMA_VERSION = 1
+
+
+def quiet():
+    """The extractors print a warning per malformed sample, which would be timed too"""
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+
+def calibration_loop() -> int:
+    total = 0
+    for i in range(200000):
+        total += i % 7
+    return total
+
+
+def sample_eob_patients() -> list:
+    with open(os.path.join(SAMPLES, "sample_eob_200.ndjson")) as f:
+        return [eobs for _, eobs in group_by_patient(json.loads(line) for line in f if line.strip())]
+
+
+def sample_837_documents() -> list:
+    documents = []
+    for path in sorted(glob.glob(os.path.join(SAMPLES, "sample_837_*.txt"))):
+        with open(path) as f:
+            documents.append(f.read())
+    return documents
+
+
+def demographics(member: dict) -> dict:
+    return {key: member[key] for key in ("age", "sex", "dual_elgbl_cd", "orec", "crec", "new_enrollee", "snp")}
+
+
+def build_stages(members: int, seed: int) -> list:
+    """(name, unit, items, fn) for each stage, fn running the whole workload once"""
+    population = [{key: value for key, value in member.items() if key != "member_id"}
+                  for member in synthetic_population(members, seed)]
+    eob_patients = sample_eob_patients()
+    documents = sample_837_documents()
+    with quiet():
+        sld_patients = [extract_sld_list(eobs) for eobs in eob_patients] + [extract_sld_list([d], "837") for d in documents]
+    processor = HCCInFHIR()
+    patient_demographics = [demographics(population[i % len(population)]) for i in range(len(eob_patients))]
+
+    from app.main import app
+    client = app.test_client()
+    requests = population[:min(len(population), 2000)]
+    batches = [{"members": [{"member_id": f"member-{i + j}", **member} for j, member in enumerate(requests[i:i + 100])]}
+               for i in range(0, len(requests), 100)]
+    eob_requests = [{"eobs": eobs, **d} for eobs, d in zip(eob_patients, patient_demographics)]
+    # The route scores one patient, some sample files hold several
+    single_patient = [document for document, slds in zip(documents, sld_patients[len(eob_patients):])
+                      if len({sld.patient_id for sld in slds if sld.patient_id}) <= 1]
+    x12_requests = [{"x12": document, **demographics(population[i % len(population)])} for i, document in enumerate(single_patient)]
+
+    def post_each(route: str, payloads: list):
+        def run():
+            for payload in payloads:
+                response = client.post(route, json=payload)
+                assert response.status_code == 200, (route, response.status_code, response.get_data(as_text=True)[:200])
+        return run
+
+    def score_each(model_name: str):
+        def run():
+            for member in population:
+                calculate_raf(model_name=model_name, **member)
+        return run
+
+    def run_each_patient():
+        for eobs, d in zip(eob_patients, patient_demographics):
+            processor.run(eobs, d)
+
+    def extract_each_document():
+        for document in documents:
+            extract_sld_837(document)
+
+    def filter_each_patient():
+        for slds in sld_patients:
+            apply_filter(slds)
+
+    return [
+        ("calibration", "loop", 1, calibration_loop),
+        ("calculate_raf V28", "member", len(population), score_each("CMS-HCC Model V28")),
+        ("calculate_raf V24", "member", len(population), score_each("CMS-HCC Model V24")),
+        ("HCCInFHIR.run", "patient", len(eob_patients), run_each_patient),
+        ("extract_sld_837", "file", len(documents), extract_each_document),
+        ("apply_filter", "patient", len(sld_patients), filter_each_patient),
+        ("POST /v1/raf-v28/multi", "request", len(requests), post_each("/v1/raf-v28/multi", requests)),
+        ("POST /v1/raf-v28/single", "request", len(requests),
+         post_each("/v1/raf-v28/single", [{**demographics(r), "diagnosis_code": (r["diagnosis_codes"] or ["E119"])[0]} for r in requests])),
+        ("POST /v1/raf-v28/batch", "request", len(batches), post_each("/v1/raf-v28/batch", batches)),
+        ("POST /v1/raf-v28/eob", "request", len(eob_requests), post_each("/v1/raf-v28/eob", eob_requests)),
+        ("POST /v1/raf-v28/837", "request", len(x12_requests), post_each("/v1/raf-v28/837", x12_requests)),
+    ]
+
+
+def time_stage(fn, repeat: int, min_time: float) -> tuple:
+    """
+    (loops, seconds of each run), a run calling fn loops times so that it lasts at least min_time, as
+    timeit does. The first call, which loads the model tables and fills the caches, isn't timed.
+    """
+    with quiet():
+        fn()
+        loops = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            if time.perf_counter() - start >= min_time:
+                break
+            loops *= 2
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            runs.append(time.perf_counter() - start)
+    return loops, runs
+
+
+def git_commit() -> str|None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(members: int, seed: int, repeat: int, min_time: float, only: list|None = None) -> dict:
+    stages = {}
+    for name, unit, items, fn in build_stages(members, seed):
+        if only and name != "calibration" and not any(pattern in name for pattern in only):
+            continue
+        loops, runs = time_stage(fn, repeat, min_time)
+        stages[name] = {
+            "unit": unit,
+            "items": items,
+            "loops": loops,
+            "us_per_item": min(runs) / (items * loops) * 1e6,
+            "runs_s": [round(run, 6) for run in runs],
+        }
+    return {
+        "schema": SCHEMA_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {"members": members, "seed": seed, "repeat": repeat, "min_time": min_time},
+        "stages": stages,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float, normalize: bool) -> list:
+    """(stage, baseline us, current us, ratio, regressed) for the stages in both, ratio > 1 being slower"""
+    workload = {key: results["config"][key] for key in ("members", "seed")}
+    if workload != {key: baseline["config"].get(key) for key in workload}:
+        print(f"Warning: the baseline scored a different population, {baseline['config']}", file=sys.stderr)
+    scale = 1.0
+    if normalize:
+        scale = baseline["stages"]["calibration"]["us_per_item"] / results["stages"]["calibration"]["us_per_item"]
+    rows = []
+    for name, stage in results["stages"].items():
+        if name == "calibration" or name not in baseline["stages"]:
+            continue
+        before, now = baseline["stages"][name]["us_per_item"], stage["us_per_item"]
+        ratio = now * scale / before
+        rows.append((name, before, now, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite of the whole pipeline, optionally against a baseline.")
+    parser.add_argument("--members", type=int, default=5000, help="Synthetic members, for calculate_raf and the routes (at most 2000 requests)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage, the fastest counts")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds a timed run lasts at least, repeating the workload")
+    parser.add_argument("--stage", action="append", dest="only", help="Only run the stages whose name contains this (repeatable)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE, help=f"Compare with stored results (default {os.path.relpath(BASELINE)})")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Slowdown of a stage that fails the comparison, 0.25 is 25%%")
+    parser.add_argument("--normalize", action="store_true", help="Scale by the calibration loop, to compare with a baseline from another host")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write the results to {os.path.relpath(BASELINE)}")
+    args = parser.parse_args()
+
+    results = run_suite(args.members, args.seed, args.repeat, args.min_time, args.only)
+    for name, stage in results["stages"].items():
+        print(f"{name:<28}{stage['us_per_item']:>10.1f} us/{stage['unit']:<8}{stage['items']:>7} items")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold, args.normalize)
+        print(f"\nAgainst {args.baseline} (commit {baseline.get('commit')}), threshold +{args.threshold:.0%}"
+              + (", normalized" if args.normalize else ""))
+        for name, before, now, ratio, regressed in rows:
+            print(f"{name:<28}{before:>10.1f}{now:>10.1f} us {ratio - 1:>+8.1%}{'  REGRESSION' if regressed else ''}")
+        if any(regressed for *_, regressed in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
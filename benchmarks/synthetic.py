@@ -0,0 +1,52 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import random
+from hccinfhir.model_dx_to_cc import dx_to_cc_default
+from hccinfhir.utils import model_partition
+
+# Synthetic member populations built from the bundled tables, shared by the benchmark scripts.
+
+# Common codes that don't map to any V28 HCC (hypertension, hyperlipidemia, screening, etc.)
+NON_PAYABLE_DX = ["I10", "E785", "Z0000", "Z23", "M545", "R079", "J069", "K219", "E039", "Z1231"]
+
+# Number of diagnosis codes per member, weighted so most members have a handful and a long tail has many
+DX_COUNT_WEIGHTS = [(0, 8), (1, 10), (2, 12), (3, 12), (5, 18), (8, 16), (12, 12), (20, 8), (40, 4)]
+
+
+def payable_codes(model_name: str = "CMS-HCC Model V28") -> list:
+    """Sorted diagnosis codes that map to at least one CC in the model"""
+    return sorted(model_partition(dx_to_cc_default, model_name))
+
+
+def synthetic_member(rng: random.Random, member_id: str, payable: list) -> dict:
+    """One member payload in the /multi request shape, plus member_id"""
+    counts, weights = zip(*DX_COUNT_WEIGHTS)
+    n_dx = rng.choices(counts, weights)[0]
+    codes = [
+        rng.choice(payable) if rng.random() < 0.6 else rng.choice(NON_PAYABLE_DX)
+        for _ in range(n_dx)
+    ]
+    # Real feeds mix dotted and undotted codes
+    codes = [f"{dx[:3]}.{dx[3:]}" if len(dx) > 3 and rng.random() < 0.2 else dx for dx in codes]
+
+    disabled = rng.random() < 0.12
+    age = rng.randint(25, 64) if disabled else min(int(rng.expovariate(1 / 9)) + 65, 104)
+    orec = "1" if disabled or rng.random() < 0.08 else "0"
+    dual = rng.choices(["NA", "02", "04", "08", "01", "03", "05", "06"], [70, 12, 4, 2, 5, 3, 2, 2])[0]
+    return {
+        "member_id": member_id,
+        "diagnosis_codes": codes,
+        "age": age,
+        "sex": rng.choice(["M", "F"]),
+        "dual_elgbl_cd": dual,
+        "orec": orec,
+        "crec": orec,
+        "new_enrollee": rng.random() < 0.06,
+        "snp": rng.random() < 0.03,
+    }
+
+
+def synthetic_population(n: int, seed: int = 0, model_name: str = "CMS-HCC Model V28") -> list:
+    """Reproducible list of n synthetic member payloads"""
+    rng = random.Random(seed)
+    payable = payable_codes(model_name)
+    return [synthetic_member(rng, f"member-{i:07d}", payable) for i in range(n)]
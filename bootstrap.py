@@ -1,3 +1,6 @@
+import importlib
+import importlib.abc
+import importlib.util
 import os, sys
 
 # Add /vendor to sys.path
@@ -5,3 +8,30 @@ import os, sys
 current_dir = os.path.dirname(os.path.abspath(__file__))
 vendor_dir = os.path.join(current_dir, "vendor")
 sys.path.insert(0, vendor_dir)
+
+
+class VendorAlias(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """
+    Resolves vendor.hccinfhir.* to the hccinfhir.* modules. The vendored modules import each other as
+    hccinfhir.*, so importing them as vendor.hccinfhir.* would load the package a second time, with its
+    own copy of every model table and cache.
+    """
+
+    prefix = "vendor.hccinfhir"
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname == self.prefix or fullname.startswith(self.prefix + "."):
+            return importlib.util.spec_from_loader(fullname, self)
+        return None
+
+    def create_module(self, spec):
+        module = importlib.import_module(spec.name[len("vendor."):])
+        spec.loader_state = module.__spec__
+        return module
+
+    def exec_module(self, module):
+        module.__spec__ = module.__spec__.loader_state  # the import system set it to the alias spec
+
+
+if not any(isinstance(finder, VendorAlias) for finder in sys.meta_path):
+    sys.meta_path.insert(0, VendorAlias())
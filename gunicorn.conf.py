@@ -0,0 +1,42 @@
+import gc
+import os
+
+# Production gunicorn configuration (gunicorn loads ./gunicorn.conf.py by default):
+#
+#   gunicorn -c gunicorn.conf.py app.main:app
+#
+# The master imports the app and loads the model tables of every scored model once (preload_models
+# in app/utils.py), then forks the workers, which share those pages copy-on-write instead of each
+# importing its own copy. Two things would still make a worker copy the shared pages: the cyclic
+# garbage collector writes to the header of every object it examines, and freed objects leave holes
+# in the parent's pages that the workers fill. So the collector is off while the master imports the
+# app, and everything allocated by then is moved to the permanent generation with gc.freeze() before
+# the first fork, where the workers' collections never examine it. Reference counts are still
+# written when an object is used, so the pages of the objects a request touches are copied anyway;
+# the model tables themselves are memory-mapped from data/model_tables.bin and never copied.
+#
+# RAF_PRELOAD=false imports the app in each worker after the fork instead, as before.
+# python -m benchmarks.bench_workers measures both.
+
+bind = os.getenv("RAF_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+preload_app = os.getenv("RAF_PRELOAD", "true").lower() == "true"
+
+if preload_app:
+    gc.disable()
+
+
+def when_ready(server):
+    """In the master, after the app is imported and before the workers are forked"""
+    if preload_app:
+        from app.utils import preload_models
+        server.log.info("Preloaded %s", ", ".join(preload_models()))
+        gc.freeze()
+        gc.enable()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from app.utils import preload_models
+        preload_models()
+    worker.log.info("Worker ready (pid: %s)", worker.pid)
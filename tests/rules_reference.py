@@ -0,0 +1,326 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import random
+from typing import Optional
+from hccinfhir.datamodels import DemographicsLike, ModelName
+from hccinfhir.model_calculate import get_model_version
+from hccinfhir.model_demographics import categorize_demographics_record
+from hccinfhir.model_dx_to_cc import dx_to_cc_default
+from hccinfhir.model_hierarchies import HIERARCHY_EXCLUSIONS, hierarchies_default
+from hccinfhir.model_interactions import DIAGNOSTIC_CATEGORIES, DISEASE_INTERACTIONS, create_demographic_only_interactions
+from hccinfhir.utils import model_partition
+
+# The hierarchy and interaction rules as they were written before they were compiled into bit masks,
+# kept only as the reference tests/test_rules.py and benchmarks/bench_rules.py compare against.
+# Scoring uses HIERARCHY_EXCLUSIONS in model_hierarchies.py and DIAGNOSTIC_CATEGORIES and
+# DISEASE_INTERACTIONS in model_interactions.py; a rule changed there must be changed here too.
+
+def has_any_hcc(hcc_list: list[str], hcc_set: set[str]) -> int:
+    """Returns 1 if any HCC in the list is present, 0 otherwise"""
+    return int(bool(set(hcc_list) & hcc_set))
+
+def get_diagnostic_categories(model_name: ModelName, hcc_set: set[str]) -> dict:
+    """Creates disease categories based on model version"""
+    if model_name == "CMS-HCC Model V28":
+        return {
+            'CANCER_V28': has_any_hcc(['17', '18', '19', '20', '21', '22', '23'], hcc_set),
+            'DIABETES_V28': has_any_hcc(['35', '36', '37', '38'], hcc_set),
+            'CARD_RESP_FAIL_V28': has_any_hcc(['211', '212', '213'], hcc_set),
+            'HF_V28': has_any_hcc(['221', '222', '223', '224', '225', '226'], hcc_set),
+            'CHR_LUNG_V28': has_any_hcc(['276', '277', '278', '279', '280'], hcc_set),
+            'KIDNEY_V28': has_any_hcc(['326', '327', '328', '329'], hcc_set),
+            'SEPSIS_V28': int('2' in hcc_set),
+            'gSubUseDisorder_V28': has_any_hcc(['135', '136', '137', '138', '139'], hcc_set),
+            'gPsychiatric_V28': has_any_hcc(['151', '152', '153', '154', '155'], hcc_set),
+            'NEURO_V28': has_any_hcc(['180', '181', '182', '190', '191', '192', '195', '196', '198', '199'], hcc_set),
+            'ULCER_V28': has_any_hcc(['379', '380', '381', '382'], hcc_set)
+        }
+    elif model_name == "CMS-HCC Model V24":
+        return {
+            'CANCER': has_any_hcc(['8', '9', '10', '11', '12'], hcc_set),
+            'DIABETES': has_any_hcc(['17', '18', '19'], hcc_set),
+            'CARD_RESP_FAIL': has_any_hcc(['82', '83', '84'], hcc_set),
+            'CHF': int('85' in hcc_set),
+            'gCopdCF': has_any_hcc(['110', '111', '112'], hcc_set),
+            'RENAL_V24': has_any_hcc(['134', '135', '136', '137', '138'], hcc_set), 
+            'SEPSIS': int('2' in hcc_set),
+            'gSubstanceUseDisorder_V24': has_any_hcc(['54', '55', '56'], hcc_set),
+            'gPsychiatric_V24': has_any_hcc(['57', '58', '59', '60'], hcc_set),
+            'PRESSURE_ULCER': has_any_hcc(['157', '158', '159'],  hcc_set) # added in 2018-11-20
+        }
+    elif model_name == "CMS-HCC Model V22":
+        return {
+            'CANCER': has_any_hcc(['8', '9', '10', '11', '12'], hcc_set),
+            'DIABETES': has_any_hcc(['17', '18', '19'], hcc_set),
+            'CARD_RESP_FAIL': has_any_hcc(['82', '83', '84'], hcc_set),
+            'CHF': int('85' in hcc_set),
+            'gCopdCF': has_any_hcc(['110', '111', '112'], hcc_set),
+            'RENAL': has_any_hcc(['134', '135', '136', '137'], hcc_set), 
+            'SEPSIS': int('2' in hcc_set),
+            'gSubstanceUseDisorder': has_any_hcc(['54', '55'], hcc_set),
+            'gPsychiatric': has_any_hcc(['57', '58'], hcc_set),
+            'PRESSURE_ULCER': has_any_hcc(['157', '158'],  hcc_set) # added in 2012-10-19
+        }
+    elif model_name == "CMS-HCC ESRD Model V24":
+        return {
+            'CANCER': has_any_hcc(['8', '9', '10', '11', '12'], hcc_set),
+            'DIABETES': has_any_hcc(['17', '18', '19'], hcc_set),
+            'CARD_RESP_FAIL': has_any_hcc(['82', '83', '84'], hcc_set),
+            'CHF': int('85' in hcc_set),            
+            'gCopdCF': has_any_hcc(['110', '111', '112'], hcc_set),
+            'RENAL_V24': has_any_hcc(['134', '135', '136', '137', '138'], hcc_set),
+            'SEPSIS': int('2' in hcc_set),
+            'PRESSURE_ULCER': has_any_hcc(['157', '158', '159', '160'], hcc_set), # added in 2018-11-20
+            'gSubstanceUseDisorder_V24': has_any_hcc(['54', '55', '56'], hcc_set),
+            'gPsychiatric_V24': has_any_hcc(['57', '58', '59', '60'], hcc_set)
+        }
+    elif model_name == "CMS-HCC ESRD Model V21":
+        return {
+            'CANCER': has_any_hcc(['8', '9', '10', '11', '12'], hcc_set),
+            'DIABETES': has_any_hcc(['17', '18', '19'], hcc_set),
+            'IMMUNE': int('47' in hcc_set),
+            'CARD_RESP_FAIL': has_any_hcc(['82', '83', '84'], hcc_set),
+            'CHF': int('85' in hcc_set),
+            'COPD': has_any_hcc(['110', '111'], hcc_set),
+            'RENAL': has_any_hcc(['134', '135', '136', '137', '138', '139', '140', '141'], hcc_set),
+            'COMPL': int('176' in hcc_set),
+            'SEPSIS': int('2' in hcc_set), 
+            'PRESSURE_ULCER': has_any_hcc(['157', '158', '159', '160'], hcc_set)
+        }
+    elif model_name == "RxHCC Model V08":
+        # RxModel doesn't seem to have any diagnostic category interactions
+        return {}
+    return {}
+
+def create_disease_interactions(model_name: ModelName, 
+                              diagnostic_cats: dict, 
+                              demographics: Optional[DemographicsLike],
+                              hcc_set: Optional[set[str]]) -> dict:
+    """Creates disease interaction variables based on model version.
+    
+    Args:
+        model_name: The HCC model version being used
+        diagnostic_cats: Dictionary of diagnostic categories
+        demographics: Optional demographic information for age/sex/disability interactions
+        hcc_set: Optional set of HCCs for direct HCC checks
+        
+    Returns:
+        Dictionary containing all disease interaction variables
+    """
+    interactions = {}
+    
+    if model_name == "CMS-HCC Model V28":
+        # Base V28 disease interactions
+        interactions.update({
+            'DIABETES_HF_V28': diagnostic_cats['DIABETES_V28'] * diagnostic_cats['HF_V28'],
+            'HF_CHR_LUNG_V28': diagnostic_cats['HF_V28'] * diagnostic_cats['CHR_LUNG_V28'],
+            'HF_KIDNEY_V28': diagnostic_cats['HF_V28'] * diagnostic_cats['KIDNEY_V28'],
+            'CHR_LUNG_CARD_RESP_FAIL_V28': diagnostic_cats['CHR_LUNG_V28'] * diagnostic_cats['CARD_RESP_FAIL_V28'],
+            'HF_HCC238_V28': diagnostic_cats['HF_V28'] * int('238' in hcc_set),
+            'gSubUseDisorder_gPsych_V28': diagnostic_cats['gSubUseDisorder_V28'] * diagnostic_cats['gPsychiatric_V28'],
+            'DISABLED_CANCER_V28': demographics.disabled * diagnostic_cats['CANCER_V28'],
+            'DISABLED_NEURO_V28': demographics.disabled * diagnostic_cats['NEURO_V28'],
+            'DISABLED_HF_V28': demographics.disabled * diagnostic_cats['HF_V28'],
+            'DISABLED_CHR_LUNG_V28': demographics.disabled * diagnostic_cats['CHR_LUNG_V28'],
+            'DISABLED_ULCER_V28': demographics.disabled * diagnostic_cats['ULCER_V28']
+        })
+            
+    elif model_name == "CMS-HCC Model V24":
+        # Base V24/V22 disease interactions
+        interactions.update({
+            'HCC47_gCancer': int('47' in hcc_set) * diagnostic_cats['CANCER'],
+            'DIABETES_CHF': diagnostic_cats['DIABETES'] * diagnostic_cats['CHF'],
+            'CHF_gCopdCF': diagnostic_cats['CHF'] * diagnostic_cats['gCopdCF'],
+            'HCC85_gRenal_V24': diagnostic_cats['CHF'] * diagnostic_cats['RENAL_V24'],
+            'gCopdCF_CARD_RESP_FAIL': diagnostic_cats['gCopdCF'] * diagnostic_cats['CARD_RESP_FAIL'],
+            'HCC85_HCC96': int('85' in hcc_set) * int('96' in hcc_set),
+            'gSubstanceAbuse_gPsych': diagnostic_cats['gSubstanceUseDisorder_V24'] * diagnostic_cats['gPsychiatric_V24'],
+            'SEPSIS_PRESSURE_ULCER': diagnostic_cats['SEPSIS'] * diagnostic_cats['PRESSURE_ULCER'],
+            'SEPSIS_ARTIF_OPENINGS': diagnostic_cats['SEPSIS'] * int('188' in hcc_set),
+            'ART_OPENINGS_PRESS_ULCER': int('188' in hcc_set) * diagnostic_cats['PRESSURE_ULCER'],
+            'gCopdCF_ASP_SPEC_B_PNEUM': diagnostic_cats['gCopdCF'] * int('114' in hcc_set),
+            'ASP_SPEC_B_PNEUM_PRES_ULC': int('114' in hcc_set) * diagnostic_cats['PRESSURE_ULCER'],
+            'SEPSIS_ASP_SPEC_BACT_PNEUM': diagnostic_cats['SEPSIS'] * int('114' in hcc_set),
+            'SCHIZOPHRENIA_gCopdCF': int('57' in hcc_set) * diagnostic_cats['gCopdCF'],
+            'SCHIZOPHRENIA_CHF': int('57' in hcc_set) * diagnostic_cats['CHF'],
+            'SCHIZOPHRENIA_SEIZURES': int('57' in hcc_set) * int('79' in hcc_set),
+            'DISABLED_HCC85': demographics.disabled * int('85' in hcc_set),
+            'DISABLED_PRESSURE_ULCER': demographics.disabled * diagnostic_cats['PRESSURE_ULCER'],
+            'DISABLED_HCC161': demographics.disabled * int('161' in hcc_set),
+            'DISABLED_HCC39': demographics.disabled * int('39' in hcc_set),
+            'DISABLED_HCC77': demographics.disabled * int('77' in hcc_set),
+            'DISABLED_HCC6': demographics.disabled * int('6' in hcc_set)
+        })
+    elif model_name == "CMS-HCC Model V22":
+        # Base V24/V22 disease interactions
+        interactions.update({
+            'HCC47_gCancer': int('47' in hcc_set) * diagnostic_cats['CANCER'],
+            'HCC85_gDiabetesMellitus': int('85' in hcc_set) * diagnostic_cats['DIABETES'],
+            'HCC85_gCopdCF': int('85' in hcc_set) * diagnostic_cats['gCopdCF'],
+            'HCC85_gRenal': int('85' in hcc_set) * diagnostic_cats['RENAL'],
+            'gRespDepandArre_gCopdCF': diagnostic_cats['CARD_RESP_FAIL'] * diagnostic_cats['gCopdCF'],
+            'HCC85_HCC96': int('85' in hcc_set) * int('96' in hcc_set),
+            'gSubstanceAbuse_gPsychiatric': diagnostic_cats['gSubstanceUseDisorder'] * diagnostic_cats['gPsychiatric'],
+            'DIABETES_CHF': diagnostic_cats['DIABETES'] * diagnostic_cats['CHF'],
+            'CHF_gCopdCF': diagnostic_cats['CHF'] * diagnostic_cats['gCopdCF'],
+            'gCopdCF_CARD_RESP_FAIL': diagnostic_cats['gCopdCF'] * diagnostic_cats['CARD_RESP_FAIL'],
+            'SEPSIS_PRESSURE_ULCER': diagnostic_cats['SEPSIS'] * diagnostic_cats['PRESSURE_ULCER'],
+            'SEPSIS_ARTIF_OPENINGS': diagnostic_cats['SEPSIS'] * int('188' in hcc_set),
+            'ART_OPENINGS_PRESSURE_ULCER': int('188' in hcc_set) * diagnostic_cats['PRESSURE_ULCER'],
+            'DIABETES_CHF': diagnostic_cats['DIABETES'] * diagnostic_cats['CHF'],
+            'gCopdCF_ASP_SPEC_BACT_PNEUM': diagnostic_cats['gCopdCF'] * int('114' in hcc_set),
+            'ASP_SPEC_BACT_PNEUM_PRES_ULC': int('114' in hcc_set) * diagnostic_cats['PRESSURE_ULCER'],
+            'SEPSIS_ASP_SPEC_BACT_PNEUM': diagnostic_cats['SEPSIS'] * int('114' in hcc_set),
+            'SCHIZOPHRENIA_gCopdCF': int('57' in hcc_set) * diagnostic_cats['gCopdCF'],
+            'SCHIZOPHRENIA_CHF': int('57' in hcc_set) * diagnostic_cats['CHF'],
+            'SCHIZOPHRENIA_SEIZURES': int('57' in hcc_set) * int('79' in hcc_set),
+            'DISABLED_HCC85': demographics.disabled * int('85' in hcc_set),
+            'DISABLED_PRESSURE_ULCER': demographics.disabled * diagnostic_cats['PRESSURE_ULCER'],
+            'DISABLED_HCC161': demographics.disabled * int('161' in hcc_set),
+            'DISABLED_HCC39': demographics.disabled * int('39' in hcc_set),
+            'DISABLED_HCC77': demographics.disabled * int('77' in hcc_set),
+            'DISABLED_HCC6': demographics.disabled * int('6' in hcc_set)
+        })
+    elif model_name == "CMS-HCC ESRD Model V24":
+        # Base ESRD V24 disease interactions
+        interactions.update({
+            'HCC47_gCancer': int('47' in hcc_set) * diagnostic_cats['CANCER'],
+            'DIABETES_CHF': diagnostic_cats['DIABETES'] * diagnostic_cats['CHF'],
+            'CHF_gCopdCF': diagnostic_cats['CHF'] * diagnostic_cats['gCopdCF'],
+            'HCC85_gRenal_V24': int('85' in hcc_set) * diagnostic_cats['RENAL_V24'],
+            'gCopdCF_CARD_RESP_FAIL': diagnostic_cats['gCopdCF'] * diagnostic_cats['CARD_RESP_FAIL'],
+            'HCC85_HCC96': int('85' in hcc_set) * int('96' in hcc_set),
+            'gSubUseDs_gPsych_V24': diagnostic_cats['gSubstanceUseDisorder_V24'] * diagnostic_cats['gPsychiatric_V24'],
+            'NONAGED_gSubUseDs_gPsych': demographics.non_aged * (diagnostic_cats['gSubstanceUseDisorder_V24'] * diagnostic_cats['gPsychiatric_V24']),
+            'NONAGED_HCC6': demographics.non_aged * int('6' in hcc_set),
+            'NONAGED_HCC34': demographics.non_aged * int('34' in hcc_set),
+            'NONAGED_HCC46': demographics.non_aged * int('46' in hcc_set),
+            'NONAGED_HCC110': demographics.non_aged * int('110' in hcc_set),
+            'NONAGED_HCC176': demographics.non_aged * int('176' in hcc_set),
+            'SEPSIS_PRESSURE_ULCER_V24': diagnostic_cats['SEPSIS'] * diagnostic_cats['PRESSURE_ULCER'],
+            'SEPSIS_ARTIF_OPENINGS': diagnostic_cats['SEPSIS'] * int('188' in hcc_set),
+            'ART_OPENINGS_PRESS_ULCER_V24': int('188' in hcc_set) * diagnostic_cats['PRESSURE_ULCER'],
+            'gCopdCF_ASP_SPEC_B_PNEUM': diagnostic_cats['gCopdCF'] * int('114' in hcc_set),
+            'ASP_SPEC_B_PNEUM_PRES_ULC_V24': int('114' in hcc_set) * diagnostic_cats['PRESSURE_ULCER'],
+            'SEPSIS_ASP_SPEC_BACT_PNEUM': diagnostic_cats['SEPSIS'] * int('114' in hcc_set),
+            'SCHIZOPHRENIA_gCopdCF': int('57' in hcc_set) * diagnostic_cats['gCopdCF'],
+            'SCHIZOPHRENIA_CHF': int('57' in hcc_set) * diagnostic_cats['CHF'],
+            'SCHIZOPHRENIA_SEIZURES': int('57' in hcc_set) * int('79' in hcc_set),
+            'NONAGED_HCC85': demographics.non_aged * int('85' in hcc_set),
+            'NONAGED_PRESSURE_ULCER_V24': demographics.non_aged * diagnostic_cats['PRESSURE_ULCER'],
+            'NONAGED_HCC161': demographics.non_aged * int('161' in hcc_set),
+            'NONAGED_HCC39': demographics.non_aged * int('39' in hcc_set),
+            'NONAGED_HCC77': demographics.non_aged * int('77' in hcc_set)
+        })
+    
+    elif model_name == 'CMS-HCC ESRD Model V21':
+        # ESRD Community model interactions
+        interactions.update({
+            'SEPSIS_CARD_RESP_FAIL': diagnostic_cats['SEPSIS'] * diagnostic_cats['CARD_RESP_FAIL'],
+            'CANCER_IMMUNE': diagnostic_cats['CANCER'] * diagnostic_cats['IMMUNE'],
+            'DIABETES_CHF': diagnostic_cats['DIABETES'] * diagnostic_cats['CHF'],
+            'CHF_COPD': diagnostic_cats['CHF'] * diagnostic_cats['COPD'],
+            'CHF_RENAL': diagnostic_cats['CHF'] * diagnostic_cats['RENAL'],
+            'COPD_CARD_RESP_FAIL': diagnostic_cats['COPD'] * diagnostic_cats['CARD_RESP_FAIL'],
+            'NONAGED_HCC6': demographics.non_aged * int('6' in hcc_set),
+            'NONAGED_HCC34': demographics.non_aged * int('34' in hcc_set),
+            'NONAGED_HCC46': demographics.non_aged * int('46' in hcc_set),
+            'NONAGED_HCC54': demographics.non_aged * int('54' in hcc_set),
+            'NONAGED_HCC55': demographics.non_aged * int('55' in hcc_set),
+            'NONAGED_HCC110': demographics.non_aged * int('110' in hcc_set),
+            'NONAGED_HCC176': demographics.non_aged * int('176' in hcc_set),
+            'SEPSIS_PRESSURE_ULCER': diagnostic_cats['SEPSIS'] * diagnostic_cats['PRESSURE_ULCER'],
+            'SEPSIS_ARTIF_OPENINGS': diagnostic_cats['SEPSIS'] * int('188' in hcc_set),
+            'ART_OPENINGS_PRESSURE_ULCER': int('188' in hcc_set) * diagnostic_cats['PRESSURE_ULCER'],
+            'DIABETES_CHF': diagnostic_cats['DIABETES'] * diagnostic_cats['CHF'],
+            'COPD_ASP_SPEC_BACT_PNEUM': diagnostic_cats['COPD'] * int('114' in hcc_set),
+            'ASP_SPEC_BACT_PNEUM_PRES_ULC': int('114' in hcc_set) * diagnostic_cats['PRESSURE_ULCER'],
+            'SEPSIS_ASP_SPEC_BACT_PNEUM': diagnostic_cats['SEPSIS'] * int('114' in hcc_set),
+            'SCHIZOPHRENIA_COPD': int('57' in hcc_set) * diagnostic_cats['COPD'],
+            'SCHIZOPHRENIA_CHF': int('57' in hcc_set) * diagnostic_cats['CHF'],
+            'SCHIZOPHRENIA_SEIZURES': int('57' in hcc_set) * int('79' in hcc_set),
+            'NONAGED_HCC85': demographics.non_aged * int('85' in hcc_set),
+            'NONAGED_PRESSURE_ULCER': demographics.non_aged * diagnostic_cats['PRESSURE_ULCER'],
+            'NONAGED_HCC161': demographics.non_aged * int('161' in hcc_set),
+            'NONAGED_HCC39': demographics.non_aged * int('39' in hcc_set),
+            'NONAGED_HCC77': demographics.non_aged * int('77' in hcc_set)
+        })
+            
+    elif model_name == "RxHCC Model V08":
+        # RxHCC NonAged interactions
+        interactions.update({
+            'NonAged_RXHCC1': demographics.non_aged * int('1' in hcc_set),
+            'NonAged_RXHCC130': demographics.non_aged * int('130' in hcc_set),
+            'NonAged_RXHCC131': demographics.non_aged * int('131' in hcc_set),
+            'NonAged_RXHCC132': demographics.non_aged * int('132' in hcc_set),
+            'NonAged_RXHCC133': demographics.non_aged * int('133' in hcc_set),
+            'NonAged_RXHCC159': demographics.non_aged * int('159' in hcc_set),
+            'NonAged_RXHCC163': demographics.non_aged * int('163' in hcc_set)
+        })
+    
+    return interactions
+
+def reference_apply_hierarchies(cc_set: set, model_name: str, hierarchies=hierarchies_default) -> set:
+    """apply_hierarchies as it was before the rules were compiled"""
+    to_remove = set()
+    if model_name == "CMS-HCC Model V28":
+        if ("223" in cc_set and
+            not any(cc in cc_set for cc in ["221", "222", "224", "225", "226"])):
+            cc_set.remove("223")
+    elif model_name == "CMS-HCC ESRD Model V21":
+        if "134" in cc_set:
+            cc_set.remove("134")
+    elif model_name == "CMS-HCC ESRD Model V24":
+        for cc in ["134", "135", "136", "137"]:
+            if cc in cc_set:
+                cc_set.remove(cc)
+    model_hierarchies = model_partition(hierarchies, model_name)
+    for cc in cc_set:
+        child_ccs = model_hierarchies.get(cc)
+        if child_ccs is not None:
+            to_remove.update(child_ccs & cc_set)
+    return cc_set - to_remove
+
+
+def reference_apply_interactions(demographics, hcc_set: set, model_name: str, demographic_interactions=None) -> dict:
+    """apply_interactions as it was before the rules were compiled"""
+    if demographic_interactions is None:
+        interactions = create_demographic_only_interactions(demographics)
+    else:
+        interactions = dict(demographic_interactions)
+    diagnostic_cats = get_diagnostic_categories(model_name, hcc_set)
+    interactions.update(create_disease_interactions(model_name, diagnostic_cats, demographics, hcc_set))
+    hcc_count = len(hcc_set)
+    for i in range(1, 10):
+        interactions[f'D{i}'] = int(hcc_count == i)
+    interactions['D10P'] = int(hcc_count >= 10)
+    return interactions
+
+
+def model_ccs(model_name: str) -> list:
+    """Every CC the model's mapping, hierarchies and rules mention"""
+    ccs = {cc for values in model_partition(dx_to_cc_default, model_name).values() for cc in values}
+    for parent, children in model_partition(hierarchies_default, model_name).items():
+        ccs.add(parent)
+        ccs.update(children)
+    for cc, keep in HIERARCHY_EXCLUSIONS.get(model_name, ()):
+        ccs.add(cc)
+        ccs.update(keep)
+    for values in DIAGNOSTIC_CATEGORIES.get(model_name, {}).values():
+        ccs.update(values)
+    for factors in DISEASE_INTERACTIONS.get(model_name, {}).values():
+        ccs.update(f[3:] for f in factors if f.startswith("HCC"))
+    return sorted(ccs)
+
+
+def random_demographics(rng: random.Random, model_name: str):
+    version = get_model_version(model_name)
+    return categorize_demographics_record(
+        rng.choice([30, 45, 64, 65, 70, 80, 95]), rng.choice("MF"), rng.choice(["NA", "02", "01", "04", None]),
+        rng.choice(["0", "1", "2", "3"]), rng.choice(["0", "1", "2"]), version, rng.random() < 0.1,
+        rng.random() < 0.05, rng.random() < 0.2, rng.choice([None, None, 2, 6]))
+
+
+def random_cc_set(rng: random.Random, ccs: list, rule_ccs: list) -> set:
+    n = rng.choice([0, 1, 2, 3, 4, 6, 10, 15, 30])
+    # Half the picks from the CCs the rules mention, so interactions and exclusions actually fire
+    return {rng.choice(rule_ccs) if rng.random() < 0.5 else rng.choice(ccs) for _ in range(n)}
@@ -0,0 +1,65 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import csv
+import os
+import pytest
+from app.columnar import EXTENSIONS, FORMATS, TABLES, open_writer, write_members
+
+# Each format must read back as the same tables, with several row groups (record batches in arrow)
+# whose dictionaries differ
+
+MEMBERS = [
+    {"member_id": "m1", "diagnosis_codes": ["E1122", "I5021", "J449"], "age": 70, "sex": "F"},
+    {"member_id": "m2", "diagnosis_codes": [], "age": 45, "sex": "M", "dual_elgbl_cd": "02", "orec": "1"},
+    {"member_id": "m3", "diagnosis_codes": ["F200", "C509", "N184"], "age": 82, "sex": "M", "dual_elgbl_cd": "01"},
+    {"member_id": "m4", "diagnosis_codes": ["E1122"], "age": "not a number", "sex": "F"},
+    {"member_id": 5, "diagnosis_codes": ["I4891", "I5022"], "age": 66, "sex": "F"},
+]
+CONVERT = {"str": str, "dict": str, "int": int, "float": float}
+
+
+def read_csv(path: str, columns: tuple) -> list:
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        assert next(reader) == [name for name, _ in columns]
+        return [tuple(None if value == "" else CONVERT[kind](value) for value, (_, kind) in zip(row, columns)) for row in reader]
+
+
+def read_arrow(path: str, format: str) -> list:
+    import pyarrow.ipc
+    import pyarrow.parquet
+    if format == "parquet":
+        table = pyarrow.parquet.read_table(path)
+    else:
+        with pyarrow.ipc.open_stream(path) as reader:
+            table = reader.read_all()
+    return [tuple(row.values()) for row in table.to_pylist()]
+
+
+def write_tables(format: str, directory: str) -> dict:
+    with open_writer(format, directory, row_group_size=2) as writer:
+        write_members(writer, MEMBERS)
+        writer.write(None, error="Malformed JSON")
+    tables = {}
+    for table, columns in TABLES.items():
+        path = os.path.join(directory, table + EXTENSIONS[format])
+        tables[table] = read_csv(path, columns) if format == "csv" else read_arrow(path, format)
+    return tables
+
+
+@pytest.mark.parametrize("format", FORMATS)
+def test_write_and_read_back(format, tmp_path):
+    if format != "csv":
+        pytest.importorskip("pyarrow")
+    tables = write_tables(format, str(tmp_path / format))
+
+    members = tables["members"]
+    assert [row[0] for row in members] == ["m1", "m2", "m3", "m4", "5", None]
+    assert members[3][3] is None and members[3][-1]
+    assert members[5][-1] == "Malformed JSON"
+    assert all(row[-1] is None and row[3] > 0 for row in members[:3] + members[4:5])
+    assert {row[0] for row in tables["hccs"]} == {"m1", "m3", "5"}
+    assert all(row[0] in ("m1", "m3", "5") for table in ("hcc_dx", "interactions") for row in tables[table])
+    assert len(tables["demographics"]) == 4
+    assert {row[0] for row in tables["labels"]} == {"hcc", "interactions"}
+
+    assert tables == write_tables("csv", str(tmp_path / "csv_reference"))
@@ -0,0 +1,60 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import dataclasses
+import pytest
+from hccinfhir.datamodels import Demographics, DemographicsRecord
+from hccinfhir.hccinfhir import HCCInFHIR
+from hccinfhir.model_calculate import calculate_raf, calculate_raf_record, profile_cache
+
+# Results with the same demographics share one cached demographic profile, so what a caller does with
+# a result must not change the next score
+
+MEMBER = {"diagnosis_codes": ["E1122", "I5021"], "model_name": "CMS-HCC Model V28", "age": 70, "sex": "F"}
+
+
+@pytest.fixture(params=[0, 128], ids=["cache off", "cache on"])
+def cache_size(request):
+    maxsize = profile_cache.maxsize
+    profile_cache.resize(request.param)
+    yield request.param
+    profile_cache.resize(maxsize)
+
+
+def mutate(result: dict) -> None:
+    for key in ("coefficients", "interactions"):
+        result[key].update({name: 99.0 for name in result[key]})
+    result["hcc_list"].clear()
+    result["cc_to_dx"].clear()
+
+
+def test_mutating_a_result_does_not_change_later_scores(cache_size):
+    first = calculate_raf(**MEMBER)
+    expected = first["risk_score"]
+    first["demographics"].category = "F0-34"
+    mutate(first)
+
+    second = calculate_raf(**MEMBER)
+    assert second["risk_score"] == expected
+    assert second["demographics"].category != "F0-34"
+
+
+def test_internal_record_is_frozen(cache_size):
+    first = calculate_raf_record(**MEMBER)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        first["demographics"].category = "F0-34"
+    mutate(first)
+    assert calculate_raf_record(**MEMBER)["risk_score"] == calculate_raf(**MEMBER)["risk_score"]
+
+
+def test_public_results_carry_the_demographics_model():
+    result = calculate_raf(**MEMBER)
+    assert isinstance(result["demographics"], Demographics)
+    assert result["demographics"].model_dump() == calculate_raf_record(**MEMBER)["demographics"].model_dump()
+    assert isinstance(calculate_raf_record(**MEMBER)["demographics"], DemographicsRecord)
+
+    processor = HCCInFHIR()
+    demographics = {"age": 70, "sex": "F"}
+    assert isinstance(processor.run([], demographics)["demographics"], Demographics)
+    assert isinstance(processor.run_from_service_data([], demographics)["demographics"], Demographics)
+    assert isinstance(processor.calculate_from_diagnosis(["E1122"], demographics)["demographics"], Demographics)
+    assert isinstance(processor.run_record([], demographics)["demographics"], DemographicsRecord)
+    assert isinstance(processor.calculate_from_diagnosis_record([], demographics)["demographics"], DemographicsRecord)
@@ -0,0 +1,35 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import pytest
+from app.main import app
+
+# Routes reading fields from the request body answer 400 when it is JSON but not an object
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize("route", [
+    "/v1/raf-v28/batch",
+    "/v1/raf-v28/single/bulk",
+    "/v1/raf-v28/what-if",
+    "/v1/raf/blended",
+    "/v1/raf-v28/eob",
+    "/v1/raf-v28/837",
+    "/v1/raf-v28/population",
+])
+@pytest.mark.parametrize("body", ["1", '"s"', "[]", "true"])
+def test_non_object_body(client, route, body):
+    response = client.post(route, data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Request body must be a JSON object"}
+
+
+@pytest.mark.parametrize("body", ["1", '"s"', "[]", "true"])
+def test_non_object_ingest_body(client, monkeypatch, tmp_path, body):
+    monkeypatch.setattr("app.member_state.MEMBER_STATE_DB", str(tmp_path / "members.db"))
+    monkeypatch.setattr("app.member_state._store", None)
+    response = client.post("/v1/raf-v28/members/ingest", data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Request body must be a JSON object"}
@@ -0,0 +1,55 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import random
+import typing
+import pytest
+from hccinfhir.datamodels import ModelName
+from hccinfhir.model_hierarchies import HIERARCHY_EXCLUSIONS, get_compiled_hierarchy
+from hccinfhir.model_interactions import apply_interactions, get_compiled_interactions
+from tests.rules_reference import (get_diagnostic_categories, model_ccs, random_cc_set, random_demographics,
+                                   reference_apply_hierarchies, reference_apply_interactions)
+
+# The compiled hierarchy and interaction rules must give what the rules as written in rules_reference.py
+# give, for seeded random members of every model, including the iteration order of the sets and dicts
+
+MODELS = list(typing.get_args(ModelName))
+CASES = 500
+
+
+@pytest.fixture(params=MODELS)
+def model_name(request):
+    return request.param
+
+
+def members(model_name: str):
+    rng = random.Random(model_name)
+    ccs = model_ccs(model_name)
+    rule_ccs = get_compiled_interactions(model_name).cc_codes + [cc for cc, _ in HIERARCHY_EXCLUSIONS.get(model_name, ())] or ccs
+    for _ in range(CASES):
+        yield random_cc_set(rng, ccs, rule_ccs), random_demographics(rng, model_name)
+
+
+def test_compiled_hierarchy(model_name):
+    compiled = get_compiled_hierarchy(model_name)
+    for cc_set, _ in members(model_name):
+        expected_input, actual_input = set(cc_set), set(cc_set)
+        expected = reference_apply_hierarchies(expected_input, model_name)
+        actual = compiled.apply(actual_input)
+        assert list(actual) == list(expected), cc_set
+        assert list(actual_input) == list(expected_input), cc_set
+
+
+def test_compiled_interactions(model_name):
+    compiled = get_compiled_interactions(model_name)
+    for cc_set, demographics in members(model_name):
+        hcc_set = reference_apply_hierarchies(set(cc_set), model_name)
+        for hccs in (cc_set, hcc_set):
+            assert list(compiled.diagnostic_categories(hccs).items()) == list(get_diagnostic_categories(model_name, hccs).items())
+            expected = reference_apply_interactions(demographics, hccs, model_name)
+            actual = apply_interactions(demographics, hccs, model_name)
+            assert list(actual.items()) == list(expected.items()), hccs
+            assert all(type(value) is int for value in actual.values())
+
+
+def test_every_model_has_rules():
+    for model_name in MODELS:
+        assert get_compiled_interactions(model_name).rules, model_name
@@ -0,0 +1,43 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import json
+import os
+from hccinfhir.stream import group_by_patient, scan_patient_reference, score_ndjson
+
+# With workers > 1 score_ndjson groups raw lines by a scan for the patient reference instead of parsing
+# them; the patients must be the ones the parsed EOBs name, whatever their contained resources name
+
+SAMPLE = os.path.join(bootstrap.vendor_dir, "hccinfhir", "samples", "sample_eob_200.ndjson")
+
+
+def eob_lines(patients: int) -> list:
+    """NDJSON lines of the first sample patients, each EOB containing a Claim of another patient first"""
+    with open(SAMPLE) as f:
+        groups = [eobs for _, eobs in group_by_patient(json.loads(line) for line in f if line.strip())][:patients]
+    lines = []
+    for eobs in groups:
+        for eob in eobs:
+            contained = [{"resourceType": "Claim", "id": "c1", "patient": {"reference": "Patient/OTHER"}}]
+            lines.append(json.dumps({"resourceType": eob["resourceType"], "contained": contained, **eob}).encode() + b"\n")
+    return lines
+
+
+def demographics_for(patient_id: str) -> dict:
+    return {"age": 70, "sex": "F"}
+
+
+def test_scan_skips_contained_resources():
+    line = json.dumps({"resourceType": "ExplanationOfBenefit", "contained": [{"patient": {"reference": "Patient/OTHER"}}],
+                       "patient": {"reference": "Patient/REAL"}}).encode()
+    assert scan_patient_reference(line) == "Patient/REAL"
+    line = json.dumps({"resourceType": "ExplanationOfBenefit", "patient": {"reference": "Patient/REAL"}}).encode()
+    assert scan_patient_reference(line) == "Patient/REAL"
+
+
+def test_workers_group_the_same_patients():
+    lines = eob_lines(3)
+    single = list(score_ndjson(lines, demographics_for, workers=1))
+    parallel = list(score_ndjson(lines, demographics_for, workers=2, chunk_size=1))
+    assert len(single) == 3
+    assert "Patient/OTHER" not in [result.patient_id for result in single]
+    assert [(r.patient_id, r.eob_count, r.error) for r in parallel] == [(r.patient_id, r.eob_count, r.error) for r in single]
+    assert [r.result["risk_score"] for r in parallel if r.result] == [r.result["risk_score"] for r in single if r.result]
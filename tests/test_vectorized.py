@@ -0,0 +1,42 @@
+import bootstrap  # ensure bootstrap is imported first, adds vendor to sys.path
+import random
+import typing
+import pytest
+from hccinfhir.datamodels import ModelName
+from hccinfhir.model_calculate import calculate_raf_record
+from hccinfhir.model_vectorized import calculate_raf_columnar
+from benchmarks.synthetic import synthetic_population
+
+# calculate_raf_columnar must score every member as calculate_raf_record does, for seeded synthetic
+# members of every model, up to floating-point summation order
+
+MODELS = list(typing.get_args(ModelName))
+MEMBERS = 500
+SCORE_KEYS = ("risk_score", "risk_score_demographics", "risk_score_hcc", "risk_score_chronic_only")
+TOLERANCE = 1e-9
+DEMOGRAPHIC_FIELDS = ("age", "sex", "dual_elgbl_cd", "orec", "crec", "new_enrollee", "snp", "low_income", "graft_months")
+
+
+@pytest.fixture(params=MODELS)
+def model_name(request):
+    return request.param
+
+
+def members(model_name: str) -> list:
+    rng = random.Random(model_name)
+    population = synthetic_population(MEMBERS, seed=1, model_name=model_name)
+    for member in population:
+        member["low_income"] = rng.random() < 0.2
+        member["graft_months"] = rng.choice([None, None, 2, 6, 12])
+    return population
+
+
+def test_columnar_scores_equal_calculate_raf(model_name):
+    population = members(model_name)
+    columnar = calculate_raf_columnar([m["diagnosis_codes"] for m in population], model_name=model_name,
+                                      **{field: [m[field] for m in population] for field in DEMOGRAPHIC_FIELDS})
+    for i, member in enumerate(population):
+        expected = calculate_raf_record(member["diagnosis_codes"], model_name, **{field: member[field] for field in DEMOGRAPHIC_FIELDS})
+        for key in SCORE_KEYS:
+            assert columnar[key][i] == pytest.approx(expected[key], abs=TOLERANCE), (key, member)
+        assert sorted(code for code, present in zip(columnar["hcc_codes"], columnar["hcc_matrix"][i]) if present) == sorted(expected["hcc_list"])